@@ -0,0 +1,39 @@
+"""
+Time logging many small objects over many scenes with `storage="files"` and `storage="archive"`, and count the files created.
+
+Usage: python benchmarks/bench_archive.py [--scenes 2000] [--objects 5]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from wis3d import Wis3D
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scenes", type=int, default=2000)
+    parser.add_argument("--objects", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    starts, ends = rng.random((100, 3)), rng.random((100, 3))
+    with tempfile.TemporaryDirectory() as d:
+        for storage in ("files", "archive"):
+            vis3d = Wis3D(d, storage, storage=storage)
+            tic = time.perf_counter()
+            for scene in range(args.scenes):
+                vis3d.set_scene_id(scene)
+                for _ in range(args.objects):
+                    vis3d.add_lines(starts, ends)
+            vis3d.flush()
+            elapsed = time.perf_counter() - tic
+            entries = sum(len(dirs) + len(files) for _, dirs, files in os.walk(os.path.join(d, storage)))
+            print(f"{storage:8}  {elapsed:7.2f} s  {entries:8d} files and folders")
+
+
+if __name__ == "__main__":
+    main()
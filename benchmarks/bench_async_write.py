@@ -0,0 +1,51 @@
+"""
+Compare the caller-side latency of `Wis3D.add_*` when writing synchronously, on a background thread
+(`async_write=True`) and on a process pool (`executor="process"`).
+
+Usage: python benchmarks/bench_async_write.py [--steps 50] [--points 200000]
+"""
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+from wis3d import Wis3D
+
+
+def run(out_folder, executor, steps, n_points):
+    vis3d = Wis3D(out_folder, executor or "sync", executor=executor)
+    points = np.random.rand(n_points, 3).astype(np.float32)
+    colors = (np.random.rand(n_points, 3) * 255).astype(np.uint8)
+    image = (np.random.rand(720, 1280, 3) * 255).astype(np.uint8)
+    rays = np.random.rand(1000, 3)
+
+    latencies = []
+    start = time.perf_counter()
+    for step in range(steps):
+        vis3d.set_scene_id(step)
+        tic = time.perf_counter()
+        vis3d.add_point_cloud(points, colors)
+        vis3d.add_image(image)
+        vis3d.add_lines(rays, rays * 2)
+        latencies.append(time.perf_counter() - tic)
+    vis3d.close()
+    total = time.perf_counter() - start
+    return np.asarray(latencies) * 1000, total
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--steps", type=int, default=50)
+    parser.add_argument("--points", type=int, default=200000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as d:
+        for executor in (None, "thread", "process"):
+            latencies, total = run(d, executor, args.steps, args.points)
+            print(f"executor={executor!s:7}  step latency mean {latencies.mean():7.2f} ms  "
+                  f"p95 {np.percentile(latencies, 95):7.2f} ms  total incl. drain {total:6.2f} s")
+
+
+if __name__ == "__main__":
+    main()
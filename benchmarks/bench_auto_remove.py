@@ -0,0 +1,36 @@
+"""
+Time creating a `Wis3D` with `auto_remove=True` over the output of an earlier run of many files.
+
+Usage: python benchmarks/bench_auto_remove.py [--scenes 1000] [--files 50]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from wis3d import Wis3D
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scenes", type=int, default=1000)
+    parser.add_argument("--files", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as d:
+        for scene in range(args.scenes):
+            folder = os.path.join(d, "seq", "%05d" % scene, "lines")
+            os.makedirs(folder)
+            for i in range(args.files):
+                open(os.path.join(folder, "%05d.json" % i), "w").close()
+        tic = time.perf_counter()
+        Wis3D(d, "seq")
+        elapsed = time.perf_counter() - tic
+        print(f"Wis3D() over {args.scenes * args.files} files: {elapsed * 1000:.1f} ms")
+        # let the background deleter finish before the temporary folder is removed
+        while os.path.exists(os.path.join(d, ".trash")):
+            time.sleep(0.1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+Time `Wis3D.add_boxes` for 10 to 100k boxes, by position/euler/extent and by corners.
+
+Usage: python benchmarks/bench_boxes.py [--sizes 10 100 1000 10000 100000]
+"""
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+from wis3d import Wis3D
+
+
+def box_corners(positions, extents):
+    unit = np.array([[0, 0, 0], [1, 0, 0], [1, 0, 1], [0, 0, 1], [0, 1, 0], [1, 1, 0], [1, 1, 1], [0, 1, 1]]) - 0.5
+    return positions[:, None, :] + unit[None] * extents[:, None, :]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as d:
+        vis3d = Wis3D(d, "boxes")
+        for n in args.sizes:
+            positions = np.random.randn(n, 3)
+            eulers = np.random.randn(n, 3)
+            extents = np.random.rand(n, 3) + 0.1
+            corners = box_corners(positions, extents)
+            for overload, call in (
+                    ("definition", lambda: vis3d.add_boxes(positions, eulers, extents, axes="rxyz")),
+                    ("corners", lambda: vis3d.add_boxes(corners.copy(), axes="rxyz")),
+            ):
+                timings = []
+                for _ in range(args.repeat):
+                    tic = time.perf_counter()
+                    call()
+                    timings.append(time.perf_counter() - tic)
+                print(f"{n:>7} boxes  {overload:10}  {min(timings) * 1000:9.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Compare file size and throughput of the PLY output of `add_point_cloud`/`add_mesh` with the quantized format
+(`compression="zlib"` and `compression="lzma"`), including the server-side conversion back to PLY.
+
+Usage: python benchmarks/bench_compression.py [--points 2000000] [--subdivisions 7]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import trimesh
+
+from wis3d import Wis3D
+from wis3d.formats import decode_quantized, encode_ply
+
+
+def folder_size(folder, type_folder):
+    return sum(
+        os.path.getsize(os.path.join(root, f))
+        for root, _, files in os.walk(folder) if os.path.basename(root) == type_folder
+        for f in files
+    )
+
+
+def run(out_folder, compression, points, colors, mesh):
+    vis3d = Wis3D(out_folder, str(compression), compression=compression)
+    tic = time.perf_counter()
+    vis3d.add_point_cloud(points, colors)
+    pcd_time = time.perf_counter() - tic
+    tic = time.perf_counter()
+    vis3d.add_mesh(mesh)
+    mesh_time = time.perf_counter() - tic
+
+    seq = os.path.join(out_folder, str(compression))
+    pcd_size = folder_size(seq, "point_clouds")
+    mesh_size = folder_size(seq, "meshes")
+    serve_time = 0.0
+    if compression is not None:
+        for root, _, files in os.walk(seq):
+            for f in files:
+                with open(os.path.join(root, f), "rb") as fp:
+                    data = fp.read()
+                tic = time.perf_counter()
+                encode_ply(*decode_quantized(data))
+                serve_time += time.perf_counter() - tic
+    return pcd_size, pcd_time, mesh_size, mesh_time, serve_time
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--points", type=int, default=2000000)
+    parser.add_argument("--subdivisions", type=int, default=7)
+    args = parser.parse_args()
+
+    # a scanned-like surface: points near a sphere with smoothly varying colors
+    rng = np.random.default_rng(0)
+    points = rng.normal(size=(args.points, 3))
+    points /= np.linalg.norm(points, axis=1, keepdims=True)
+    points += rng.normal(scale=0.01, size=points.shape)
+    colors = ((points + 1.5) / 3 * 255).clip(0, 255).astype(np.uint8)
+    mesh = trimesh.creation.icosphere(args.subdivisions)
+    mesh.visual.vertex_colors = ((mesh.vertices + 1) / 2 * 255).astype(np.uint8)
+    print(f"point cloud: {args.points} points, mesh: {len(mesh.vertices)} vertices, {len(mesh.faces)} faces")
+
+    with tempfile.TemporaryDirectory() as d:
+        for compression in (None, "zlib", "lzma"):
+            pcd_size, pcd_time, mesh_size, mesh_time, serve_time = run(d, compression, points, colors, mesh)
+            print(f"{compression or 'ply':5}  point cloud {pcd_size / 2 ** 20:8.1f} MB {pcd_time:6.2f} s  "
+                  f"mesh {mesh_size / 2 ** 20:8.1f} MB {mesh_time:6.2f} s  decode to PLY {serve_time:6.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Time `Wis3D.add_image` and measure the file size for the image encoding options, on a 1080p rendering-like frame.
+
+Usage: python benchmarks/bench_images.py [--repeat 10]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from wis3d import Wis3D
+
+OPTIONS = [
+    dict(format="png"),
+    dict(format="png", compress_level=1),
+    dict(format="jpeg", quality=90),
+    dict(format="jpeg", quality=75),
+    dict(format="webp", quality=80),
+    dict(format="jpeg", quality=90, max_size=960),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    # smooth shading with some noise, closer to a rendering or a photo than pure noise
+    y, x = np.mgrid[:1080, :1920]
+    image = np.stack([x / 1920 * 255, y / 1080 * 255, (np.sin(x / 50) * np.cos(y / 50) + 1) * 127], axis=-1)
+    image = (image + np.random.default_rng(0).normal(scale=4, size=image.shape)).clip(0, 255).astype(np.uint8)
+
+    with tempfile.TemporaryDirectory() as d:
+        for i, options in enumerate(OPTIONS):
+            vis3d = Wis3D(d, f"options{i}")
+            tic = time.perf_counter()
+            for _ in range(args.repeat):
+                vis3d.add_image(image, **options)
+            elapsed = (time.perf_counter() - tic) / args.repeat
+            folder = os.path.join(d, f"options{i}")
+            size = sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(folder) for f in files) / args.repeat
+            print(f"{str(options):55}  {elapsed * 1000:7.1f} ms  {size / 2 ** 10:8.1f} KB")
+
+
+if __name__ == "__main__":
+    main()
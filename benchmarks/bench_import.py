@@ -0,0 +1,57 @@
+"""
+Time importing Wis3D and its tools in fresh interpreters, list the heavy dependencies each import loads, and time the
+calls of a disabled `Wis3D`.
+
+Usage: python benchmarks/bench_import.py [--repeat 5]
+"""
+import argparse
+import subprocess
+import sys
+import timeit
+
+HEAVY_MODULES = ("torch", "trimesh", "scipy", "PIL", "cherrypy", "numpy")
+STATEMENTS = (
+    "import wis3d",
+    "from wis3d import Wis3D",
+    "import wis3d.server",
+    "import wis3d.cli",
+)
+PROBE = """
+import sys, time
+tic = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - tic
+print(elapsed, *[m for m in {modules} if m in sys.modules])
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    for statement in STATEMENTS:
+        timings = []
+        for _ in range(args.repeat):
+            output = subprocess.run([sys.executable, "-c", PROBE.format(statement=statement, modules=HEAVY_MODULES)],
+                                    check=True, capture_output=True, text=True).stdout.split()
+            timings.append(float(output[0]))
+        print(f"{statement:26} {min(timings) * 1000:8.1f} ms  loads {', '.join(output[1:]) or 'nothing heavy'}")
+
+    import numpy as np
+    from wis3d import Wis3D
+
+    vis3d = Wis3D("unused", "disabled", enable=False)
+    points = np.zeros((10, 3))
+    n = 100000
+    for name, call in (
+            ("add_point_cloud", lambda: vis3d.add_point_cloud(points)),
+            ("add_rays", lambda: vis3d.add_rays(points, points)),
+            ("set_scene_id", lambda: vis3d.set_scene_id(1)),
+    ):
+        seconds = min(timeit.repeat(call, number=n, repeat=3))
+        print(f"disabled {name:17} {seconds / n * 1e9:8.0f} ns per call")
+
+
+if __name__ == "__main__":
+    main()
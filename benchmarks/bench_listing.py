@@ -0,0 +1,52 @@
+"""
+Time the scene and file listings of the server for a sequence of many scenes, from the manifest and by scanning folders.
+
+Usage: python benchmarks/bench_listing.py [--scenes 10000] [--files 5]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from wis3d.manifest import ManifestWriter, manifest_path
+from wis3d.server import Visualizer
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scenes", type=int, default=10000)
+    parser.add_argument("--files", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as d:
+        seq_folder = os.path.join(d, "seq")
+        manifest = ManifestWriter.open(seq_folder)
+        for scene in range(args.scenes):
+            folder = os.path.join(seq_folder, "%05d" % scene, "lines")
+            os.makedirs(folder)
+            for i in range(args.files):
+                filename = os.path.join(folder, "%05d.json" % i)
+                open(filename, "w").close()
+                manifest.append(filename, 0)
+
+        for mode in ("manifest", "scan"):
+            if mode == "scan":
+                os.remove(manifest_path(seq_folder))
+            visualizer = Visualizer(d, d)
+            tic = time.perf_counter()
+            scenes = visualizer.all_scenes_in_sequence("seq")
+            scenes_time = time.perf_counter() - tic
+            tic = time.perf_counter()
+            for scene in scenes[:100]:
+                visualizer.files_in_scene(scene)
+            files_time = (time.perf_counter() - tic) / 100
+            # once the index is loaded, requests only read what was appended
+            tic = time.perf_counter()
+            visualizer.all_scenes_in_sequence("seq")
+            again_time = time.perf_counter() - tic
+            print(f"{mode:8}  scenes {scenes_time * 1000:8.1f} ms (again {again_time * 1000:8.1f} ms)  "
+                  f"files of a scene {files_time * 1000:6.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
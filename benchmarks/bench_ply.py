@@ -0,0 +1,67 @@
+"""
+Compare the PLY export of point clouds and meshes through `trimesh` objects, as `add_point_cloud`/`add_mesh` used to
+write them, with the direct writer `formats.encode_ply`, and check that both files load to the same arrays.
+
+Usage: python benchmarks/bench_ply.py [--sizes 10000 100000 1000000 10000000] [--repeat 3]
+"""
+import argparse
+import time
+
+import numpy as np
+import trimesh
+
+from wis3d.formats import encode_ply
+
+# Three.js to a z-up world, as with `xyz_pattern=("x", "-z", "y")`
+TRANSFORM = np.array([[1, 0, 0, 0], [0, 0, 1, 0], [0, -1, 0, 0], [0, 0, 0, 1]], dtype=np.float64)
+
+
+def export_trimesh(vertices, faces, colors):
+    if faces is None:
+        geometry = trimesh.PointCloud(vertices, colors)
+    else:
+        geometry = trimesh.Trimesh(vertices, faces, vertex_colors=colors, process=False)
+    geometry.apply_transform(TRANSFORM)
+    return geometry.export(file_type="ply")
+
+
+def export_direct(vertices, faces, colors):
+    return encode_ply(vertices, faces, colors, TRANSFORM)
+
+
+def best_time(fn, repeat, *args):
+    timings = []
+    for _ in range(repeat):
+        tic = time.perf_counter()
+        data = fn(*args)
+        timings.append(time.perf_counter() - tic)
+    return min(timings), data
+
+
+def load(data, faces):
+    geometry = trimesh.load(trimesh.util.wrap_as_stream(bytes(data)), file_type="ply", process=False)
+    if faces is None:
+        return geometry.vertices, geometry.colors, None
+    return geometry.vertices, geometry.visual.vertex_colors, geometry.faces
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000, 10000000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    for n in args.sizes:
+        vertices = rng.random((n, 3), dtype=np.float32)
+        colors = rng.integers(0, 256, (n, 3), dtype=np.uint8)
+        for kind, faces in (("point cloud", None), ("mesh", rng.integers(0, n, (2 * n, 3)))):
+            old, old_data = best_time(export_trimesh, args.repeat, vertices, faces, colors)
+            new, new_data = best_time(export_direct, args.repeat, vertices, faces, colors)
+            same = all(a is None and b is None or np.allclose(a, b) for a, b in zip(load(old_data, faces), load(new_data, faces)))
+            print(f"{kind:11} {n:>9}  trimesh {old * 1000:9.1f} ms  direct {new * 1000:9.1f} ms  {old / new:6.1f}x  "
+                  f"{len(new_data) / 2 ** 20:8.1f} MB  {'same' if same else 'DIFFERENT'}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Time logging GPU meshes with `transfer="call"` and `transfer="scene"` against one `.cpu()` per tensor, while the GPU is busy.
+Without CUDA, the transfers run on `FakeBackend`, which reports the number of copies and synchronizations.
+
+Usage: python benchmarks/bench_transfer.py [--scenes 20] [--meshes 10] [--vertices 100000]
+"""
+import argparse
+import tempfile
+import time
+
+import torch
+
+from wis3d import Wis3D, transfer
+
+
+def log(vis3d, meshes, scenes, busy):
+    tic = time.perf_counter()
+    for scene in range(scenes):
+        vis3d.set_scene_id(scene)
+        for vertices, faces, colors in meshes:
+            if busy is not None:
+                busy @ busy  # keep the GPU busy, so that each synchronization waits for it
+            vis3d.add_mesh(vertices, faces, colors)
+    vis3d.flush()
+    return time.perf_counter() - tic
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scenes", type=int, default=20)
+    parser.add_argument("--meshes", type=int, default=10)
+    parser.add_argument("--vertices", type=int, default=100000)
+    args = parser.parse_args()
+
+    cuda = torch.cuda.is_available()
+    device = "cuda" if cuda else "cpu"
+    if not cuda:
+        print("CUDA is not available, counting transfers on a fake device")
+    meshes = [
+        (
+            torch.rand(args.vertices, 3, device=device),
+            torch.randint(0, args.vertices, (args.vertices * 2, 3), device=device),
+            torch.randint(0, 255, (args.vertices, 3), dtype=torch.uint8, device=device),
+        )
+        for _ in range(args.meshes)
+    ]
+    busy = torch.rand(2048, 2048, device=device) if cuda else None
+
+    with tempfile.TemporaryDirectory() as d:
+        if cuda:
+            # one synchronization per tensor
+            vis3d = Wis3D(d, "cpu")
+            tic = time.perf_counter()
+            for scene in range(args.scenes):
+                vis3d.set_scene_id(scene)
+                for vertices, faces, colors in meshes:
+                    busy @ busy
+                    vis3d.add_mesh(vertices.cpu(), faces.cpu(), colors.cpu())
+            print(f"per tensor  {time.perf_counter() - tic:7.2f} s")
+
+        for mode in ("call", "scene"):
+            backend = transfer.TorchBackend() if cuda else transfer.FakeBackend()
+            transfer.set_backend(backend)
+            elapsed = log(Wis3D(d, mode, transfer=mode), meshes, args.scenes, busy)
+            counts = "" if cuda else f"  {backend.copies} copies, {backend.synchronizations} synchronizations"
+            print(f"{mode:10}  {elapsed:7.2f} s{counts}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""
+Benchmark suite of the `Wis3D.add_*` methods: time, throughput, peak memory and disk bytes over a range of input sizes,
+and comparison of two runs or two git revisions to catch regressions in the hot paths.
+
+Usage:
+    python benchmarks/suite.py [--scale small|full] [--cases point_cloud mesh ...] [--wis3d '{"point_cloud_format": "bin"}'] [--output results.json]
+    python benchmarks/suite.py --compare base.json new.json [--threshold 0.1]
+    python benchmarks/suite.py --revisions master HEAD [--scale small] [--threshold 0.1]
+
+The small scale takes seconds; the full scale goes up to 10M points, 100k primitives and 1000 images.
+Times include waiting for background writes. Peak memory is measured in a separate run with `tracemalloc`, which tracks
+numpy and Python allocations but not torch ones. `--compare` and `--revisions` exit with status 1 on regressions;
+compare runs of the same machine, and mind that calls under a millisecond are mostly file system latency.
+
+The suite can be run from any directory and measures the package of its own checkout, unless `PYTHONPATH` is set, in
+which case the `wis3d` found there is measured, as `--revisions` does with the worktrees of the revisions.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if not os.environ.get("PYTHONPATH"):
+    sys.path.insert(1, REPO)
+
+
+def point_cloud(n, rng):
+    points = rng.random((n, 3), dtype=np.float32)
+    colors = rng.integers(0, 256, (n, 3), dtype=np.uint8)
+    return lambda vis3d: vis3d.add_point_cloud(points, colors)
+
+
+def mesh(n, rng):
+    vertices = rng.random((n, 3), dtype=np.float32)
+    faces = rng.integers(0, n, (2 * n, 3))
+    colors = rng.integers(0, 256, (n, 3), dtype=np.uint8)
+    return lambda vis3d: vis3d.add_mesh(vertices, faces, colors)
+
+
+def boxes(n, rng):
+    positions, eulers, extents = rng.standard_normal((n, 3)), rng.standard_normal((n, 3)), rng.random((n, 3)) + 0.1
+    return lambda vis3d: vis3d.add_boxes(positions, eulers, extents, axes="rxyz")
+
+
+def lines(n, rng):
+    starts, ends = rng.random((n, 3)), rng.random((n, 3))
+    return lambda vis3d: vis3d.add_lines(starts, ends)
+
+
+def spheres(n, rng):
+    centers, radius = rng.random((n, 3)), rng.random(n) * 0.1
+    return lambda vis3d: vis3d.add_spheres(centers, radius)
+
+
+def voxel(n, rng):
+    centers = rng.integers(0, 100, (n, 3)).astype(np.float32)
+    return lambda vis3d: vis3d.add_voxel(centers, 1.0)
+
+
+def camera_trajectory(n, rng):
+    poses = np.tile(np.eye(4), (n, 1, 1))
+    poses[:, :3, 3] = rng.random((n, 3))
+    return lambda vis3d: vis3d.add_camera_trajectory(poses)
+
+
+def images(n, rng):
+    image = rng.integers(0, 256, (480, 640, 3), dtype=np.uint8)
+
+    def call(vis3d):
+        for _ in range(n):
+            vis3d.add_image(image)
+
+    return call
+
+
+def correspondences(n, rng):
+    img0 = rng.integers(0, 256, (480, 640, 3), dtype=np.uint8)
+    img1 = rng.integers(0, 256, (480, 640, 3), dtype=np.uint8)
+    kpts0, kpts1 = rng.random((n, 2)) * 480, rng.random((n, 2)) * 480
+    return lambda vis3d: vis3d.add_keypoint_correspondences(img0, img1, kpts0, kpts1)
+
+
+# case -> (input generator, unit, sizes of the small scale, sizes of the full scale)
+CASES = {
+    "point_cloud": (point_cloud, "points", [1000, 10000, 100000], [1000, 10000, 100000, 1000000, 10000000]),
+    "mesh": (mesh, "vertices", [1000, 10000, 100000], [1000, 10000, 100000, 1000000]),
+    "boxes": (boxes, "boxes", [10, 100, 1000], [10, 100, 1000, 10000, 100000]),
+    "lines": (lines, "lines", [10, 100, 1000, 10000], [10, 100, 1000, 10000, 100000]),
+    "spheres": (spheres, "spheres", [10, 100, 1000, 10000], [10, 100, 1000, 10000, 100000]),
+    "voxel": (voxel, "voxels", [10, 100, 1000], [10, 100, 1000, 10000, 100000]),
+    "camera_trajectory": (camera_trajectory, "poses", [10, 100, 1000], [10, 100, 1000, 10000]),
+    "images": (images, "images", [1, 10], [1, 10, 100, 1000]),
+    "correspondences": (correspondences, "keypoints", [100, 1000], [100, 1000, 10000]),
+}
+
+
+MIN_SECONDS = 0.2
+
+
+def folder_size(folder):
+    return sum(os.lstat(os.path.join(root, f)).st_size for root, _, files in os.walk(folder) for f in files)
+
+
+def measure(Wis3D, out_folder, name, call, repeat, kwargs):
+    """
+    :return: minimum time of at least `repeat` calls in seconds, peak traced memory in bytes, and bytes written by one call
+    """
+    vis3d = Wis3D(out_folder, name, **kwargs)
+    # older revisions write synchronously and have no flush
+    flush = getattr(vis3d, "flush", lambda: None)
+    timings = []
+    # fast calls are repeated for at least MIN_SECONDS, so that their minimum is not noise
+    while len(timings) < repeat or sum(timings) < MIN_SECONDS:
+        vis3d.set_scene_id(len(timings))
+        tic = time.perf_counter()
+        call(vis3d)
+        flush()
+        timings.append(time.perf_counter() - tic)
+    disk_bytes = folder_size(os.path.join(out_folder, name, "%05d" % 0))
+    if getattr(vis3d, "archive", None) is not None:
+        disk_bytes = folder_size(os.path.join(out_folder, name)) // len(timings)
+    vis3d.set_scene_id(len(timings))
+    tracemalloc.start()
+    try:
+        call(vis3d)
+        flush()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    getattr(vis3d, "close", lambda: None)()
+    return min(timings), peak, disk_bytes
+
+
+def run(args):
+    from wis3d import Wis3D
+
+    kwargs = json.loads(args.wis3d)
+    rng = np.random.default_rng(0)
+    results = {}
+    with tempfile.TemporaryDirectory() as d:
+        for case in args.cases:
+            make, unit, small, full = CASES[case]
+            # the first call of a method loads its dependencies
+            measure(Wis3D, d, f"{case}_warmup", make(small[0], rng), 1, kwargs)
+            for n in (small if args.scale == "small" else full):
+                try:
+                    seconds, peak, disk_bytes = measure(Wis3D, d, f"{case}_{n}", make(n, rng), args.repeat, kwargs)
+                except Exception as e:
+                    print(f"{case:18} {n:>9} {unit:9}  failed: {e!r}")
+                    results[f"{case}/{n}"] = dict(error=repr(e))
+                    continue
+                results[f"{case}/{n}"] = dict(n=n, unit=unit, seconds=seconds, throughput=n / seconds, peak_bytes=peak, disk_bytes=disk_bytes)
+                print(f"{case:18} {n:>9} {unit:9}  {seconds * 1000:10.2f} ms  {n / seconds:12.4g} {unit}/s  "
+                      f"peak {peak / 2 ** 20:8.1f} MB  disk {disk_bytes / 2 ** 20:8.2f} MB", flush=True)
+    return dict(
+        wis3d=os.path.dirname(sys.modules["wis3d"].__file__),
+        revision=args.revision,
+        python=platform.python_version(),
+        machine=platform.machine(),
+        scale=args.scale,
+        options=kwargs,
+        results=results,
+    )
+
+
+def compare(base, new, threshold):
+    """
+    Print the ratios of time, peak memory and disk bytes of `new` to `base`.
+
+    :return: whether a case is slower, uses more memory or writes more than `threshold` over `base`
+    """
+    print(f"{'case':28} {'time':>20} {'peak memory':>22} {'disk':>22}")
+    regressed = False
+    for key, b in base["results"].items():
+        r = new["results"].get(key)
+        if r is None or "error" in r or "error" in b:
+            continue
+        ratios = [r[field] / b[field] if b[field] else 1.0 for field in ("seconds", "peak_bytes", "disk_bytes")]
+        flags = [ratio > 1 + threshold for ratio in ratios]
+        regressed |= any(flags)
+        print(f"{key:28} {b['seconds'] * 1000:8.2f} ms {ratios[0]:6.2f}x{'!' if flags[0] else ' '} "
+              f"{b['peak_bytes'] / 2 ** 20:8.1f} MB {ratios[1]:6.2f}x{'!' if flags[1] else ' '} "
+              f"{b['disk_bytes'] / 2 ** 20:8.2f} MB {ratios[2]:6.2f}x{'!' if flags[2] else ' '}")
+    print("regressions over {:.0%} are marked with !".format(threshold))
+    return regressed
+
+
+def run_revision(revision, args, output):
+    """
+    Run this suite against the package of a git revision, checked out in a temporary worktree.
+    """
+    with tempfile.TemporaryDirectory() as d:
+        worktree = os.path.join(d, "worktree")
+        subprocess.run(["git", "-C", REPO, "worktree", "add", "--detach", worktree, revision], check=True)
+        try:
+            env = dict(os.environ, PYTHONPATH=os.pathsep.join([worktree, os.environ.get("PYTHONPATH", "")]))
+            command = [sys.executable, os.path.abspath(__file__), "--scale", args.scale, "--repeat", str(args.repeat),
+                       "--wis3d", args.wis3d, "--revision", revision, "--output", output, "--cases", *args.cases]
+            subprocess.run(command, env=env, check=True)
+        finally:
+            subprocess.run(["git", "-C", REPO, "worktree", "remove", "--force", worktree], check=True)
+    with open(output) as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scale", choices=["small", "full"], default="small")
+    parser.add_argument("--cases", nargs="+", choices=list(CASES), default=list(CASES))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--wis3d", type=str, default="{}", help="keyword arguments of Wis3D as JSON")
+    parser.add_argument("--output", type=str, default=None, help="write the results to this JSON file")
+    parser.add_argument("--revision", type=str, default=None, help="label of the results")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"), help="compare two result files")
+    parser.add_argument("--revisions", nargs=2, metavar=("BASE", "NEW"), help="run the suite on two git revisions and compare them")
+    parser.add_argument("--threshold", type=float, default=0.1, help="relative increase reported as a regression")
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as f, open(args.compare[1]) as g:
+            sys.exit(compare(json.load(f), json.load(g), args.threshold))
+    if args.revisions:
+        with tempfile.TemporaryDirectory() as d:
+            base = run_revision(args.revisions[0], args, os.path.join(d, "base.json"))
+            new = run_revision(args.revisions[1], args, os.path.join(d, "new.json"))
+        sys.exit(compare(base, new, args.threshold))
+
+    results = run(args)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import os
+
+import numpy as np
+import trimesh
+
+from wis3d import Wis3D
+from wis3d.archive import ArchiveReader, ArchiveWriter, archive_paths
+
+
+def test_reader_sees_appended_objects(tmp_path):
+    seq_folder = str(tmp_path / "seq")
+    writer = ArchiveWriter(seq_folder)
+    writer.append(os.path.join(seq_folder, "00000", "meshes", "a.ply"), b"first")
+    reader = ArchiveReader(seq_folder)
+    assert reader.read(os.path.join(seq_folder, "00000", "meshes", "a.ply")) == b"first"
+
+    writer.append(os.path.join(seq_folder, "00001", "images", "b.png"), b"image")
+    # the last record of a path wins
+    writer.append(os.path.join(seq_folder, "00000", "meshes", "a.ply"), b"second")
+    assert reader.lookup(os.path.join(seq_folder, "00001", "images", "b.png")) is None
+    reader.refresh()
+    assert reader.read(os.path.join(seq_folder, "00000", "meshes", "a.ply")) == b"second"
+    assert reader.scene_names() == ["00000", "00001"]
+    assert reader.files_in_scene("00001") == {"images": ["b.png"]}
+    writer.close()
+
+
+def test_incomplete_record_is_read_later(tmp_path):
+    seq_folder = str(tmp_path / "seq")
+    writer = ArchiveWriter(seq_folder)
+    writer.append(os.path.join(seq_folder, "00000", "meshes", "a.ply"), b"data")
+    writer.close()
+    index_path = archive_paths(seq_folder)[1]
+    with open(index_path, "rb") as f:
+        index = f.read()
+    with open(index_path, "wb") as f:
+        f.write(index[:-2])
+    reader = ArchiveReader(seq_folder)
+    assert reader.scene_names() == []
+    with open(index_path, "ab") as f:
+        f.write(index[-2:])
+    reader.refresh()
+    assert reader.read(os.path.join(seq_folder, "00000", "meshes", "a.ply")) == b"data"
+
+
+def test_dedup_stores_identical_contents_once(tmp_path):
+    seq_folder = str(tmp_path / "seq")
+    writer = ArchiveWriter(seq_folder, dedup=True)
+    for name in ("a.ply", "b.ply"):
+        writer.append(os.path.join(seq_folder, "00000", "meshes", name), b"same")
+    writer.close()
+    assert os.path.getsize(archive_paths(seq_folder)[0]) == len(b"same")
+    reader = ArchiveReader(seq_folder)
+    assert reader.read(os.path.join(seq_folder, "00000", "meshes", "b.ply")) == b"same"
+
+
+def test_archive_holds_the_files_of_file_storage(tmp_path):
+    vertices = np.random.default_rng(0).random((100, 3))
+    for storage in ("files", "archive"):
+        vis3d = Wis3D(str(tmp_path), storage, storage=storage)
+        vis3d.add_point_cloud(vertices, name="points")
+        vis3d.set_scene_id(1)
+        vis3d.add_point_cloud(vertices * 2, name="points")
+        vis3d.close()
+    assert not (tmp_path / "archive" / "00000").exists()
+    reader = ArchiveReader(str(tmp_path / "archive"))
+    assert reader.scene_names() == ["00000", "00001"]
+    for scene in ("00000", "00001"):
+        path = os.path.join(scene, "point_clouds", "points.ply")
+        assert reader.read(str(tmp_path / "archive" / path)) == (tmp_path / "files" / path).read_bytes()
+
+
+def test_no_mesh_levels_with_archive_storage(tmp_path):
+    mesh = trimesh.creation.icosphere(4)
+    vis3d = Wis3D(str(tmp_path), "seq", storage="archive", mesh_lod=True)
+    vis3d.add_mesh(mesh.vertices, mesh.faces, None, name="mesh")
+    vis3d.close()
+    # only the archive files, no sidecar folder of levels
+    expected = [os.path.basename(path) for path in archive_paths(str(tmp_path / "seq"))]
+    assert sorted(os.listdir(tmp_path / "seq")) == sorted(expected)
@@ -0,0 +1,66 @@
+import os
+
+import numpy as np
+import pytest
+
+from wis3d import Wis3D
+from wis3d.distributed import shard_folders, stale_entries
+from wis3d.server import Visualizer
+from wis3d.trash import TRASH_FOLDER
+
+
+@pytest.fixture
+def world(monkeypatch):
+    def set_rank(rank, world_size=2):
+        monkeypatch.setenv("RANK", str(rank))
+        monkeypatch.setenv("WORLD_SIZE", str(world_size))
+
+    return set_rank
+
+
+def make_entries(seq_folder, names):
+    for name in names:
+        os.makedirs(os.path.join(seq_folder, name))
+
+
+def entries(seq_folder):
+    return sorted(name for name in os.listdir(seq_folder) if name != TRASH_FOLDER)
+
+
+def test_shard_folders_and_stale_entries(tmp_path):
+    seq_folder = str(tmp_path / "seq")
+    make_entries(seq_folder, [".rank10", ".rank2", ".rank0", "00000", ".manifest"])
+    assert shard_folders(seq_folder) == [os.path.join(seq_folder, name) for name in (".rank0", ".rank2", ".rank10")]
+    stale = [os.path.join(seq_folder, name) for name in (".manifest", ".rank10", ".rank2", "00000")]
+    assert stale_entries(seq_folder, 2) == stale
+
+
+def test_lowest_logging_rank_removes_stale_shards(tmp_path, world):
+    seq_folder = str(tmp_path / "seq")
+    make_entries(seq_folder, [".rank0", ".rank1", ".rank3", "00000"])
+    # rank 1 does not clean up when rank 0 logs too
+    world(1)
+    Wis3D(str(tmp_path), "seq")
+    assert entries(seq_folder) == [".rank0", ".rank1", ".rank3", "00000"]
+    # rank 0 does not log, so rank 1 is the lowest logging rank
+    world(0)
+    assert not Wis3D(str(tmp_path), "seq", ranks=[1]).enable
+    assert entries(seq_folder) == [".rank0", ".rank1", ".rank3", "00000"]
+    world(1)
+    Wis3D.has_removed.clear()
+    Wis3D(str(tmp_path), "seq", ranks=[1])
+    assert entries(seq_folder) == [".rank0", ".rank1"]
+
+
+def test_server_merges_the_shards(tmp_path, world):
+    for rank in range(2):
+        world(rank)
+        vis3d = Wis3D(str(tmp_path), "seq")
+        vis3d.add_point_cloud(np.random.default_rng(rank).random((10, 3)))
+        vis3d.close()
+    visualizer = Visualizer(str(tmp_path), str(tmp_path))
+    scenes = visualizer.all_scenes_in_sequence("seq")
+    assert scenes == [str(tmp_path / "seq" / "00000")]
+    files = visualizer.files_in_scene(scenes[0])
+    assert [os.path.basename(path) for path in files["point_clouds"]] == ["rank0-00000.ply", "rank1-00000.ply"]
+    assert all(os.path.isfile(path) for path in files["point_clouds"])
@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+import trimesh
+
+from wis3d import formats
+
+# three.js to a z-up world, as with `xyz_pattern=("x", "-z", "y")`
+TRANSFORM = np.array([[1, 0, 0, 0], [0, 0, 1, 0], [0, -1, 0, 0], [0, 0, 0, 1]], dtype=np.float64)
+
+
+def random_geometry(n=1000, m=2000):
+    rng = np.random.default_rng(0)
+    vertices = rng.random((n, 3)) * 10 - 5
+    colors = rng.integers(0, 256, (n, 3), dtype=np.uint8)
+    faces = rng.integers(0, n, (m, 3))
+    return vertices, colors, faces
+
+
+def test_point_cloud_round_trip():
+    vertices, colors, _ = random_geometry()
+    positions, decoded = formats.decode_point_cloud(bytes(formats.encode_point_cloud(vertices, colors)))
+    assert positions.dtype == np.float32
+    np.testing.assert_allclose(positions, vertices, rtol=1e-6)
+    np.testing.assert_array_equal(decoded, colors)
+
+
+def test_point_cloud_transform_and_float_colors():
+    vertices, colors, _ = random_geometry()
+    data = formats.encode_point_cloud(vertices, np.c_[colors / 255.0, np.ones(len(colors))], TRANSFORM)
+    positions, decoded = formats.decode_point_cloud(data)
+    np.testing.assert_allclose(positions, vertices @ TRANSFORM[:3, :3].T, rtol=1e-6)
+    # alpha is dropped
+    np.testing.assert_array_equal(decoded, colors)
+
+
+def test_point_cloud_without_colors():
+    vertices, _, _ = random_geometry()
+    data = formats.encode_point_cloud(vertices)
+    assert len(data) == formats.POINT_CLOUD_HEADER.size + len(vertices) * 12
+    assert formats.decode_point_cloud(data)[1] is None
+
+
+def test_container_round_trip():
+    rng = np.random.default_rng(0)
+    arrays = dict(
+        positions=rng.random((7, 3)),
+        colors=rng.integers(0, 256, (7, 3), dtype=np.uint8),
+        indices=np.arange(5, dtype=np.uint32),
+    )
+    data = bytes(formats.encode_arrays(dict(arrays, positions=(arrays["positions"], "float32")), dict(size=0.5)))
+    decoded, meta = formats.decode_arrays(data)
+    assert meta == dict(size=0.5)
+    assert decoded["positions"].dtype == np.float32
+    np.testing.assert_allclose(decoded["positions"], arrays["positions"], rtol=1e-6)
+    np.testing.assert_array_equal(decoded["colors"], arrays["colors"])
+    np.testing.assert_array_equal(decoded["indices"], arrays["indices"])
+    # every buffer can be wrapped in a typed array without copying
+    start = np.frombuffer(data, np.uint8).__array_interface__["data"][0]
+    for array in decoded.values():
+        assert (array.__array_interface__["data"][0] - start) % formats.CONTAINER_ALIGNMENT == 0
+
+
+@pytest.mark.parametrize("compression", sorted(formats.COMPRESSORS))
+def test_quantized_round_trip(compression):
+    vertices, colors, faces = random_geometry()
+    decoded, decoded_faces, decoded_colors = formats.decode_quantized(formats.encode_quantized(vertices, faces, colors, compression))
+    # positions are within half a quantization step
+    step = (vertices.max(axis=0) - vertices.min(axis=0)) / formats.QUANTIZED_LEVELS
+    assert (np.abs(decoded - vertices) <= step / 2 + 1e-6).all()
+    np.testing.assert_array_equal(decoded_faces, faces)
+    np.testing.assert_array_equal(decoded_colors, colors)
+
+
+def test_quantized_point_cloud_without_colors():
+    vertices, _, _ = random_geometry()
+    vertices[:, 2] = 1
+    decoded, faces, colors = formats.decode_quantized(formats.encode_quantized(vertices))
+    assert faces is None and colors is None
+    np.testing.assert_allclose(decoded, vertices, atol=1e-3)
+
+
+@pytest.mark.parametrize("with_faces", [False, True])
+def test_ply_loads_like_the_trimesh_export(with_faces):
+    vertices, colors, faces = random_geometry()
+    faces = faces if with_faces else None
+    if faces is None:
+        expected = trimesh.PointCloud(vertices, colors)
+    else:
+        expected = trimesh.Trimesh(vertices, faces, vertex_colors=colors, process=False)
+    expected.apply_transform(TRANSFORM)
+    data = formats.encode_ply(vertices, faces, colors, TRANSFORM)
+    loaded = trimesh.load(trimesh.util.wrap_as_stream(bytes(data)), file_type="ply", process=False)
+    np.testing.assert_allclose(loaded.vertices, expected.vertices, rtol=1e-6, atol=1e-6)
+    if faces is None:
+        np.testing.assert_array_equal(loaded.colors, expected.colors)
+    else:
+        np.testing.assert_array_equal(loaded.faces, expected.faces)
+        np.testing.assert_array_equal(loaded.visual.vertex_colors, expected.visual.vertex_colors)
@@ -0,0 +1,44 @@
+import os
+
+import numpy as np
+import trimesh
+
+from wis3d import formats
+from wis3d.lod import MESH_LOD_MIN_FACES, decimate_mesh, mesh_level_path, sidecar_dir, write_mesh_levels
+
+
+def write_mesh(path, mesh):
+    with open(path, "wb") as f:
+        f.write(formats.encode_ply(mesh.vertices, mesh.faces))
+
+
+def test_decimate_mesh_reduces_faces():
+    mesh = trimesh.creation.icosphere(5)
+    vertices, faces, _ = decimate_mesh(mesh.vertices, mesh.faces, 0.1)
+    assert MESH_LOD_MIN_FACES <= len(faces) <= 0.15 * len(mesh.faces)
+    assert faces.max() < len(vertices)
+
+
+def test_levels_without_enough_faces_are_skipped(tmp_path):
+    path = str(tmp_path / "small.ply")
+    write_mesh(path, trimesh.creation.icosphere(2))
+    assert write_mesh_levels(path, (0.01, 0.1)) == [0.1]
+    assert not os.path.exists(mesh_level_path(path, 0.01))
+    level = trimesh.load(mesh_level_path(path, 0.1), process=False)
+    assert len(level.faces) >= MESH_LOD_MIN_FACES
+
+
+def test_no_sidecar_folder_without_levels(tmp_path):
+    path = str(tmp_path / "tiny.ply")
+    write_mesh(path, trimesh.creation.box())
+    assert write_mesh_levels(path) == []
+    assert not os.path.exists(sidecar_dir(path))
+
+
+def test_stale_level_is_removed(tmp_path):
+    path = str(tmp_path / "mesh.ply")
+    write_mesh(path, trimesh.creation.icosphere(4))
+    assert write_mesh_levels(path, (0.01,)) == [0.01]
+    write_mesh(path, trimesh.creation.box())
+    assert write_mesh_levels(path, (0.01,)) == []
+    assert not os.path.exists(mesh_level_path(path, 0.01))
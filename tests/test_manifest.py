@@ -0,0 +1,62 @@
+import glob
+import os
+
+import numpy as np
+
+from wis3d import Wis3D
+from wis3d.manifest import Manifest, ManifestWriter, append_removed_scene, manifest_path
+from wis3d.server import Visualizer
+
+
+def write_scenes(tmp_path, sequence="seq", scenes=2):
+    vis3d = Wis3D(str(tmp_path), sequence)
+    for scene in range(scenes):
+        vis3d.set_scene_id(scene)
+        vis3d.add_point_cloud(np.random.default_rng(scene).random((10, 3)), name="points")
+        vis3d.add_lines(np.zeros((2, 3)), np.ones((2, 3)), name="lines")
+    vis3d.close()
+    return str(tmp_path / sequence)
+
+
+def test_manifest_lists_the_written_files(tmp_path):
+    seq_folder = write_scenes(tmp_path)
+    manifest = Manifest(seq_folder)
+    assert manifest.scene_names() == ["00000", "00001"]
+    for scene in manifest.scene_names():
+        files = manifest.files_in_scene(scene)
+        folders = glob.glob(os.path.join(seq_folder, scene, "*"))
+        assert files == {os.path.basename(folder): sorted(os.listdir(folder)) for folder in folders}
+
+
+def test_server_lists_the_same_with_and_without_manifest(tmp_path):
+    seq_folder = write_scenes(tmp_path)
+    visualizer = Visualizer(str(tmp_path), str(tmp_path))
+    scenes = visualizer.all_scenes_in_sequence("seq")
+    files = [visualizer.files_in_scene(scene) for scene in scenes]
+    os.remove(manifest_path(seq_folder))
+    visualizer = Visualizer(str(tmp_path), str(tmp_path))
+    assert visualizer.all_scenes_in_sequence("seq") == scenes
+    assert [visualizer.files_in_scene(scene) for scene in scenes] == files
+
+
+def test_manifest_refresh(tmp_path):
+    seq_folder = write_scenes(tmp_path)
+    manifest = Manifest(seq_folder)
+    append_removed_scene(seq_folder, 0)
+    # a line without its newline is still being written
+    with open(manifest_path(seq_folder), "ab") as f:
+        f.write(b'{"scene": 2, "type": "meshes", "name": "mesh.ply", "size": 1, "mtime": 0')
+    manifest.refresh()
+    assert manifest.scene_names() == ["00001"]
+    with open(manifest_path(seq_folder), "ab") as f:
+        f.write(b"}\n")
+    manifest.refresh()
+    assert manifest.scene_names() == ["00001", "00002"]
+    assert manifest.files_in_scene("00002") == {"meshes": ["mesh.ply"]}
+
+
+def test_no_manifest_for_sequences_written_without_one(tmp_path):
+    seq_folder = write_scenes(tmp_path)
+    os.remove(manifest_path(seq_folder))
+    ManifestWriter.writers.clear()
+    assert ManifestWriter.open(seq_folder) is None
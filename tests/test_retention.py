@@ -0,0 +1,101 @@
+import json
+import os
+
+import numpy as np
+
+from wis3d import Wis3D
+from wis3d.manifest import Manifest
+from wis3d.retention import ACCESS_FILE, RetentionManager, parse_age, parse_size
+from wis3d.store import OBJECTS_FOLDER
+
+
+def make_scene(seq_folder, name, size=100, mtime=0.0):
+    folder = os.path.join(seq_folder, name, "meshes")
+    os.makedirs(folder)
+    path = os.path.join(folder, "mesh.ply")
+    with open(path, "wb") as f:
+        f.write(b"\0" * size)
+    os.utime(path, (mtime, mtime))
+
+
+def make_sequence(tmp_path, scenes=5, size=100):
+    seq_folder = str(tmp_path / "seq")
+    for i in range(scenes):
+        make_scene(seq_folder, "%05d" % i, size, mtime=1000.0 + i)
+    return seq_folder
+
+
+def names(scenes):
+    return sorted(scene.name for scene in scenes)
+
+
+def test_parse_limits():
+    assert parse_size("500M") == 500 << 20
+    assert parse_size("1.5gb") == 3 << 29
+    assert parse_age("12h") == 12 * 3600
+    assert parse_age(30) == 30
+
+
+def test_max_scenes_keeps_the_latest(tmp_path):
+    make_sequence(tmp_path)
+    retention = RetentionManager(str(tmp_path), max_scenes_per_sequence=3)
+    assert names(retention.select()) == ["00000", "00001"]
+    # the scene about to be written counts as one of the kept scenes
+    assert names(retention.select(incoming=[str(tmp_path / "seq" / "00005")])) == ["00000", "00001", "00002"]
+    assert names(retention.select(incoming=[str(tmp_path / "seq" / "00004")])) == ["00000", "00001"]
+
+
+def test_max_age_and_order(tmp_path):
+    seq_folder = make_sequence(tmp_path)
+    assert names(RetentionManager(str(tmp_path), max_age=2.5).select(now=1004.0)) == ["00000", "00001"]
+    with open(os.path.join(seq_folder, ACCESS_FILE), "w") as f:
+        json.dump({"00000": 1010.0, "00001": 1010.0}, f)
+    retention = RetentionManager(str(tmp_path), max_scenes_per_sequence=3, order="lru")
+    assert names(retention.select()) == ["00002", "00003"]
+
+
+def test_max_bytes_evicts_oldest_first(tmp_path):
+    make_sequence(tmp_path)
+    # the latest scene is never evicted, even if it is over the limit alone
+    assert names(RetentionManager(str(tmp_path), max_bytes=250).select()) == ["00000", "00001", "00002"]
+    assert names(RetentionManager(str(tmp_path), max_bytes=0).select()) == ["00000", "00001", "00002", "00003"]
+
+
+def test_other_folders_are_ignored(tmp_path):
+    seq_folder = make_sequence(tmp_path, scenes=2)
+    make_scene(seq_folder, "notes", size=1000)
+    assert names(RetentionManager(str(tmp_path), max_scenes_per_sequence=1).select()) == ["00000"]
+    assert RetentionManager(str(tmp_path), max_bytes=200).select() == []
+
+
+def test_deduplicated_objects_are_counted_once(tmp_path):
+    vertices = np.random.default_rng(0).random((1000, 3))
+    vis3d = Wis3D(str(tmp_path), "seq", dedup=True)
+    for scene in range(3):
+        vis3d.set_scene_id(scene)
+        vis3d.add_point_cloud(vertices, name="points")
+    vis3d.close()
+    retention = RetentionManager(str(tmp_path))
+    assert [scene.size for scene in retention.scenes(str(tmp_path / "seq"))] == [0, 0, 0]
+    objects = tmp_path / "seq" / OBJECTS_FOLDER
+    size = sum(path.stat().st_size for path in objects.iterdir())
+    assert RetentionManager(str(tmp_path), max_bytes=size).select() == []
+
+
+def test_collect_removes_scenes(tmp_path):
+    vis3d = Wis3D(str(tmp_path), "seq", dedup=True)
+    for scene in range(3):
+        vis3d.set_scene_id(scene)
+        vis3d.add_point_cloud(np.full((10, 3), scene), name="points")
+    vis3d.close()
+    objects = tmp_path / "seq" / OBJECTS_FOLDER
+    assert len(list(objects.iterdir())) == 3
+    retention = RetentionManager(str(tmp_path), max_scenes_per_sequence=1)
+    assert names(retention.collect(dry_run=True)) == ["00000", "00001"]
+    assert (tmp_path / "seq" / "00000").exists()
+    assert names(retention.collect()) == ["00000", "00001"]
+    assert sorted(os.listdir(tmp_path / "seq")) == sorted([".manifest.jsonl", OBJECTS_FOLDER, "00002"])
+    assert Manifest(str(tmp_path / "seq")).scene_names() == ["00002"]
+    # the objects only linked from the evicted scenes are pruned
+    assert len(list(objects.iterdir())) == 1
+    assert retention.evicted_scenes == 2
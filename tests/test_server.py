@@ -0,0 +1,23 @@
+import cherrypy
+import numpy as np
+import pytest
+
+from wis3d import Wis3D, formats
+from wis3d.server import Visualizer
+
+
+def test_mmap_file_round_trip(tmp_path):
+    vertices = np.random.default_rng(0).random((10, 3)).astype(np.float32)
+    Wis3D(str(tmp_path), "seq", point_cloud_format="bin").add_point_cloud(vertices, name="points")
+    path = tmp_path / "seq" / "00000" / "point_clouds" / "points.w3dp"
+    body = b"".join(Visualizer(str(tmp_path), str(tmp_path)).file(str(path)))
+    assert body == path.read_bytes()
+    assert formats.decode_point_cloud(body)[1] is None
+
+
+def test_missing_mmap_file_is_not_found(tmp_path):
+    (tmp_path / "seq" / "00000" / "point_clouds").mkdir(parents=True)
+    visualizer = Visualizer(str(tmp_path), str(tmp_path))
+    for name in ("points.w3dp", "lines.w3db"):
+        with pytest.raises(cherrypy.NotFound):
+            visualizer.file(str(tmp_path / "seq" / "00000" / "point_clouds" / name))
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+import torch
+
+from wis3d import Wis3D
+from wis3d.transfer import FakeBackend, get_backend, set_backend
+
+
+@pytest.fixture
+def backend():
+    previous = get_backend()
+    backend = FakeBackend()
+    set_backend(backend)
+    yield backend
+    set_backend(previous)
+
+
+def inputs():
+    rng = np.random.default_rng(0)
+    vertices = rng.random((100, 3), dtype=np.float32)
+    colors = rng.integers(0, 256, (100, 3), dtype=np.uint8)
+    faces = rng.integers(0, 100, (50, 3), dtype=np.int64)
+    return vertices, colors, faces
+
+
+def add_objects(vis3d, vertices, colors, faces):
+    vis3d.add_point_cloud(vertices, colors, name="points")
+    vis3d.add_mesh(vertices, faces, colors, name="mesh")
+
+
+def written(tmp_path, sequence):
+    scene = tmp_path / sequence / "00000"
+    return {path.relative_to(scene): path.read_bytes() for path in scene.rglob("*") if path.is_file()}
+
+
+def test_transfer_per_call(tmp_path, backend):
+    arrays = inputs()
+    add_objects(Wis3D(str(tmp_path), "arrays"), *arrays)
+    vis3d = Wis3D(str(tmp_path), "tensors", transfer="call")
+    vis3d.add_point_cloud(*map(torch.from_numpy, arrays[:2]), name="points")
+    assert (backend.copies, backend.synchronizations) == (2, 1)
+    vis3d.add_mesh(*map(torch.from_numpy, (arrays[0], arrays[2], arrays[1])), name="mesh")
+    assert (backend.copies, backend.synchronizations) == (5, 2)
+    assert len(written(tmp_path, "arrays")) == 2
+    assert written(tmp_path, "tensors") == written(tmp_path, "arrays")
+
+
+def test_transfer_per_scene(tmp_path, backend):
+    arrays = inputs()
+    add_objects(Wis3D(str(tmp_path), "arrays"), *arrays)
+    vis3d = Wis3D(str(tmp_path), "tensors", transfer="scene")
+    tensors = [torch.from_numpy(array.copy()) for array in arrays]
+    add_objects(vis3d, *tensors)
+    # the calls are queued, and their inputs copied, until the scene ends
+    for tensor in tensors:
+        tensor.zero_()
+    assert backend.synchronizations == 0
+    assert written(tmp_path, "tensors") == {}
+    vis3d.set_scene_id(1)
+    assert (backend.copies, backend.synchronizations) == (5, 1)
+    assert written(tmp_path, "tensors") == written(tmp_path, "arrays")
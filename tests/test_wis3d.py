@@ -0,0 +1,129 @@
+import glob
+import json
+import os
+
+import numpy as np
+import pytest
+import trimesh
+from transforms3d import affines, euler, quaternions
+
+from wis3d import Wis3D, formats
+from wis3d.wis3d import _encode_boxes, _euler2mat, _mat2euler
+
+RED = np.array([255, 0, 0], np.uint8)
+
+
+def read_colors(path):
+    if path.endswith(".ply"):
+        geometry = trimesh.load(path, process=False)
+        return geometry.colors if isinstance(geometry, trimesh.PointCloud) else geometry.visual.vertex_colors
+    if path.endswith(".w3dp"):
+        return formats.decode_point_cloud(open(path, "rb").read())[1]
+    if path.endswith(".w3dq"):
+        return formats.decode_quantized(open(path, "rb").read())[2]
+    chunks = sorted(glob.glob(os.path.join(os.path.dirname(path), "." + os.path.basename(path), "*.w3dp")))
+    return np.concatenate([formats.decode_point_cloud(open(chunk, "rb").read())[1] for chunk in chunks])
+
+
+@pytest.mark.parametrize("options", [dict(), dict(compression="zlib"), dict(point_cloud_format="bin"), dict(point_cloud_format="octree")])
+@pytest.mark.parametrize("color", [RED, np.array([1.0, 0.0, 0.0, 1.0])])
+def test_single_color(tmp_path, options, color):
+    vertices = np.random.default_rng(0).random((100, 3))
+    faces = np.random.default_rng(1).integers(0, 100, (50, 3))
+    vis3d = Wis3D(str(tmp_path), "single", **options)
+    vis3d.add_point_cloud(vertices, color, name="points")
+    vis3d.add_mesh(vertices, faces, color, name="mesh")
+
+    scene = tmp_path / "single" / "00000"
+    paths = glob.glob(str(scene / "point_clouds" / "points.*")) + glob.glob(str(scene / "meshes" / "mesh.*"))
+    assert len(paths) == 2
+    for path in paths:
+        colors = read_colors(path)
+        # meshes built by trimesh drop unreferenced vertices
+        assert 0 < len(colors) <= 100
+        assert (colors[:, :3] == RED).all()
+
+
+def rotations(n, seed=0):
+    rng = np.random.default_rng(seed)
+    q = rng.normal(size=(n, 4))
+    q /= np.linalg.norm(q, axis=1, keepdims=True)
+    return np.stack([quaternions.quat2mat(v) for v in q])
+
+
+@pytest.mark.parametrize("axes", sorted(euler._AXES2TUPLE))
+def test_euler_conversions_match_transforms3d(axes):
+    mats = rotations(100)
+    # gimbal lock and half turns
+    mats = np.concatenate([mats, [np.eye(3), np.diag([1.0, -1, -1]), euler.euler2mat(0.3, np.pi / 2, 0.2, axes)]])
+    eulers = _mat2euler(mats, axes)
+    for mat, angles in zip(mats, eulers):
+        expected = euler.mat2euler(mat, axes)
+        # angles of pi and -pi are the same rotation, `_mat2euler` always returns pi
+        np.testing.assert_allclose(np.abs(angles), np.abs(expected), atol=1e-9)
+        np.testing.assert_allclose(euler.euler2mat(*angles, axes), mat, atol=1e-9)
+    np.testing.assert_allclose(_euler2mat(eulers, axes), mats, atol=1e-9)
+
+
+def test_mat2euler_signs_are_stable():
+    angles = _mat2euler(np.stack([np.eye(3), np.diag([1.0, -1, -1]), np.diag([-1.0, -1, 1])]), "rxyz")
+    assert not np.signbit(angles).any()
+    assert np.isin(angles, (0, np.pi)).all()
+
+
+def test_encode_boxes_matches_per_box_composition():
+    rng = np.random.default_rng(0)
+    positions = rng.random((50, 3))
+    eulers = rng.random((50, 3)) * 2 * np.pi - np.pi
+    extents = rng.random((50, 3)) + 0.1
+    # negative extents are mirrored boxes, which are decomposed with a flipped x axis
+    extents[::5, 1] *= -1
+    transform = np.array([[1, 0, 0, 0], [0, 0, 1, 0], [0, -1, 0, 0], [0, 0, 0, 1]], dtype=np.float64)
+    boxes = json.loads(_encode_boxes(positions, eulers, extents, "rxyz", None, transform))
+    for box, T, E, Z in zip(boxes, positions, eulers, extents):
+        T, R, Z, _ = affines.decompose(transform @ affines.compose(T, euler.euler2mat(*E, "rxyz"), Z))
+        np.testing.assert_allclose(box["position"], T, atol=1e-9)
+        np.testing.assert_allclose(box["extent"], Z, atol=1e-9)
+        np.testing.assert_allclose(euler.euler2mat(*box["euler"], "rxyz"), R, atol=1e-9)
+
+
+def add_primitives(vis3d):
+    rng = np.random.default_rng(0)
+    points = rng.random((20, 3))
+    colors = rng.integers(0, 256, (20, 3), dtype=np.uint8)
+    vis3d.add_lines(points, points + 1, colors, name="lines")
+    vis3d.add_voxel(points, 0.1, colors, name="voxels")
+    vis3d.add_spheres(points, np.arange(20.0), colors, name="spheres")
+    return points, colors
+
+
+def test_primitives_are_written_by_column(tmp_path):
+    vis3d = Wis3D(str(tmp_path), "columns")
+    points, colors = add_primitives(vis3d)
+    world = points @ vis3d.three_to_world[:3, :3].T
+    scene = tmp_path / "columns" / "00000"
+    lines = json.loads((scene / "lines" / "lines.json").read_text())
+    np.testing.assert_allclose(lines["start_points"], world)
+    np.testing.assert_allclose(lines["end_points"], (points + 1) @ vis3d.three_to_world[:3, :3].T)
+    assert lines["colors"] == colors.tolist()
+    voxels = json.loads((scene / "voxels" / "voxels.json").read_text())
+    assert voxels["voxel_size"] == 0.1
+    np.testing.assert_allclose(voxels["voxel_centers"], world)
+    assert voxels["colors"] == colors.tolist()
+    spheres = json.loads((scene / "spheres" / "spheres.json").read_text())
+    np.testing.assert_allclose(spheres["centers"], world)
+    assert spheres["radii"] == list(range(20))
+    assert spheres["colors"] == colors.tolist()
+    assert len(spheres["scales"]) == len(spheres["quaternions"]) == 20
+
+
+def test_binary_primitives_hold_the_json_columns(tmp_path):
+    add_primitives(Wis3D(str(tmp_path), "json"))
+    add_primitives(Wis3D(str(tmp_path), "bin", primitive_format="bin"))
+    for folder, name in (("lines", "lines"), ("voxels", "voxels"), ("spheres", "spheres")):
+        columns = json.loads((tmp_path / "json" / "00000" / folder / (name + ".json")).read_text())
+        arrays, meta = formats.decode_arrays((tmp_path / "bin" / "00000" / folder / (name + ".w3db")).read_bytes())
+        assert set(arrays) | set(meta) == set(columns)
+        for key, value in columns.items():
+            np.testing.assert_allclose(arrays[key] if key in arrays else meta[key], value, rtol=1e-6)
+        assert arrays["colors"].dtype == np.uint8
@@ -0,0 +1,71 @@
+import gc
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from wis3d.writer import SHARED_MEMORY_THRESHOLD, AsyncWriter
+
+
+def sleep_and_return(seconds, value):
+    time.sleep(seconds)
+    return value
+
+
+def fail():
+    raise ValueError("encoder failed")
+
+
+def test_callbacks_run_in_submission_order():
+    with ThreadPoolExecutor(4) as executor:
+        writer = AsyncWriter(executor)
+        written = []
+        for i in range(8):
+            # later tasks finish first
+            writer.submit(sleep_and_return, 0.01 * (8 - i), i, callback=written.append)
+        writer.flush()
+        assert written == list(range(8))
+        writer.close()
+
+
+def test_failed_task_does_not_block_later_ones():
+    writer = AsyncWriter()
+    written = []
+    with pytest.warns(UserWarning, match="encoder failed"):
+        writer.submit(fail, callback=written.append)
+        writer.submit(sleep_and_return, 0, 1, callback=written.append)
+        writer.flush()
+    assert written == [1]
+    writer.close()
+
+
+def test_close_rejects_later_tasks():
+    writer = AsyncWriter()
+    writer.close()
+    with pytest.raises(RuntimeError):
+        writer.submit(sleep_and_return, 0, 1)
+
+
+def test_writers_share_the_default_thread_and_are_not_kept_alive():
+    writers = [AsyncWriter(), AsyncWriter("thread")]
+    assert writers[0].executor is writers[1].executor
+    ref = weakref.ref(writers[0])
+    del writers
+    gc.collect()
+    assert ref() is None
+
+
+def test_process_executor_round_trip():
+    writer = AsyncWriter("process")
+    assert writer.executor is AsyncWriter("process").executor
+    # the large array goes through shared memory, the small one is pickled
+    large = np.arange(SHARED_MEMORY_THRESHOLD // 8, dtype=np.float64)
+    written = []
+    writer.submit(np.sum, large, callback=written.append)
+    writer.submit(np.sum, large[:10], callback=written.append)
+    large[:] = 0
+    writer.flush()
+    assert written == [np.arange(len(large)).sum(), 45]
+    writer.close()
@@ -1,7 +1,6 @@
 # coding=utf-8
+import sys
 from argparse import ArgumentParser
-from wis3d.wis3d import Wis3D
-from wis3d.server import run_server
 from wis3d.version import __version__
 
 # from setuptools.config import read_configuration
@@ -10,7 +9,46 @@ from wis3d.version import __version__
 #     os.path.dirname(__file__), '..', 'setup.cfg'))
 
 
+def __getattr__(name):
+    # the writer and the server are imported on first use, so that the tools only load the dependencies they need
+    if name == "Wis3D":
+        from wis3d.wis3d import Wis3D
+        return Wis3D
+    if name == "run_server":
+        from wis3d.server import run_server
+        return run_server
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def gc(argv=None):
+    """
+    Usage: wis3d gc --vis_dir VIS_DIR [--max_bytes 10G] [--max_scenes N] [--max_age 7d] [--order lru] [--dry_run]
+    """
+    from wis3d.retention import RetentionManager
+
+    parser = ArgumentParser(prog="wis3d gc", description="evict old scenes of a visualization folder")
+    parser.add_argument("--vis_dir", type=str, required=True, help="the dir that holds the export to visualize")
+    parser.add_argument("--max_bytes", type=str, default=None, help="maximum total size, e.g. 500M or 10G")
+    parser.add_argument("--max_scenes", type=int, default=None, help="maximum number of scenes per sequence")
+    parser.add_argument("--max_age", type=str, default=None, help="maximum age of scenes, e.g. 12h or 7d")
+    parser.add_argument(
+        "--order", choices=["oldest", "lru"], default="oldest", help="evict the oldest or the least recently viewed scenes first"
+    )
+    parser.add_argument("--dry_run", default=False, action="store_true", help="only list the scenes to evict")
+    args = parser.parse_args(argv)
+
+    manager = RetentionManager(args.vis_dir, args.max_bytes, args.max_scenes, args.max_age, args.order)
+    evicted = manager.collect(dry_run=args.dry_run)
+    for scene in evicted:
+        print(("would evict " if args.dry_run else "evicted ") + scene.path)
+    print("{} {} scenes, {:.1f} MB".format(
+        "Would evict" if args.dry_run else "Evicted", len(evicted), sum(scene.size for scene in evicted) / 2 ** 20
+    ))
+
+
 def main():
+    if sys.argv[1:2] == ["gc"]:
+        return gc(sys.argv[2:])
     parser = ArgumentParser()
     parser.add_argument(
         "-v",
@@ -32,4 +70,5 @@ def main():
     )
     args = parser.parse_args()
 
+    from wis3d.server import run_server
     run_server(args.vis_dir, args.host, args.port, args.verbose)
@@ -1,7 +1,8 @@
 import { memo, useState, useMemo, useRef, useCallback, useLayoutEffect, useEffect } from "react";
 import { extend, Object3DNode, ThreeEvent } from "@react-three/fiber";
 import { BufferGeometry, PerspectiveCamera, BufferAttribute, Vector3Tuple, CameraHelper, Line, Vector3 , Points} from "three";
-import { useXHR } from "@/utils/hooks";
+import { useObjectData } from "@/utils/hooks";
+import { PackedArray, getRow, toPacked } from "@/utils/container";
 import { centerOnDbClick } from "./trackball-controls";
 
 extend({ Line_: Line });
@@ -35,9 +36,14 @@ interface IProps {
 
 const initalValue: Trajectory = { positions: [], eulers: [] };
 
+const getPose = (array: PackedArray, i: number) => Array.from(getRow(array, i)) as Vector3Tuple;
+
 export const CameraPose = memo<IProps>(function CameraPose(props) {
   const { url, showCamera, visible, lineColor = "#1f77b4", pointSize = 0.03, pointColor = "#ffffff", defaultColor, vertexColors, onLoad } = props;
-  const { positions, eulers } = useXHR(url, "Get", "json", initalValue);
+  const data = useObjectData<any>(url, initalValue);
+  // binary files hold packed arrays, JSON files nested ones
+  const positions = useMemo(() => toPacked(data.positions, 3), [data]);
+  const eulers = useMemo(() => toPacked(data.eulers, 3), [data]);
   const cameraHelper = useRef<CameraHelper>();
   const [geometry, setGeometry] = useState<BufferGeometry>();
   const [pointsRef, setPointsRef] = useState<Points>();
@@ -46,9 +52,10 @@ export const CameraPose = memo<IProps>(function CameraPose(props) {
   // const posAttr = useMemo(() => new BufferAttribute(new Float32Array(positions.flat()), 3), [positions]);
 
   useLayoutEffect(() => {
-    const i = positions.length - 1;
+    const i = positions.count - 1;
+    if (i < 0) return;
     setSelection(i);
-    onLoad?.(positions[i], eulers[i]);
+    onLoad?.(getPose(positions, i), getPose(eulers, i));
   }, [positions, eulers]);
 
   // useLayoutEffect(() => {
@@ -59,8 +66,7 @@ export const CameraPose = memo<IProps>(function CameraPose(props) {
 
   useEffect(() => {
     const newGeometry = new BufferGeometry();
-    const newArr = new Float32Array(positions.flat());
-    const newBufferAttribute = new BufferAttribute(newArr, 3);
+    const newBufferAttribute = new BufferAttribute(positions.values, positions.stride);
     newGeometry.attributes.position = newBufferAttribute;
     setGeometry(newGeometry);
   }, [positions])
@@ -69,7 +75,7 @@ export const CameraPose = memo<IProps>(function CameraPose(props) {
     setSelection(e.index);
   }, []);
 
-  return positions.length > 0 ? (
+  return positions.count > 0 ? (
     <group visible={visible}>
       <perspectiveCamera
         ref={setCamera}
@@ -77,8 +83,8 @@ export const CameraPose = memo<IProps>(function CameraPose(props) {
         aspect={1}
         near={0.05}
         far={0.1}
-        position={positions[selection]}
-        rotation={eulers[selection]}
+        position={getPose(positions, selection)}
+        rotation={getPose(eulers, selection)}
       />
       {showCamera && camera && <cameraHelper ref={cameraHelper} args={[camera]} name="trajectory_camera" />}
     <points onClick={onClick} onDoubleClick={centerOnDbClick} geometry={geometry}>
@@ -13,7 +13,7 @@ import { useControls, LevaInputs, buttonGroup } from "leva";
 import { Schema, StoreType, ButtonGroupInput } from "leva/dist/declarations/src/types";
 import { useImages, useXHR } from "@/utils/hooks";
 import { theme } from "@/utils/theme";
-import { inside, zoom } from "@/utils/misc";
+import { inside, resolveFileUrl, zoom } from "@/utils/misc";
 import { LineSegment } from "./line-segment";
 import { MetaView } from "../react/meta-view";
 import { KeypointInfoView } from "../react/keypoint-info-view";
@@ -89,7 +89,7 @@ export const Correspondence = memo<IProps>(function Correspondence(props) {
   const colorFunc = useMemo(() => Function("palette", "min", "max", "localMax", "val", "i", colorFuncBody), [colorFuncBody]);
   const [thresholds, setThresholds] = useState<Record<string, [number, number]>>({});
   const [filters, setFilters] = useState<Record<string, IFilter>>({});
-  const [images, loaded] = useImages([img0, img1]);
+  const [images, loaded] = useImages([resolveFileUrl(url, img0), resolveFileUrl(url, img1)]);
 
   const onMouseEnter = useCallback((ev: Konva.KonvaEventObject<MouseEvent>) => {
     setHoveredIndex(ev.target.parent?.attrs.index);
@@ -1,18 +1,18 @@
 import { memo, useMemo } from "react";
 import { Object3DNode, extend, useThree, RootState } from "@react-three/fiber";
-import { useXHR } from "@/utils/hooks";
-import { Line2 } from "three/examples/jsm/lines/Line2";
-import { LineGeometry } from "three/examples/jsm/lines/LineGeometry";
+import { useObjectData } from "@/utils/hooks";
+import { toPacked } from "@/utils/container";
+import { LineSegments2 } from "three/examples/jsm/lines/LineSegments2";
+import { LineSegmentsGeometry } from "three/examples/jsm/lines/LineSegmentsGeometry";
 import { LineMaterial } from "three/examples/jsm/lines/LineMaterial";
 import { centerOnDbClick } from "./trackball-controls";
 
-extend({ LineMaterial, LineGeometry, Line2 });
+extend({ LineMaterial, LineSegments2 });
 
 declare global {
   namespace JSX {
     interface IntrinsicElements {
-      line2: Object3DNode<Line2, typeof Line2>;
-      lineGeometry: Object3DNode<LineGeometry, typeof LineGeometry>;
+      lineSegments2: Object3DNode<LineSegments2, typeof LineSegments2>;
       lineMaterial: Object3DNode<LineMaterial, typeof LineMaterial>;
     }
   }
@@ -29,33 +29,62 @@ interface IProps {
 
 const sizeSelector = (state: RootState) => state.size;
 
+// older files store one object per line
+function toRows(data) {
+  return {
+    start_points: data.map((line) => line.start_point),
+    end_points: data.map((line) => line.end_point),
+    colors: data.some((line) => line.color) ? data.map((line) => line.color ?? [0, 0, 0]) : undefined,
+  };
+}
+
+// all the lines in one geometry, from the arrays of binary files or of files written column-wise
+function toGeometry(data) {
+  const columns = Array.isArray(data) ? toRows(data) : data;
+  if (!columns.start_points) return null;
+  const starts = toPacked(columns.start_points, 3);
+  if (starts.count == 0) return null;
+  const ends = toPacked(columns.end_points, 3);
+  const positions = new Float32Array(starts.count * 6);
+  for (let i = 0; i < starts.count; i++) {
+    for (let j = 0; j < 3; j++) {
+      positions[i * 6 + j] = starts.values[i * starts.stride + j];
+      positions[i * 6 + 3 + j] = ends.values[i * ends.stride + j];
+    }
+  }
+  const geometry = new LineSegmentsGeometry().setPositions(positions);
+  if (columns.colors) {
+    const colors = toPacked(columns.colors, 3);
+    const segmentColors = new Float32Array(colors.count * 6);
+    for (let i = 0; i < colors.count; i++) {
+      for (let j = 0; j < 3; j++) {
+        segmentColors[i * 6 + j] = segmentColors[i * 6 + 3 + j] = colors.values[i * colors.stride + j] / 250;
+      }
+    }
+    geometry.setColors(segmentColors);
+  }
+  return { geometry, hasColors: !!columns.colors };
+}
+
 export const Lines = memo<IProps>(function Lines(props) {
   const size = useThree(sizeSelector);
   const { url, defaultColor, name, visible = true, lineWidth, vertexColors } = props;
-  const lines = useXHR(url, "GET", "json", []);
-  const geoms = useMemo(
-    () =>
-      lines.map(({ start_point, end_point }) => {
-        const geom = new LineGeometry();
-        return geom.setPositions([...start_point, ...end_point]);
-      }),
-    [lines]
-  );
+  const data = useObjectData<any>(url, []);
+  const lines = useMemo(() => toGeometry(data), [data]);
+  if (!lines) return null;
+  const colored = vertexColors && lines.hasColors;
 
   return (
     <group visible={visible}>
-      {geoms.map((geom, index) => {
-        const color = lines[index].color ? lines[index].color.map(x => x/250) : undefined;
-        return (
-          <line2 key={index} geometry={geom} onDoubleClick={centerOnDbClick}>
-            <lineMaterial
-              color={(vertexColors && color) || defaultColor}
-              linewidth={lineWidth}
-              resolution={[size.width, size.height] as any}
-            />
-          </line2>
-        );
-      })}
+      <lineSegments2 geometry={lines.geometry} onDoubleClick={centerOnDbClick}>
+        <lineMaterial
+          key={String(colored)}
+          color={colored ? "#ffffff" : defaultColor}
+          vertexColors={colored}
+          linewidth={lineWidth}
+          resolution={[size.width, size.height] as any}
+        />
+      </lineSegments2>
     </group>
   );
 });
@@ -1,10 +1,12 @@
-import {useLoader} from "@/utils/hooks";
-import {memo, useRef, useMemo, useLayoutEffect, MutableRefObject} from "react";
-import {FrontSide, Material, Side} from "three";
+import {useLoader, useXHR} from "@/utils/hooks";
+import {memo, useRef, useMemo, useLayoutEffect, useEffect, useState, MutableRefObject} from "react";
+import {BufferGeometry, FrontSide, Material, Side} from "three";
+import {invalidate} from "@react-three/fiber";
 import {SpotLight} from "three";
 import {OBJLoader} from "three/examples/jsm/loaders/OBJLoader";
 import {PLYLoader} from "three/examples/jsm/loaders/PLYLoader";
 import {centerOnDbClick} from "./trackball-controls";
+import {getUrlPath} from "@/utils/misc";
 // import {GLTFLoader} from "three/examples/jsm/loaders/GLTFLoader";
 
 interface IProps {
@@ -86,9 +88,48 @@ const ObjMesh = memo<IProps>(function ObjMesh(props) {
     return obj && <primitive object={obj}/>;
 });
 
+/**
+ * Load the decimated levels of a mesh listed by the server, coarsest first, then the mesh itself,
+ * and return the finest geometry loaded so far.
+ */
+function useProgressivePLY(url: string) {
+    const base = url.split("/file?")[0];
+    const path = encodeURIComponent(getUrlPath(url));
+    const levels = useXHR<number[]>(`${base}/mesh_levels?path=${path}`, "GET", "json");
+    const [geometry, setGeometry] = useState<BufferGeometry>();
+
+    useEffect(() => {
+        if (levels === undefined) return;
+        // null if the server cannot list levels, then the mesh is loaded directly
+        const urls = (levels ?? []).map((ratio) => `${base}/mesh_level?path=${path}&ratio=${ratio}`).concat(url);
+        const loader = new PLYLoader();
+        let cancelled = false;
+        let current: BufferGeometry;
+        const load = (i: number) => {
+            loader.load(urls[i], (res) => {
+                if (cancelled) return res.dispose();
+                current?.dispose();
+                current = res;
+                setGeometry(res);
+                invalidate();
+                if (i + 1 < urls.length) load(i + 1);
+            }, undefined, () => {
+                // a missing level is skipped
+                if (!cancelled && i + 1 < urls.length) load(i + 1);
+            });
+        };
+        load(0);
+        return () => {
+            cancelled = true;
+        };
+    }, [levels, url]);
+
+    return geometry;
+}
+
 const PlyMesh = memo<IProps>(function PlyMesh(props) {
     const {url, vertexColors, material, color, visible, wireframe, side, flatShading, shininess} = props;
-    const geometry = useLoader(PLYLoader, url);
+    const geometry = useProgressivePLY(url);
     const materialRef = useRef<Material>();
     const useVertexColors = useMemo(() => geometry?.hasAttribute("color") && vertexColors, [geometry, vertexColors]);
 
@@ -110,29 +151,8 @@ const PlyMesh = memo<IProps>(function PlyMesh(props) {
 });
 
 
-function extractPath(url) {
-    // Split the URL at "path="
-    const parts = url.split("path=");
-
-    // Check if the "path=" part exists
-    if (parts.length < 2) {
-        return null; // "path=" not found in the URL
-    }
-
-    // Take the part after "path="
-    const pathAndRest = parts[1];
-
-    // Split this part at the first "&"
-    const pathPart = pathAndRest.split("&")[0];
-
-    // Decode the path
-    const decodedPath = decodeURIComponent(pathPart);
-
-    return decodedPath;
-}
-
 export const Mesh = memo<IProps>(function Mesh(props) {
-    const decodedPath = extractPath(props.url);
+    const decodedPath = getUrlPath(props.url);
     console.log("props.url", props.url,"decodedPath",decodedPath, decodedPath.endsWith("ply"), decodedPath.endsWith("obj"));
     if (decodedPath.endsWith("ply")) {
         return <PlyMesh {...props} />;
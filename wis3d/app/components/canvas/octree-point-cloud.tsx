@@ -0,0 +1,184 @@
+import { memo, useEffect, useLayoutEffect, useMemo, useRef, useState } from "react";
+import { invalidate, useFrame } from "@react-three/fiber";
+import { Box3, BufferGeometry, Frustum, Matrix4, PerspectiveCamera, PointsMaterial, Sphere, Vector3 } from "three";
+import { useXHR } from "@/utils/hooks";
+import { getUrlPath } from "@/utils/misc";
+import { BinaryPointCloudLoader } from "@/utils/loaders/BinaryPointCloudLoader";
+import { centerOnDbClick } from "./trackball-controls";
+
+// index of an octree point cloud (.w3do), see wis3d/lod.py
+type OctreeIndex = {
+  count: number;
+  capacity: number;
+  min: [number, number, number];
+  size: number;
+  nodes: Record<string, number>;
+};
+
+interface IProps {
+  url: string;
+  color?: string;
+  visible?: boolean;
+  pointSize?: number;
+  vertexColors?: boolean;
+  opacity?: number;
+}
+
+// maximum number of points drawn at once
+const POINT_BUDGET = 5000000;
+// nodes whose bounding sphere covers fewer pixels than this on screen are not refined
+const MIN_NODE_PIXELS = 150;
+const MAX_CONCURRENT_LOADS = 4;
+
+function nodeBox(index: OctreeIndex, name: string) {
+  const min = new Vector3(...index.min);
+  let size = index.size;
+  for (let i = 1; i < name.length; i++) {
+    size /= 2;
+    const octant = Number(name[i]);
+    min.x += octant & 1 ? size : 0;
+    min.y += octant & 2 ? size : 0;
+    min.z += octant & 4 ? size : 0;
+  }
+  return new Box3(min, min.clone().addScalar(size));
+}
+
+/**
+ * Nodes to draw for the current camera: the root, then children inside the view frustum by decreasing
+ * projected size, as long as they are large enough on screen and fit in the point budget.
+ */
+function selectNodes(index: OctreeIndex, camera: PerspectiveCamera, height: number) {
+  const frustum = new Frustum().setFromProjectionMatrix(
+    new Matrix4().multiplyMatrices(camera.projectionMatrix, camera.matrixWorldInverse)
+  );
+  const scale = height / (2 * Math.tan(((camera.fov ?? 50) * Math.PI) / 360));
+  const sphere = new Sphere();
+  const selected: string[] = [];
+  const queue = [{ name: "r", priority: Infinity }];
+  let budget = POINT_BUDGET;
+
+  while (queue.length > 0) {
+    queue.sort((a, b) => a.priority - b.priority);
+    const { name } = queue.pop();
+    const count = index.nodes[name];
+    if (count > budget && selected.length > 0) continue;
+    budget -= count;
+    selected.push(name);
+
+    for (let i = 0; i < 8; i++) {
+      const child = name + i;
+      if (!(child in index.nodes)) continue;
+      const box = nodeBox(index, child);
+      if (!frustum.intersectsBox(box)) continue;
+      box.getBoundingSphere(sphere);
+      const distance = Math.max(sphere.center.distanceTo(camera.position) - sphere.radius, 1e-6);
+      const pixels = (sphere.radius / distance) * scale;
+      if (pixels >= MIN_NODE_PIXELS) {
+        queue.push({ name: child, priority: pixels });
+      }
+    }
+  }
+  return selected;
+}
+
+export const OctreePointCloud = memo<IProps>(function OctreePointCloud(props) {
+  const { url, color, visible = true, pointSize = 0.03, vertexColors, opacity } = props;
+  const index = useXHR<OctreeIndex>(url, "GET", "json");
+  const cache = useRef(new Map<string, BufferGeometry>());
+  const loading = useRef(new Set<string>());
+  const lastCamera = useRef({ matrix: new Matrix4(), height: 0 });
+  const [selected, setSelected] = useState<string[]>([]);
+  const [version, setVersion] = useState(0);
+  const material = useMemo(() => new PointsMaterial({ transparent: true }), []);
+
+  const nodeUrl = (name: string) =>
+    `${url.split("/file?")[0]}/octree_node?path=${encodeURIComponent(getUrlPath(url))}&node=${name}`;
+
+  useEffect(() => {
+    const geometries = cache.current;
+    return () => {
+      geometries.forEach((geometry) => geometry.dispose());
+      geometries.clear();
+      lastCamera.current.height = 0;
+    };
+  }, [url]);
+
+  // select the first nodes as soon as the index is loaded
+  useEffect(() => {
+    lastCamera.current.height = 0;
+    invalidate();
+  }, [index, visible]);
+
+  useFrame(({ camera, size }) => {
+    if (!index || !visible) return;
+    // frames are also requested by other objects, only select nodes when the view changed
+    const matrix = new Matrix4().multiplyMatrices(camera.projectionMatrix, camera.matrixWorldInverse);
+    if (matrix.equals(lastCamera.current.matrix) && size.height == lastCamera.current.height) return;
+    lastCamera.current.matrix.copy(matrix);
+    lastCamera.current.height = size.height;
+    setSelected(selectNodes(index, camera as PerspectiveCamera, size.height));
+  });
+
+  useEffect(() => {
+    for (const name of selected) {
+      if (loading.current.size >= MAX_CONCURRENT_LOADS) break;
+      if (cache.current.has(name) || loading.current.has(name)) continue;
+      loading.current.add(name);
+      new BinaryPointCloudLoader().load(
+        nodeUrl(name),
+        (geometry: BufferGeometry) => {
+          loading.current.delete(name);
+          cache.current.set(name, geometry);
+          setVersion((v) => v + 1);
+          invalidate();
+        },
+        undefined,
+        () => loading.current.delete(name)
+      );
+    }
+
+    // drop nodes that are no longer drawn once the cache holds twice the budget
+    let cached = 0;
+    cache.current.forEach((_, name) => (cached += index.nodes[name]));
+    if (cached > 2 * POINT_BUDGET) {
+      const keep = new Set(selected);
+      cache.current.forEach((geometry, name) => {
+        if (!keep.has(name)) {
+          geometry.dispose();
+          cache.current.delete(name);
+        }
+      });
+    }
+  }, [selected, version]);
+
+  const useVertexColors = useMemo(
+    () => cache.current.get("r")?.hasAttribute("color") && vertexColors,
+    [version, vertexColors]
+  );
+
+  useLayoutEffect(() => {
+    material.size = pointSize;
+    material.vertexColors = useVertexColors;
+    material.color.set(useVertexColors ? 0xffffff : color);
+    material.opacity = opacity ?? 1;
+    material.needsUpdate = true;
+    invalidate();
+  }, [material, pointSize, useVertexColors, color, opacity]);
+
+  return (
+    <group visible={visible}>
+      {selected
+        .filter((name) => cache.current.has(name))
+        .map((name) => (
+          <points
+            key={name}
+            geometry={cache.current.get(name)}
+            material={material}
+            onDoubleClick={visible && centerOnDbClick}
+          />
+        ))}
+    </group>
+  );
+});
+
+export default OctreePointCloud;
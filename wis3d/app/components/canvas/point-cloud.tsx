@@ -1,8 +1,11 @@
 import { memo, useLayoutEffect, useMemo, useRef } from "react";
 import { PLYLoader } from "three/examples/jsm/loaders/PLYLoader";
-import type { Material } from "three";
+import type { BufferGeometry, Material } from "three";
 import { useLoader } from "@/utils/hooks";
+import { getUrlPath } from "@/utils/misc";
+import { BinaryPointCloudLoader } from "@/utils/loaders/BinaryPointCloudLoader";
 import { centerOnDbClick } from "./trackball-controls";
+import { OctreePointCloud } from "./octree-point-cloud";
 
 interface IProps {
   url: string;
@@ -13,9 +16,12 @@ interface IProps {
   opacity?: number;
 }
 
-export const PointCloud = memo<IProps>(function PointCloud(props) {
+const FilePointCloud = memo<IProps>(function FilePointCloud(props) {
   const { url, color, visible = true, pointSize = 0.03, vertexColors, opacity } = props;
-  const geometry = useLoader(PLYLoader, url);
+  const geometry = useLoader<BufferGeometry, string>(
+    getUrlPath(url)?.endsWith(".w3dp") ? BinaryPointCloudLoader : PLYLoader,
+    url
+  );
   const material = useRef<Material>();
   const useVertexColors = useMemo(() => geometry?.hasAttribute("color") && vertexColors, [geometry, vertexColors]);
 
@@ -37,4 +43,8 @@ export const PointCloud = memo<IProps>(function PointCloud(props) {
   ) : null;
 });
 
+export const PointCloud = memo<IProps>(function PointCloud(props) {
+  return getUrlPath(props.url)?.endsWith(".w3do") ? <OctreePointCloud {...props} /> : <FilePointCloud {...props} />;
+});
+
 export default PointCloud;
@@ -1,6 +1,7 @@
-import {memo, MutableRefObject, useLayoutEffect, useRef} from 'react';
-import {useXHR} from "@/utils/hooks";
-import {Color, Material, Side} from "three"
+import {memo, useMemo} from 'react';
+import {useObjectData} from "@/utils/hooks";
+import {toPacked} from "@/utils/container";
+import {Color, InstancedMesh, Matrix4, MeshBasicMaterial, MeshNormalMaterial, Quaternion, SphereBufferGeometry, Vector3} from "three"
 import {centerOnDbClick} from "./trackball-controls";
 
 interface IProps {
@@ -11,45 +12,64 @@ interface IProps {
     sphereColors?: boolean;
 }
 
-function getMaterial(material: string, color: string | number) {
+function getMaterial(material: string) {
     if (material === "MeshNormalMaterial") {
-        return (<meshNormalMaterial transparent={true} depthWrite={false} opacity={0.8}/>);
+        return new MeshNormalMaterial({transparent: true, depthWrite: false, opacity: 0.8});
     } else if (material === "MeshBasicMaterial") {
-        return (<meshBasicMaterial color={color} transparent={true} depthWrite={false} opacity={0.7}/>);
+        return new MeshBasicMaterial({color: 0xffffff, transparent: true, depthWrite: false, opacity: 0.7});
     }
+    return new MeshBasicMaterial();
 }
 
+// older files store one object per sphere
+function toRows(data) {
+    return {
+        centers: data.map((sphere) => sphere.center),
+        radii: data.map((sphere) => sphere.radius),
+        scales: data.map((sphere) => sphere.scales ?? [1, 1, 1]),
+        quaternions: data.map((sphere) => sphere.quaternion ?? [0, 0, 0, 1]),
+        colors: data.some((sphere) => sphere.color) ? data.map((sphere) => sphere.color ?? [250, 250, 250]) : undefined,
+    };
+}
+
+// one instance per sphere, from the arrays of binary files or of files written column-wise
+function toMesh(data, material: string) {
+    const columns = Array.isArray(data) ? toRows(data) : data;
+    if (!columns.centers) return null;
+    const centers = toPacked(columns.centers, 3);
+    if (centers.count == 0) return null;
+    const radii = columns.radii ? toPacked(columns.radii, 1) : null;
+    const scales = columns.scales ? toPacked(columns.scales, 3) : null;
+    const quaternions = columns.quaternions ? toPacked(columns.quaternions, 4) : null;
+    // only the basic material is colored
+    const colors = columns.colors && material === "MeshBasicMaterial" ? toPacked(columns.colors, 3) : null;
+
+    const mesh = new InstancedMesh(new SphereBufferGeometry(1, 30, 30), getMaterial(material), centers.count);
+    const position = new Vector3(), quaternion = new Quaternion(), scale = new Vector3(), matrix = new Matrix4(), color = new Color();
+    for (let i = 0; i < centers.count; i++) {
+        position.fromArray(centers.values, i * centers.stride);
+        quaternions ? quaternion.fromArray(quaternions.values, i * quaternions.stride) : quaternion.identity();
+        scales ? scale.fromArray(scales.values, i * scales.stride) : scale.set(1, 1, 1);
+        scale.multiplyScalar(radii ? radii.values[i] : columns.radius);
+        mesh.setMatrixAt(i, matrix.compose(position, quaternion, scale));
+        if (colors) {
+            const offset = i * colors.stride;
+            mesh.setColorAt(i, color.setRGB(colors.values[offset] / 250, colors.values[offset + 1] / 250, colors.values[offset + 2] / 250));
+        }
+    }
+    return mesh;
+}
 
 export const Spheres = memo<IProps>(function Spheres(props) {
     const {url, defaultColor, material, visible = true, sphereColors} = props;
-    // const {url, defaultColor, visible = true, sphereColors} = props;
-    const spheres = useXHR(url, "GET", "json", []);
-
+    const data = useObjectData<any>(url, []);
+    const mesh = useMemo(() => toMesh(data, material), [data, material]);
 
-    return (
+    return mesh ? (
         <group visible={visible}>
-            {spheres.map((sphere, index) => {
-                const {center, radius, color, scales, quaternion} = sphere;
-                const userColor = color ? color.map(x => x / 250) : 0xffffff;
-                // const materialRef = useRef<Material>();
-                // useLayoutEffect(() => {
-                //     if (materialRef.current) materialRef.current.needsUpdate = true;
-                // }, );
-
-
-                return (
-                    <mesh position={center} quaternion={quaternion} scale={scales} key={index}
-                          onDoubleClick={centerOnDbClick}>
-
-                        <sphereBufferGeometry args={[radius, 30, 30]}/>
-
-                        {getMaterial(material, userColor)}
-
-                    </mesh>
-                )
-            })}
+            <primitive object={mesh} onDoubleClick={centerOnDbClick}/>
         </group>
-    )
+    ) : null;
 })
 
-export default Spheres;
\ No newline at end of file
+export default Spheres;
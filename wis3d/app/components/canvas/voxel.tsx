@@ -1,10 +1,11 @@
 import { memo, useState } from "react";
-import { useXHR } from "@/utils/hooks";
+import { useObjectData } from "@/utils/hooks";
 import { VoxelLoader } from "@/utils/VoxelLoader";
-import { Mesh, DefaultLoadingManager, BufferGeometry, BoxGeometry, BufferAttribute, MeshBasicMaterial, Color } from "three";
-import { BufferGeometryUtils } from "three/examples/jsm/utils/BufferGeometryUtils";
+import { Mesh, DefaultLoadingManager, BoxGeometry, InstancedMesh, Matrix4, MeshBasicMaterial, Color } from "three";
+import { PackedArray, toPacked } from "@/utils/container";
 import { useEffect } from "react";
 import { centerOnDbClick } from "./trackball-controls";
+import { getUrlPath } from "@/utils/misc";
 
 interface IProps {
   url: string;
@@ -14,59 +15,53 @@ interface IProps {
   vertexColors?: boolean;
 }
 
-const generateMesh = function(voxel_size, boxes, defaultColor, vertexColors) {
-  let mergedGeometry = new BufferGeometry();
-  var hasColor = false;
-
-  var voxelGeometries = [];
-
-  boxes.map((box, index) => {
-    const {voxel_center, color} = box;
-    let voxelGeometry = new BoxGeometry(voxel_size, voxel_size, voxel_size);
-
-    if (color != null) {
-      hasColor = true;
-      const boxColor = [color[0] / 255, color[1] / 255, color[2] /255]
-      var colors = [];
-      for(var i = 0; i < voxelGeometry.attributes.position.count; i++) {
-        colors.push(boxColor);
-      }
-      voxelGeometry.attributes.color = new BufferAttribute(new Float32Array(colors.flat()), 3);
-    }
-
-    voxelGeometry.translate(voxel_center[0], voxel_center[1], voxel_center[2]);
-    voxelGeometries.push(voxelGeometry);
-  })
-
-  mergedGeometry = BufferGeometryUtils.mergeBufferGeometries(voxelGeometries);
-  mergedGeometry.computeVertexNormals();
-
-  var material;
-  if (hasColor && vertexColors) {
-    material = new MeshBasicMaterial({ color: 0xffffff });
-    material.vertexColors = true;
-  } else {
-    const materialColor = new Color(defaultColor);
-    material = new MeshBasicMaterial({ color: materialColor})
-  }
+// one instance per voxel, from the arrays of binary files or of files written column-wise
+const generateMesh = function(voxelSize, centers: PackedArray, colors: PackedArray, defaultColor, vertexColors) {
+  const hasColor = colors != null;
+  const material = new MeshBasicMaterial({ color: hasColor && vertexColors ? 0xffffff : new Color(defaultColor) });
   material.transparent = true;
   material.opacity = 0.5;
-  var voxels = new Mesh(mergedGeometry, material);
-  
+  const voxels = new InstancedMesh(new BoxGeometry(voxelSize, voxelSize, voxelSize), material, centers.count);
+  const matrix = new Matrix4();
+  const color = new Color();
+  for (let i = 0; i < centers.count; i++) {
+    const offset = i * centers.stride;
+    voxels.setMatrixAt(i, matrix.makeTranslation(centers.values[offset], centers.values[offset + 1], centers.values[offset + 2]));
+    if (hasColor && vertexColors) {
+      const c = i * colors.stride;
+      voxels.setColorAt(i, color.setRGB(colors.values[c] / 255, colors.values[c + 1] / 255, colors.values[c + 2] / 255));
+    }
+  }
   return voxels;
 }
 
+// older files store one object per voxel
+function toRows(voxels) {
+  return {
+    voxel_centers: voxels.map((voxel) => voxel.voxel_center),
+    colors: voxels.some((voxel) => voxel.color != null) ? voxels.map((voxel) => voxel.color ?? [0, 0, 0]) : undefined,
+  };
+}
+
 const BoxVoxel = memo<IProps>(function BoxVoxel(props) {
   const { url, name, visible = true, defaultColor, vertexColors } = props;
   const [obj, setObj] = useState<Mesh>();
-  const data = useXHR(url, "GET", "json", []);
+  const data = useObjectData<any>(url, []);
 
   useEffect(() => {
-    if (data.length != 0) {
-      if(data[1].voxels.length > 0) {
-        const mesh = generateMesh(data[0].voxel_size, data[1].voxels, defaultColor, vertexColors);
-        setObj(mesh);
-      }
+    let voxelSize, columns;
+    if (Array.isArray(data)) {
+      if (data.length == 0) return;
+      voxelSize = data[0].voxel_size;
+      columns = toRows(data[1].voxels);
+    } else {
+      voxelSize = data.voxel_size;
+      columns = data;
+    }
+    const centers = toPacked(columns.voxel_centers, 3);
+    if (centers.count > 0) {
+      const colors = columns.colors ? toPacked(columns.colors, 3) : null;
+      setObj(generateMesh(voxelSize, centers, colors, defaultColor, vertexColors));
     }
   }, [data, defaultColor, vertexColors])
 
@@ -90,7 +85,8 @@ const FileVoxel = memo<IProps>(function FileVoxel(props) {
 });
 
 export const Voxel = memo<IProps>(function Voxel(props) {
-    return props.url.endsWith("json") ? <BoxVoxel {...props} /> : <FileVoxel {...props} />
+    const path = getUrlPath(props.url) ?? props.url;
+    return path.endsWith(".json") || path.endsWith(".w3db") ? <BoxVoxel {...props} /> : <FileVoxel {...props} />
 });
 
 export default Voxel;
@@ -0,0 +1,67 @@
+// Reader of the Wis3D array container (.w3db), see wis3d/formats.py
+
+// "W3DB" read as a little-endian uint32
+const MAGIC = 0x42443357;
+const HEADER_SIZE = 12;
+const ALIGNMENT = 8;
+
+const typedArrays = {
+  float32: Float32Array,
+  uint8: Uint8Array,
+  int32: Int32Array,
+  uint32: Uint32Array,
+};
+
+type ArraySpec = {
+  dtype: keyof typeof typedArrays;
+  shape: number[];
+  offset: number;
+};
+
+const align = (offset: number) => Math.ceil(offset / ALIGNMENT) * ALIGNMENT;
+
+export type TypedArray = Float32Array | Uint8Array | Int32Array | Uint32Array;
+
+// `count` rows of `stride` values, stored flat
+export interface PackedArray {
+  values: TypedArray;
+  count: number;
+  stride: number;
+}
+
+export const isPacked = (array: any): array is PackedArray => array != null && ArrayBuffer.isView(array.values);
+
+// values of the row `i`, a view without copy
+export const getRow = (array: PackedArray, i: number) => array.values.subarray(i * array.stride, (i + 1) * array.stride);
+
+/**
+ * Packed array of the nested rows of a JSON file, e.g. `[[x, y, z], ...]`; packed arrays are returned as they are.
+ */
+export function toPacked(rows: PackedArray | number[][] | number[], stride: number): PackedArray {
+  if (isPacked(rows)) {
+    return rows;
+  }
+  return { values: new Float32Array((rows as any[]).flat()), count: rows.length, stride };
+}
+
+/**
+ * Parse a container: the scalar fields of `meta`, plus one `PackedArray` per array, which views the buffer without copy.
+ * Its fields have the names of the JSON layout of the file type, where they are nested arrays instead.
+ */
+export function parseContainer(buffer: ArrayBuffer): Record<string, any> {
+  const view = new DataView(buffer);
+  if (view.getUint32(0, true) !== MAGIC) {
+    throw new Error("parseContainer: not a Wis3D array container");
+  }
+  const length = view.getUint32(8, true);
+  const header = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, HEADER_SIZE, length)));
+  const dataStart = align(HEADER_SIZE + length);
+
+  const result: Record<string, any> = { ...header.meta };
+  for (const [name, spec] of Object.entries<ArraySpec>(header.arrays)) {
+    const count = spec.shape.reduce((a, b) => a * b, 1);
+    const values = new typedArrays[spec.dtype](buffer, dataStart + spec.offset, count);
+    result[name] = { values, count: spec.shape[0], stride: spec.shape.length == 2 ? spec.shape[1] : 1 };
+  }
+  return result;
+}
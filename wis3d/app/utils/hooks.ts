@@ -1,5 +1,7 @@
-import { useEffect, useState } from "react";
+import { useEffect, useMemo, useState } from "react";
 import { Loader } from "@react-three/fiber";
+import { getUrlPath } from "./misc";
+import { parseContainer } from "./container";
 
 declare type LoaderResult<T> = T extends any[] ? Loader<T[number]> : Loader<T>;
 // declare type ConditionalType<Child, Parent, Truthy, Falsy> = Child extends Parent ? Truthy : Falsy;
@@ -44,6 +46,13 @@ export function useXHR<T>(
   return state;
 }
 
+// JSON file or Wis3D array container (.w3db), whose arrays are `PackedArray`s instead of nested arrays, see `parseContainer`
+export function useObjectData<T>(url: string, initialValue?: T | (() => T)): T {
+  const binary = getUrlPath(url)?.endsWith(".w3db");
+  const data = useXHR<any>(url, "GET", binary ? "arraybuffer" : "json", initialValue);
+  return useMemo(() => (data instanceof ArrayBuffer ? parseContainer(data) : data), [data]);
+}
+
 export function loadImage(url: string) {
   return new Promise<HTMLImageElement>((resolve, reject) => {
     const image = new window.Image();
@@ -0,0 +1,51 @@
+import { BufferAttribute, BufferGeometry, FileLoader, Loader } from "three";
+
+// "W3DP" read as a little-endian uint32, see wis3d/formats.py
+const MAGIC = 0x50443357;
+const HEADER_SIZE = 16;
+const FLAG_COLORS = 1;
+
+/**
+ * Loader of the Wis3D binary point cloud format (.w3dp).
+ * Positions and colors are wrapped in typed arrays over the response buffer without copying.
+ */
+class BinaryPointCloudLoader extends Loader {
+  load(url, onLoad, onProgress, onError) {
+    const loader = new FileLoader(this.manager);
+    loader.setPath(this.path);
+    loader.setResponseType("arraybuffer");
+    loader.setRequestHeader(this.requestHeader);
+    loader.setWithCredentials(this.withCredentials);
+    loader.load(
+      url,
+      (buffer) => {
+        try {
+          onLoad(this.parse(buffer));
+        } catch (e) {
+          onError ? onError(e) : console.error(e);
+          this.manager.itemError(url);
+        }
+      },
+      onProgress,
+      onError
+    );
+  }
+
+  parse(buffer) {
+    const header = new DataView(buffer, 0, HEADER_SIZE);
+    if (header.getUint32(0, true) !== MAGIC) {
+      throw new Error("BinaryPointCloudLoader: not a Wis3D binary point cloud");
+    }
+    const count = header.getUint32(8, true);
+    const flags = header.getUint32(12, true);
+    const geometry = new BufferGeometry();
+    geometry.setAttribute("position", new BufferAttribute(new Float32Array(buffer, HEADER_SIZE, count * 3), 3));
+    if (flags & FLAG_COLORS) {
+      const colors = new Uint8Array(buffer, HEADER_SIZE + count * 12, count * 3);
+      geometry.setAttribute("color", new BufferAttribute(colors, 3, true));
+    }
+    return geometry;
+  }
+}
+
+export { BinaryPointCloudLoader };
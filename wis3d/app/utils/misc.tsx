@@ -12,6 +12,33 @@ export const getFileName = (path: string = "") => {
   return filename.substring(0, filename.lastIndexOf("."));
 };
 
+// path of the file behind a `/file?path=...` url
+export const getUrlPath = (url: string) => {
+  const parts = url.split("path=");
+  if (parts.length < 2) {
+    return null;
+  }
+  return decodeURIComponent(parts[1].split("&")[0]);
+};
+
+// url of a file referenced by `ref`, a path relative to the folder of the file behind `url`; data urls are kept
+export const resolveFileUrl = (url: string, ref: string) => {
+  if (!ref || ref.startsWith("data:")) {
+    return ref;
+  }
+  const path = getUrlPath(url);
+  const sep = path.includes("\\") ? "\\" : "/";
+  const parts = path.split(/[\\/]/).slice(0, -1);
+  for (const part of ref.split("/")) {
+    if (part == "..") {
+      parts.pop();
+    } else if (part != ".") {
+      parts.push(part);
+    }
+  }
+  return `${url.split("/file?")[0]}/file?path=${encodeURIComponent(parts.join(sep))}`;
+};
+
 const colormap: Record<string, string> = {};
 
 export const getColor = (name: string) => {
@@ -0,0 +1,196 @@
+# coding=utf-8
+"""
+Archive storage of a sequence: the objects of all its scenes appended to one data file, with an index of where they are.
+
+Both files are hidden in the sequence folder::
+
+    <sequence>/.archive.w3da     contents of the objects, back to back
+    <sequence>/.archive.w3di     "W3DI" magic, then one record per object
+
+A record is ``<offset: u64> <length: u64> <scene: u32> <len(type): u8> <len(name): u16> <type> <name>``, all little-endian,
+with the type (folder name, e.g. "meshes") and the file name encoded in UTF-8. The object stands for the file
+``<sequence>/<scene:05d>/<type>/<name>``, and the last record of a path wins. Both files are only appended to, and the data
+of an object is written before its record, so a reader never sees a record of incomplete data.
+"""
+import os
+import mmap
+import struct
+import hashlib
+import threading
+
+INDEX_MAGIC = b"W3DI"
+RECORD = struct.Struct("<QQIBH")
+DATA_FILE = ".archive.w3da"
+INDEX_FILE = ".archive.w3di"
+
+
+def archive_paths(seq_folder: str):
+    """
+    :return: paths of the data and the index file of the sequence folder `seq_folder`
+    """
+    return os.path.join(seq_folder, DATA_FILE), os.path.join(seq_folder, INDEX_FILE)
+
+
+def has_archive(seq_folder: str) -> bool:
+    return os.path.isfile(os.path.join(seq_folder, INDEX_FILE))
+
+
+class ArchiveWriter:
+    """
+    Appends objects to the archive of a sequence. Use `ArchiveWriter.open` to share the writer of a sequence between
+    the `Wis3D` instances of a process.
+    """
+
+    writers = {}
+    writers_lock = threading.Lock()
+
+    @classmethod
+    def open(cls, seq_folder: str, dedup: bool = False) -> "ArchiveWriter":
+        seq_folder = os.path.abspath(seq_folder)
+        with cls.writers_lock:
+            writer = cls.writers.get(seq_folder)
+            if writer is None or writer.closed or not os.path.exists(writer.data_path):
+                if writer is not None:
+                    # the sequence folder was removed, e.g. by `auto_remove`
+                    writer.close()
+                writer = cls.writers[seq_folder] = cls(seq_folder)
+            writer.dedup = writer.dedup or dedup
+            return writer
+
+    def __init__(self, seq_folder: str, dedup: bool = False):
+        """
+        :param seq_folder: folder of the sequence
+        :param dedup: whether to store identical contents once, with several records pointing to them
+        """
+        self.seq_folder = seq_folder
+        self.data_path, self.index_path = archive_paths(seq_folder)
+        self.dedup = dedup
+        self.lock = threading.Lock()
+        self.digests = {}
+        self.closed = False
+        os.makedirs(seq_folder, exist_ok=True)
+        self.data = open(self.data_path, "ab")
+        self.index = open(self.index_path, "ab")
+        self.size = self.data.tell()
+        if self.index.tell() == 0:
+            self.index.write(INDEX_MAGIC)
+            self.index.flush()
+
+    def append(self, filename: str, data: bytes) -> None:
+        """
+        Append the object that stands for the file `filename` of the sequence.
+        """
+        scene, obj_type, name = os.path.relpath(filename, self.seq_folder).replace(os.sep, "/").split("/", 2)
+        obj_type = obj_type.encode()
+        name = name.encode()
+        digest = hashlib.sha1(data).digest() if self.dedup else None
+        with self.lock:
+            if digest is not None and digest in self.digests:
+                offset = self.digests[digest]
+            else:
+                offset = self.size
+                self.data.write(data)
+                # the data must reach the file before the record that points to it
+                self.data.flush()
+                self.size += len(data)
+                if digest is not None:
+                    self.digests[digest] = offset
+            self.index.write(RECORD.pack(offset, len(data), int(scene), len(obj_type), len(name)) + obj_type + name)
+            self.index.flush()
+
+    def close(self) -> None:
+        with self.lock:
+            if not self.closed:
+                self.data.close()
+                self.index.close()
+                self.closed = True
+
+
+class ArchiveReader:
+    """
+    Reads the objects of a sequence archive from a memory map. `refresh` picks up the objects appended since.
+    """
+
+    def __init__(self, seq_folder: str):
+        self.seq_folder = os.path.abspath(seq_folder)
+        self.data_path, self.index_path = archive_paths(self.seq_folder)
+        self.lock = threading.Lock()
+        # path relative to the sequence folder -> (offset, length)
+        self.entries = {}
+        self.scenes = {}
+        self.index_pos = len(INDEX_MAGIC)
+        self.mm = None
+        self.inode = None
+        self.refresh()
+
+    def refresh(self) -> None:
+        """
+        Read the records appended to the index since the last call.
+        """
+        with self.lock:
+            with open(self.index_path, "rb") as f:
+                st = os.fstat(f.fileno())
+                if (st.st_ino, st.st_dev) != self.inode or st.st_size < self.index_pos:
+                    # the archive was removed and written again
+                    self.inode = (st.st_ino, st.st_dev)
+                    self.entries = {}
+                    self.scenes = {}
+                    self.index_pos = len(INDEX_MAGIC)
+                    self.mm = None
+                if f.read(len(INDEX_MAGIC)) != INDEX_MAGIC:
+                    return
+                f.seek(self.index_pos)
+                buf = f.read()
+            pos = 0
+            while pos + RECORD.size <= len(buf):
+                offset, length, scene, type_len, name_len = RECORD.unpack_from(buf, pos)
+                end = pos + RECORD.size + type_len + name_len
+                if end > len(buf):
+                    # the record is still being written
+                    break
+                obj_type = buf[pos + RECORD.size:pos + RECORD.size + type_len].decode()
+                name = buf[pos + RECORD.size + type_len:end].decode()
+                scene = "%05d" % scene
+                self.entries[f"{scene}/{obj_type}/{name}"] = (offset, length)
+                self.scenes.setdefault(scene, {}).setdefault(obj_type, set()).add(name)
+                pos = end
+            self.index_pos += pos
+            if pos:
+                self.__remap()
+
+    def __remap(self) -> None:
+        size = os.path.getsize(self.data_path)
+        if size > 0 and (self.mm is None or len(self.mm) < size):
+            # responses still streaming from the previous map keep it alive
+            with open(self.data_path, "rb") as f:
+                self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def lookup(self, path: str):
+        """
+        :param path: path of an object, as if it was a file in the sequence folder
+        :return: `(mm, offset, length)` of its content, or None if it is not in the archive
+        """
+        rel = os.path.relpath(os.path.abspath(path), self.seq_folder).replace(os.sep, "/")
+        with self.lock:
+            entry = self.entries.get(rel)
+            if entry is None:
+                return None
+            return (self.mm,) + entry
+
+    def read(self, path: str) -> bytes:
+        found = self.lookup(path)
+        if found is None:
+            raise FileNotFoundError(path)
+        mm, offset, length = found
+        return mm[offset:offset + length] if length else b""
+
+    def scene_names(self):
+        with self.lock:
+            return sorted(self.scenes)
+
+    def files_in_scene(self, scene: str) -> dict:
+        """
+        :return: names of the objects of the scene `scene` by type
+        """
+        with self.lock:
+            return {obj_type: sorted(names) for obj_type, names in self.scenes.get(scene, {}).items()}
@@ -3,7 +3,6 @@ import os
 import os.path as osp
 import tempfile
 
-import trimesh
 from wis3d import Wis3D
 
 cnts = {}
@@ -16,6 +15,7 @@ def add_file(path, vis3d):
     if cnts[name] > 0:
         name = f"{name} ({cnts[name]})"
     if path.split('.')[-1] in ['ply', 'obj']:
+        import trimesh
         mesh = trimesh.load_mesh(path)
         vis3d.add_mesh(mesh, name=name)
     elif path.split('.')[-1] in ['jpg', 'png']:
@@ -0,0 +1,92 @@
+# coding=utf-8
+"""
+Precompressed copies of object files, served with `Content-Encoding` to viewers that accept them.
+
+A compressed copy is a hidden sibling of its file, so that it is not listed as an object::
+
+    <name>.json
+    .<name>.json.gz     gzip
+    .<name>.json.br     brotli, if the `brotli` package is installed
+
+Copies are written by `Wis3D(precompress=True)` or by the server on first request, and rebuilt when older than their file.
+"""
+import os
+import gzip
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from wis3d.utils import atomic_write
+
+# text and geometry files worth compressing; images and quantized geometry are compressed already
+COMPRESSIBLE_EXTS = (".json", ".ply", ".obj", ".w3do")
+ENCODING_EXTS = {"br": ".br", "gzip": ".gz"}
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def available_encodings() -> tuple:
+    """
+    Supported encodings, preferred first.
+    """
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def is_compressible(filename: str) -> bool:
+    return filename.lower().endswith(COMPRESSIBLE_EXTS)
+
+
+def encoded_path(filename: str, encoding: str) -> str:
+    """
+    Path of the copy of `filename` compressed with `encoding`.
+    """
+    return os.path.join(os.path.dirname(filename), "." + os.path.basename(filename) + ENCODING_EXTS[encoding])
+
+
+def encode(data: bytes, encoding: str) -> bytes:
+    if encoding == "gzip":
+        # a fixed mtime keeps the output identical for identical files
+        return gzip.compress(data, GZIP_LEVEL, mtime=0)
+    elif encoding == "br" and brotli is not None:
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    raise NotImplementedError()
+
+
+def write_encoded(filename: str, data: bytes = None, encodings=None) -> None:
+    """
+    Write the compressed copies of `filename`.
+
+    :param filename: path of the file
+    :param data: content of the file, read from `filename` if not given
+    :param encodings: encodings to write, all available ones by default
+    """
+    if data is None:
+        with open(filename, "rb") as f:
+            data = f.read()
+    for encoding in encodings or available_encodings():
+        atomic_write(encoded_path(filename, encoding), encode(data, encoding))
+
+
+def negotiate(accept_encoding: str):
+    """
+    Pick the preferred available encoding accepted by an `Accept-Encoding` header.
+
+    :return: the encoding, or None to send the file as is
+    """
+    accepted = {}
+    for item in (accept_encoding or "").split(","):
+        coding, _, params = item.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding.strip().lower()] = q
+    for encoding in available_encodings():
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
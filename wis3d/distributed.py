@@ -0,0 +1,64 @@
+# coding=utf-8
+"""
+Distributed logging, e.g. under DDP/torchrun: every rank writes to its own shard of the sequence, and the server
+merges the shards into one sequence::
+
+    <sequence>/.rank0/<scene>/<type>/rank0-00000.ply
+    <sequence>/.rank1/<scene>/<type>/rank1-00000.ply
+
+A shard is laid out like a sequence folder, with its own manifest, archive and deduplicated store, so ranks never
+write to the same file. The rank and the number of ranks are read from the environment variables set by torchrun.
+"""
+import os
+import re
+
+SHARD_NAME = re.compile(r"\.rank(\d+)")
+
+
+def get_rank_and_world_size():
+    """
+    :return: rank of the process and number of ranks, from `RANK` and `WORLD_SIZE` (torchrun) or `SLURM_PROCID` and
+        `SLURM_NTASKS` (srun); 0 and 1 when not distributed
+    """
+    for rank_var, world_size_var in (("RANK", "WORLD_SIZE"), ("SLURM_PROCID", "SLURM_NTASKS")):
+        if rank_var in os.environ and world_size_var in os.environ:
+            return int(os.environ[rank_var]), int(os.environ[world_size_var])
+    return 0, 1
+
+
+def shard_name(rank: int) -> str:
+    return f".rank{rank}"
+
+
+def file_prefix(rank: int) -> str:
+    """
+    Prefix of the object names of a rank, so that objects of different ranks in a merged scene have different names.
+    """
+    return f"rank{rank}-"
+
+
+def shard_folders(seq_folder: str):
+    """
+    :return: the shard folders of a sequence folder, sorted by rank
+    """
+    try:
+        names = os.listdir(seq_folder)
+    except OSError:
+        return []
+    shards = [(int(match.group(1)), name) for name in names for match in [SHARD_NAME.fullmatch(name)] if match]
+    return [os.path.join(seq_folder, name) for _, name in sorted(shards)]
+
+
+def stale_entries(seq_folder: str, world_size: int):
+    """
+    :return: the entries of a sequence folder that no rank of a run of `world_size` ranks writes to: shards of other
+        ranks and the output of runs that were not distributed
+    """
+    from wis3d.trash import TRASH_FOLDER
+
+    current = {shard_name(rank) for rank in range(world_size)} | {TRASH_FOLDER}
+    try:
+        names = os.listdir(seq_folder)
+    except OSError:
+        return []
+    return [os.path.join(seq_folder, name) for name in sorted(names) if name not in current]
@@ -0,0 +1,331 @@
+# coding=utf-8
+"""
+Binary file formats written by Wis3D and read by the server and the web viewer.
+
+Wis3D binary point cloud (``.w3dp``), little-endian::
+
+    magic    4 bytes  b"W3DP"
+    version  uint32
+    count    uint32   number of points n
+    flags    uint32   bit 0: colors present
+    float32  n x 3    positions
+    uint8    n x 3    colors, if present
+
+The 16-byte header keeps the positions 4-byte aligned, so the viewer can wrap them in a `Float32Array` without copying.
+
+Wis3D array container (``.w3db``), little-endian, used for lines, spheres, voxels and camera trajectories::
+
+    magic    4 bytes  b"W3DB"
+    version  uint32
+    length   uint32   size of the JSON header in bytes
+    header   JSON     {"meta": {...}, "arrays": {name: {"dtype", "shape", "offset"}}}
+    padding  up to the next multiple of `CONTAINER_ALIGNMENT`
+    buffers  raw arrays, each starting at its `offset` from the end of the padding
+
+Offsets are multiples of `CONTAINER_ALIGNMENT`, so every buffer can be wrapped in a typed array without copying.
+The arrays carry the same names as the columns of the JSON layout, and `meta` holds the scalar fields.
+
+Wis3D quantized geometry (``.w3dq``), little-endian, for point clouds and meshes::
+
+    magic    4 bytes  b"W3DQ"
+    version  uint32
+    length   uint32   size of the JSON header in bytes
+    header   JSON     {"compression", "count", "faces", "channels", "min", "scale"}
+    payload  compressed with `compression` ("zlib" or "lzma"), concatenation of
+             uint16   count x 3  positions, quantized per axis: position = min + q * scale
+             uint8    count x channels  colors
+             uint32   faces x 3  zigzag-encoded differences of consecutive vertex indices
+
+Each array of the payload is stored byte plane by byte plane (all low bytes, then all high bytes, ...),
+which makes slowly varying values much more compressible.
+"""
+import json
+import lzma
+import zlib
+import struct
+
+import numpy as np
+
+POINT_CLOUD_MAGIC = b"W3DP"
+POINT_CLOUD_VERSION = 1
+POINT_CLOUD_HEADER = struct.Struct("<4sIII")
+FLAG_COLORS = 1
+
+CONTAINER_MAGIC = b"W3DB"
+CONTAINER_VERSION = 1
+CONTAINER_HEADER = struct.Struct("<4sII")
+CONTAINER_ALIGNMENT = 8
+# dtypes the viewer knows how to wrap in typed arrays
+CONTAINER_DTYPES = ("float32", "uint8", "int32", "uint32")
+
+QUANTIZED_MAGIC = b"W3DQ"
+QUANTIZED_VERSION = 1
+QUANTIZED_HEADER = struct.Struct("<4sII")
+QUANTIZED_LEVELS = (1 << 16) - 1
+COMPRESSORS = {
+    "zlib": (lambda data: zlib.compress(data, 1), zlib.decompress),
+    "lzma": (lambda data: lzma.compress(data, preset=1), lzma.decompress),
+}
+
+
+def remap_axes(out: np.ndarray, vertices: np.ndarray, transform: np.ndarray) -> np.ndarray:
+    """
+    Write `vertices` mapped by the rotation part of `transform` into `out` column by column,
+    without allocating a transformed copy. `transform` must be a signed axis permutation, as built from `xyz_pattern`.
+
+    :param out: output array of shape `(n, 3)`, may be a view into a file buffer
+    :param vertices: input array of shape `(n, 3)`
+    :param transform: `(4, 4)` or `(3, 3)` transformation matrix
+    """
+    R = np.asarray(transform)[:3, :3]
+    for i in range(3):
+        j = int(np.flatnonzero(R[i])[0])
+        np.multiply(vertices[:, j], R[i, j], out=out[:, i], casting="unsafe")
+    return out
+
+
+def uint8_colors(colors: np.ndarray) -> np.ndarray:
+    """
+    Convert colors to uint8 like `trimesh` does: floats are taken in range [0, 1], integers in range [0, 255].
+    """
+    colors = np.asarray(colors)
+    if colors.dtype.kind == "f":
+        colors = np.nan_to_num(colors, nan=0.0, posinf=0.0, neginf=0.0)
+        return np.clip(colors * 255, 0, 255).round().astype(np.uint8)
+    return colors.astype(np.uint8, copy=False)
+
+
+def per_vertex_colors(colors: np.ndarray, n: int) -> np.ndarray:
+    """
+    Reshape colors to one row per vertex. A single color of shape `(3,)` or `(4,)` is repeated for every vertex,
+    as `trimesh` does, without copying it.
+    """
+    colors = np.asarray(colors)
+    if colors.ndim == 1 and len(colors) in (3, 4):
+        return np.broadcast_to(colors, (n, len(colors)))
+    return colors.reshape(n, -1)
+
+
+def encode_point_cloud(vertices: np.ndarray, colors: np.ndarray = None, transform: np.ndarray = None) -> bytearray:
+    """
+    Encode a point cloud in the Wis3D binary format.
+
+    :param vertices: positions of shape `(n, 3)`
+    :param colors: colors of shape `(n, 3)` or `(n, 4)`, or a single color, see `uint8_colors`, alpha is dropped
+    :param transform: optional axis remap applied while copying the positions
+    :return: the file content
+    """
+    vertices = np.asarray(vertices).reshape(-1, 3)
+    n = len(vertices)
+    has_colors = colors is not None and len(colors) > 0
+    size = POINT_CLOUD_HEADER.size + n * 12 + (n * 3 if has_colors else 0)
+    buf = bytearray(size)
+    POINT_CLOUD_HEADER.pack_into(buf, 0, POINT_CLOUD_MAGIC, POINT_CLOUD_VERSION, n, FLAG_COLORS if has_colors else 0)
+    positions = np.frombuffer(buf, np.float32, n * 3, POINT_CLOUD_HEADER.size).reshape(n, 3)
+    if transform is None:
+        positions[...] = vertices
+    else:
+        remap_axes(positions, vertices, transform)
+    if has_colors:
+        colors = uint8_colors(per_vertex_colors(colors, n)[:, :3])
+        np.frombuffer(buf, np.uint8, n * 3, POINT_CLOUD_HEADER.size + n * 12).reshape(n, 3)[...] = colors
+    return buf
+
+
+def decode_point_cloud(data):
+    """
+    Decode a Wis3D binary point cloud without copying.
+
+    :param data: file content, e.g. `bytes` or a `mmap`
+    :return: `(positions, colors)`, `colors` is `None` if the file has no colors
+    """
+    magic, version, n, flags = POINT_CLOUD_HEADER.unpack_from(data, 0)
+    if magic != POINT_CLOUD_MAGIC:
+        raise ValueError("not a Wis3D binary point cloud")
+    offset = POINT_CLOUD_HEADER.size
+    positions = np.frombuffer(data, np.float32, n * 3, offset).reshape(n, 3)
+    colors = None
+    if flags & FLAG_COLORS:
+        colors = np.frombuffer(data, np.uint8, n * 3, offset + n * 12).reshape(n, 3)
+    return positions, colors
+
+
+def _align(offset: int) -> int:
+    return (offset + CONTAINER_ALIGNMENT - 1) // CONTAINER_ALIGNMENT * CONTAINER_ALIGNMENT
+
+
+def encode_arrays(arrays: dict, meta: dict = None) -> bytearray:
+    """
+    Encode named arrays in the Wis3D array container.
+
+    :param arrays: dict of name to array, or to an `(array, dtype)` tuple to cast the array while copying it
+    :param meta: JSON-serializable scalar fields
+    :return: the file content
+    """
+    specs = {}
+    sources = []
+    size = 0
+    for name, array in arrays.items():
+        dtype = None
+        if isinstance(array, tuple):
+            array, dtype = array
+        array = np.asarray(array)
+        dtype = np.dtype(dtype or array.dtype)
+        assert dtype.name in CONTAINER_DTYPES, f"unsupported dtype of {name}: {dtype}"
+        specs[name] = dict(dtype=dtype.name, shape=list(array.shape), offset=size)
+        sources.append((array, dtype.newbyteorder("<"), size))
+        size = _align(size + array.nbytes)
+
+    header = json.dumps(dict(meta=meta or {}, arrays=specs)).encode()
+    data_start = _align(CONTAINER_HEADER.size + len(header))
+    buf = bytearray(data_start + size)
+    CONTAINER_HEADER.pack_into(buf, 0, CONTAINER_MAGIC, CONTAINER_VERSION, len(header))
+    buf[CONTAINER_HEADER.size:CONTAINER_HEADER.size + len(header)] = header
+    for array, dtype, offset in sources:
+        out = np.frombuffer(buf, dtype, array.size, data_start + offset).reshape(array.shape)
+        np.copyto(out, array, casting="unsafe")
+    return buf
+
+
+def decode_arrays(data):
+    """
+    Decode a Wis3D array container without copying the arrays.
+
+    :param data: file content, e.g. `bytes` or a `mmap`
+    :return: `(arrays, meta)`
+    """
+    magic, version, length = CONTAINER_HEADER.unpack_from(data, 0)
+    if magic != CONTAINER_MAGIC:
+        raise ValueError("not a Wis3D array container")
+    header = json.loads(bytes(data[CONTAINER_HEADER.size:CONTAINER_HEADER.size + length]))
+    data_start = _align(CONTAINER_HEADER.size + length)
+    arrays = {}
+    for name, spec in header["arrays"].items():
+        dtype = np.dtype(spec["dtype"]).newbyteorder("<")
+        count = int(np.prod(spec["shape"]))
+        arrays[name] = np.frombuffer(data, dtype, count, data_start + spec["offset"]).reshape(spec["shape"])
+    return arrays, header["meta"]
+
+
+def _shuffle(array: np.ndarray) -> bytes:
+    return np.ascontiguousarray(array).view(np.uint8).reshape(-1, array.dtype.itemsize).T.tobytes()
+
+
+def _unshuffle(data, dtype, count: int) -> np.ndarray:
+    dtype = np.dtype(dtype)
+    planes = np.frombuffer(data, np.uint8, count * dtype.itemsize).reshape(dtype.itemsize, count)
+    return np.ascontiguousarray(planes.T).view(dtype).reshape(-1)
+
+
+def encode_quantized(vertices: np.ndarray, faces: np.ndarray = None, colors: np.ndarray = None, compression: str = "zlib") -> bytes:
+    """
+    Encode a point cloud or a mesh in the Wis3D quantized geometry format.
+
+    :param vertices: positions of shape `(n, 3)`
+    :param faces: vertex indices of shape `(m, 3)` for meshes
+    :param colors: colors of shape `(n, 3)` or `(n, 4)`, or a single color, see `uint8_colors`
+    :param compression: "zlib" (fast) or "lzma" (smaller)
+    :return: the file content
+    """
+    compress, _ = COMPRESSORS[compression]
+    vertices = np.asarray(vertices, dtype=np.float64).reshape(-1, 3)
+    n = len(vertices)
+    lo = vertices.min(axis=0) if n else np.zeros(3)
+    scale = (vertices.max(axis=0) - lo) / QUANTIZED_LEVELS if n else np.ones(3)
+    scale[scale == 0] = 1
+    quantized = np.rint((vertices - lo) / scale).astype(np.uint16)
+
+    payload = [_shuffle(quantized)]
+    channels = 0
+    if colors is not None and len(colors) > 0:
+        colors = per_vertex_colors(colors, n)
+        channels = colors.shape[1]
+        payload.append(uint8_colors(colors).tobytes())
+    m = 0
+    if faces is not None and len(faces) > 0:
+        indices = np.asarray(faces, dtype=np.int64).reshape(-1)
+        m = len(indices) // 3
+        delta = np.diff(indices, prepend=0)
+        payload.append(_shuffle(((delta << 1) ^ (delta >> 63)).astype(np.uint32)))
+
+    header = json.dumps(dict(compression=compression, count=n, faces=m, channels=channels, min=lo.tolist(), scale=scale.tolist())).encode()
+    return QUANTIZED_HEADER.pack(QUANTIZED_MAGIC, QUANTIZED_VERSION, len(header)) + header + compress(b"".join(payload))
+
+
+def decode_quantized(data):
+    """
+    Decode a Wis3D quantized geometry file.
+
+    :param data: file content
+    :return: `(vertices, faces, colors)`, float32 positions of shape `(n, 3)`, `faces` of shape `(m, 3)` or `None`,
+        `colors` of shape `(n, c)` or `None`
+    """
+    magic, version, length = QUANTIZED_HEADER.unpack_from(data, 0)
+    if magic != QUANTIZED_MAGIC:
+        raise ValueError("not a Wis3D quantized geometry file")
+    offset = QUANTIZED_HEADER.size
+    header = json.loads(bytes(data[offset:offset + length]))
+    _, decompress = COMPRESSORS[header["compression"]]
+    payload = memoryview(decompress(data[offset + length:]))
+    n, m, channels = header["count"], header["faces"], header["channels"]
+
+    quantized = _unshuffle(payload, np.uint16, n * 3).reshape(n, 3)
+    vertices = (quantized * np.asarray(header["scale"]) + np.asarray(header["min"])).astype(np.float32)
+    offset = n * 6
+    colors = None
+    if channels:
+        colors = np.frombuffer(payload, np.uint8, n * channels, offset).reshape(n, channels)
+        offset += n * channels
+    faces = None
+    if m:
+        zigzag = _unshuffle(payload[offset:], np.uint32, m * 3).astype(np.int64)
+        faces = np.cumsum((zigzag >> 1) ^ -(zigzag & 1)).reshape(m, 3)
+    return vertices, faces, colors
+
+
+def encode_ply(vertices: np.ndarray, faces: np.ndarray = None, colors: np.ndarray = None, transform: np.ndarray = None) -> bytearray:
+    """
+    Encode a point cloud or a mesh as binary little-endian PLY.
+
+    The vertex and face records are written in place into a single buffer, with the axis remap applied while copying
+    the positions, so no transformed copy of the inputs is made.
+
+    :param vertices: positions of shape `(n, 3)`, written as float32
+    :param faces: vertex indices of shape `(m, 3)` for meshes
+    :param colors: colors of shape `(n, 3)` or `(n, 4)`, or a single color, see `uint8_colors`
+    :param transform: optional axis remap applied to the positions, see `remap_axes`
+    :return: the file content
+    """
+    vertices = np.asarray(vertices).reshape(-1, 3)
+    n = len(vertices)
+    header = ["ply", "format binary_little_endian 1.0", f"element vertex {n}"] + [f"property float {c}" for c in "xyz"]
+    channels = 0
+    if colors is not None and len(colors) > 0:
+        colors = uint8_colors(per_vertex_colors(colors, n))
+        channels = colors.shape[1]
+        header += [f"property uchar {c}" for c in ("red", "green", "blue", "alpha")[:channels]]
+    m = 0
+    if faces is not None and len(faces) > 0:
+        faces = np.asarray(faces).reshape(-1, 3)
+        m = len(faces)
+        header += [f"element face {m}", "property list uchar int vertex_indices"]
+    header.append("end_header\n")
+    header = "\n".join(header).encode()
+
+    # vertex records are float32 x, y, z then uint8 colors; face records are a uint8 count then 3 int32 indices
+    stride = 12 + channels
+    buf = bytearray(len(header) + n * stride + m * 13)
+    buf[:len(header)] = header
+    offset = len(header)
+    positions = np.ndarray((n, 3), "<f4", buf, offset, (stride, 4))
+    if transform is None:
+        positions[...] = vertices
+    else:
+        remap_axes(positions, vertices, transform)
+    if channels:
+        np.ndarray((n, channels), "u1", buf, offset + 12, (stride, 1))[...] = colors
+    offset += n * stride
+    if m:
+        np.ndarray((m,), "u1", buf, offset, (13,))[...] = 3
+        np.ndarray((m, 3), "<i4", buf, offset + 1, (13, 4))[...] = faces
+    return buf
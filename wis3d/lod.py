@@ -0,0 +1,217 @@
+# coding=utf-8
+"""
+Level-of-detail structures built at write time, so the viewer only loads the detail it needs.
+
+Point cloud octree (``.w3do``): a JSON index next to a hidden folder of node chunks::
+
+    <name>.w3do        {"version", "count", "capacity", "min", "size", "chunks", "nodes": {name: count}}
+    .<name>.w3do/r.w3dp, r0.w3dp, r05.w3dp, ...
+
+`min` and `size` give the bounding cube of the root node. Node `r` is the root and the name of a child appends the
+octant index `(x >= cx) + 2 * (y >= cy) + 4 * (z >= cz)` to its parent. Every point is stored in exactly one node:
+a node keeps a uniform random sample of up to `capacity` of the points in its cube and hands the others to its
+children, so drawing a node and its loaded ancestors always shows a representative subsample.
+
+Mesh pyramid: decimated copies of a PLY mesh, cached in a hidden folder next to it::
+
+    <name>.ply
+    .<name>.ply/0.01.ply, 0.1.ply, ...
+
+The file name of a level is its ratio of faces to the original. Levels are built by vertex clustering,
+either at write time or by the server on the first request.
+"""
+import io
+import os
+import re
+import json
+
+import numpy as np
+
+from wis3d import formats
+from wis3d.utils import atomic_write
+
+OCTREE_VERSION = 1
+OCTREE_CAPACITY = 1 << 16
+OCTREE_MAX_DEPTH = 16
+NODE_NAME = re.compile(r"r[0-7]*")
+MESH_LOD_LEVELS = (0.01, 0.1)
+# levels with fewer faces are not written
+MESH_LOD_MIN_FACES = 16
+
+
+def sidecar_dir(filename: str) -> str:
+    """
+    Hidden folder of the files derived from `filename`, e.g. the node chunks of an octree or the levels of a mesh.
+    """
+    return os.path.join(os.path.dirname(filename), "." + os.path.basename(filename))
+
+
+def build_point_octree(vertices: np.ndarray, capacity: int = OCTREE_CAPACITY, max_depth: int = OCTREE_MAX_DEPTH, seed: int = 0):
+    """
+    Split a point cloud into octree nodes.
+
+    :param vertices: positions of shape `(n, 3)`
+    :param capacity: maximum number of points of a node, except at `max_depth`
+    :param max_depth: depth at which nodes keep all their points, which bounds the tree for duplicated points
+    :param seed: seed of the random order that selects the samples of each node
+    :return: `(nodes, lo, size)`, `nodes` maps node names to indices into `vertices`, `lo` and `size` give the root cube
+    """
+    vertices = np.asarray(vertices)
+    n = len(vertices)
+    lo = vertices.min(axis=0).astype(np.float64) if n else np.zeros(3)
+    size = float((vertices.max(axis=0) - lo).max()) if n else 0.0
+    size = size if size > 0 else 1.0
+
+    # a node's points stay in this random order, so any prefix of them is a uniform sample
+    order = np.random.default_rng(seed).permutation(n)
+    nodes = {}
+    stack = [("r", order, lo, size)]
+    while stack:
+        name, idx, node_lo, node_size = stack.pop()
+        if len(idx) <= capacity or len(name) - 1 >= max_depth:
+            nodes[name] = idx
+            continue
+        nodes[name] = idx[:capacity]
+        rest = idx[capacity:]
+        half = node_size / 2
+        octant = ((vertices[rest] >= node_lo + half) * (1, 2, 4)).sum(axis=1)
+        # a stable sort keeps the random order within each octant
+        sort = np.argsort(octant, kind="stable")
+        rest = rest[sort]
+        bounds = np.searchsorted(octant[sort], np.arange(9))
+        for i in range(8):
+            child = rest[bounds[i]:bounds[i + 1]]
+            if len(child):
+                child_lo = node_lo + half * np.array([i & 1, (i >> 1) & 1, (i >> 2) & 1])
+                stack.append((name + str(i), child, child_lo, half))
+    return nodes, lo, size
+
+
+def write_point_octree(filename: str, vertices: np.ndarray, colors: np.ndarray = None, capacity: int = OCTREE_CAPACITY) -> bytes:
+    """
+    Write the node chunks of an octree point cloud and return its index, to be written to `filename`.
+
+    :param filename: path of the index file
+    :param vertices: positions of shape `(n, 3)`
+    :param colors: colors of shape `(n, 3)` in range [0, 255], or a single color
+    :param capacity: maximum number of points of a node
+    :return: content of the index file
+    """
+    vertices = np.asarray(vertices, dtype=np.float32).reshape(-1, 3)
+    if colors is not None:
+        colors = formats.per_vertex_colors(colors, len(vertices))[:, :3]
+    nodes, lo, size = build_point_octree(vertices, capacity)
+
+    chunk_dir = sidecar_dir(filename)
+    os.makedirs(chunk_dir, exist_ok=True)
+    for name, idx in nodes.items():
+        data = formats.encode_point_cloud(vertices[idx], colors[idx] if colors is not None else None)
+        with open(os.path.join(chunk_dir, name + ".w3dp"), "wb") as f:
+            f.write(data)
+
+    index = dict(
+        version=OCTREE_VERSION,
+        count=len(vertices),
+        capacity=capacity,
+        min=lo.tolist(),
+        size=size,
+        chunks=os.path.basename(chunk_dir),
+        nodes={name: len(idx) for name, idx in sorted(nodes.items())},
+    )
+    return json.dumps(index).encode()
+
+
+def decimate_mesh(vertices: np.ndarray, faces: np.ndarray, ratio: float, vertex_colors: np.ndarray = None):
+    """
+    Simplify a mesh to about `ratio` of its faces by clustering its vertices on a regular grid.
+
+    The grid size is estimated from the surface area, which covers `2 * area / h ** 2` triangles at spacing `h`,
+    and refined until at most 1.5 times the target number of faces is left.
+
+    :param vertices: positions of shape `(n, 3)`
+    :param faces: vertex indices of shape `(m, 3)`
+    :param ratio: target ratio of faces, in (0, 1)
+    :param vertex_colors: optional colors of shape `(n, c)`, averaged over each cluster
+    :return: `(vertices, faces, vertex_colors)` of the simplified mesh
+    """
+    vertices = np.asarray(vertices, dtype=np.float64)
+    faces = np.asarray(faces, dtype=np.int64)
+    target = max(int(len(faces) * ratio), 1)
+    tri = vertices[faces]
+    area = np.linalg.norm(np.cross(tri[:, 1] - tri[:, 0], tri[:, 2] - tri[:, 0]), axis=1).sum() / 2
+    if len(faces) <= target or area == 0:
+        return vertices, faces, vertex_colors
+
+    lo = vertices.min(axis=0)
+    h = np.sqrt(2 * area / target)
+    for _ in range(8):
+        grid = np.floor((vertices - lo) / h).astype(np.int64)
+        dims = grid.max(axis=0) + 1
+        cells = grid[:, 0] + dims[0] * (grid[:, 1] + dims[1] * grid[:, 2])
+        _, cluster = np.unique(cells, return_inverse=True)
+        new_faces = cluster.reshape(-1)[faces]
+        new_faces = new_faces[(new_faces[:, 0] != new_faces[:, 1]) & (new_faces[:, 1] != new_faces[:, 2]) & (new_faces[:, 2] != new_faces[:, 0])]
+        # faces that collapsed onto the same three clusters are kept once
+        _, first = np.unique(np.sort(new_faces, axis=1), axis=0, return_index=True)
+        new_faces = new_faces[np.sort(first)]
+        if len(new_faces) <= 1.5 * target:
+            break
+        h *= np.sqrt(len(new_faces) / target)
+
+    # drop clusters without faces and average the vertices of the others
+    used, new_faces = np.unique(new_faces, return_inverse=True)
+    new_faces = new_faces.reshape(-1, 3)
+    remap = np.full(cluster.max() + 1, -1)
+    remap[used] = np.arange(len(used))
+    cluster = remap[cluster.reshape(-1)]
+    keep = cluster >= 0
+    weights = np.bincount(cluster[keep], minlength=len(used)).astype(np.float64)[:, None]
+
+    def average(values):
+        values = np.asarray(values, dtype=np.float64)[keep]
+        return np.stack([np.bincount(cluster[keep], values[:, i], len(used)) for i in range(values.shape[1])], axis=1) / weights
+
+    new_vertices = average(vertices)
+    new_colors = None
+    if vertex_colors is not None:
+        new_colors = np.round(average(vertex_colors)).astype(np.asarray(vertex_colors).dtype)
+    return new_vertices, new_faces, new_colors
+
+
+def mesh_level_path(filename: str, ratio: float) -> str:
+    """
+    Path of the level `ratio` of the mesh `filename`.
+    """
+    return os.path.join(sidecar_dir(filename), f"{ratio:g}.ply")
+
+
+def write_mesh_levels(filename: str, ratios=MESH_LOD_LEVELS, data: bytes = None) -> list:
+    """
+    Build the decimated levels of a PLY mesh and write them next to it. Levels with fewer than `MESH_LOD_MIN_FACES`
+    faces are skipped, the viewer would show them as points or nothing before the mesh.
+
+    :param filename: path of the mesh
+    :param ratios: ratios of faces of the levels
+    :param data: content of the mesh file, read from `filename` if not given
+    :return: the ratios of the levels written
+    """
+    import trimesh
+
+    if data is None:
+        with open(filename, "rb") as f:
+            data = f.read()
+    mesh = trimesh.load(io.BytesIO(data), file_type="ply", process=False)
+    colors = mesh.visual.vertex_colors if mesh.visual.kind == "vertex" else None
+    written = []
+    for ratio in ratios:
+        vertices, faces, vertex_colors = decimate_mesh(mesh.vertices, mesh.faces, ratio, colors)
+        path = mesh_level_path(filename, ratio)
+        if len(faces) < MESH_LOD_MIN_FACES:
+            # a level of an earlier mesh of the same name must not be shown
+            if os.path.exists(path):
+                os.remove(path)
+            continue
+        os.makedirs(sidecar_dir(filename), exist_ok=True)
+        atomic_write(path, formats.encode_ply(vertices, faces, vertex_colors))
+        written.append(ratio)
+    return written
@@ -0,0 +1,144 @@
+# coding=utf-8
+"""
+Manifest of the objects of a sequence, so that the server lists scenes and files without scanning the folders.
+
+The manifest is a hidden file of the sequence folder with one JSON object per line, appended when an object is written::
+
+    <sequence>/.manifest.jsonl    {"scene": 0, "type": "meshes", "name": "00000.ply", "size": 1024, "mtime": 1700000000.0}
+
+Scenes evicted by the retention manager are recorded as ``{"scene": 0, "removed": true}``.
+Sequence folders that already had scenes without a manifest get none, and the server keeps scanning them.
+"""
+import os
+import json
+import time
+import threading
+
+MANIFEST_FILE = ".manifest.jsonl"
+
+
+def manifest_path(seq_folder: str) -> str:
+    return os.path.join(seq_folder, MANIFEST_FILE)
+
+
+def append_removed_scene(seq_folder: str, scene: int) -> None:
+    """
+    Record that the scene `scene` of a sequence was removed.
+    """
+    with open(manifest_path(seq_folder), "ab") as f:
+        f.write((json.dumps(dict(scene=scene, removed=True)) + "\n").encode())
+
+
+class ManifestWriter:
+    """
+    Appends the objects written to a sequence to its manifest. Use `ManifestWriter.open` to share the writer of a
+    sequence between the `Wis3D` instances of a process.
+    """
+
+    writers = {}
+    writers_lock = threading.Lock()
+
+    @classmethod
+    def open(cls, seq_folder: str):
+        """
+        :return: the writer of the sequence, or None if the sequence has objects that are not in a manifest
+        """
+        seq_folder = os.path.abspath(seq_folder)
+        with cls.writers_lock:
+            writer = cls.writers.get(seq_folder)
+            if writer is not None and os.path.exists(writer.path):
+                return writer
+            if os.path.isdir(seq_folder) and not os.path.exists(manifest_path(seq_folder)):
+                if any(not f.startswith(".") for f in os.listdir(seq_folder)):
+                    return None
+            writer = cls.writers[seq_folder] = cls(seq_folder)
+            return writer
+
+    def __init__(self, seq_folder: str):
+        self.seq_folder = seq_folder
+        self.path = manifest_path(seq_folder)
+        self.lock = threading.Lock()
+        os.makedirs(seq_folder, exist_ok=True)
+        # opened for each entry, so that the manifest can be removed with its sequence at any time
+        open(self.path, "ab").close()
+
+    def append(self, filename: str, size: int) -> None:
+        """
+        Record the object file `filename` of the sequence, of `size` bytes.
+        """
+        scene, obj_type, name = os.path.relpath(filename, self.seq_folder).replace(os.sep, "/").split("/", 2)
+        entry = dict(scene=int(scene), type=obj_type, name=name, size=size, mtime=time.time())
+        line = (json.dumps(entry) + "\n").encode()
+        with self.lock:
+            with open(self.path, "ab") as f:
+                f.write(line)
+
+
+class Manifest:
+    """
+    In-memory index of the manifest of a sequence. `refresh` reads the entries appended since the last call.
+    """
+
+    def __init__(self, seq_folder: str):
+        self.seq_folder = os.path.abspath(seq_folder)
+        self.path = manifest_path(self.seq_folder)
+        self.lock = threading.Lock()
+        # scene folder name -> type -> file name -> (size, mtime)
+        self.scenes = {}
+        self.sorted_scenes = None
+        self.pos = 0
+        self.inode = None
+        self.refresh()
+
+    def refresh(self) -> None:
+        with self.lock:
+            with open(self.path, "rb") as f:
+                st = os.fstat(f.fileno())
+                if (st.st_ino, st.st_dev) != self.inode or st.st_size < self.pos:
+                    # the manifest was removed and written again
+                    self.inode = (st.st_ino, st.st_dev)
+                    self.scenes = {}
+                    self.sorted_scenes = None
+                    self.pos = 0
+                if st.st_size == self.pos:
+                    return
+                f.seek(self.pos)
+                buf = f.read()
+            # a line without its newline is still being written
+            end = buf.rfind(b"\n") + 1
+            lines = buf[:end].splitlines()
+            try:
+                # parsing all lines at once is about twice as fast
+                entries = json.loads(b"[" + b",".join(lines) + b"]")
+            except ValueError:
+                entries = []
+                for line in lines:
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        continue
+            for entry in entries:
+                scene = "%05d" % entry["scene"]
+                if entry.get("removed"):
+                    if self.scenes.pop(scene, None) is not None:
+                        self.sorted_scenes = None
+                    continue
+                if scene not in self.scenes:
+                    self.scenes[scene] = {}
+                    self.sorted_scenes = None
+                files = self.scenes[scene].setdefault(entry["type"], {})
+                files[entry["name"]] = (entry["size"], entry["mtime"])
+            self.pos += end
+
+    def scene_names(self):
+        with self.lock:
+            if self.sorted_scenes is None:
+                self.sorted_scenes = sorted(self.scenes)
+            return self.sorted_scenes
+
+    def files_in_scene(self, scene: str) -> dict:
+        """
+        :return: names of the objects of the scene `scene` by type
+        """
+        with self.lock:
+            return {obj_type: sorted(files) for obj_type, files in self.scenes.get(scene, {}).items()}
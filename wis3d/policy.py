@@ -0,0 +1,120 @@
+# coding=utf-8
+import time
+import threading
+from collections import Counter
+
+
+class LoggingPolicy:
+    """
+    Budget of what `Wis3D` writes, checked when an `add_*` method is called, before any conversion or encoding.
+
+    Calls over a count limit (`every_k_scenes`, `max_files_per_scene`, `quotas`) are dropped. Calls over the byte rate
+    are dropped, or wait until the rate allows them with `over_budget="block"`. The skipped calls are counted, see `stats`.
+
+    The byte rate is enforced with a token bucket: a call is admitted while the bytes written over the last
+    `burst` seconds stay within `max_bytes_per_second * burst`. The size of a file is only known once it is encoded,
+    so the file that exceeds the budget is still written, and the calls after it wait for the budget to recover.
+    """
+
+    def __init__(self, every_k_scenes: int = 1, max_bytes_per_second: float = None, max_files_per_scene: int = None, quotas: dict = None, over_budget: str = "drop", burst: float = 1.0):
+        """
+        :param every_k_scenes: only write the scenes whose id is a multiple of `every_k_scenes`
+        :param max_bytes_per_second: maximum average rate of bytes written, None for no limit
+        :param max_files_per_scene: maximum number of objects written per scene, None for no limit
+        :param quotas: maximum number of objects per scene by object type, e.g. `{"meshes": 1, "images": 4}`.
+            The types are the folder names of the objects: "point_clouds", "meshes", "images", "boxes", "lines",
+            "voxels", "spheres", "camera_trajectories" and "correspondences"
+        :param over_budget: "drop" to skip calls over the byte rate, or "block" to wait until the rate allows them
+        :param burst: number of seconds of budget that can be spent at once
+        """
+        assert every_k_scenes >= 1, "every_k_scenes must be positive"
+        assert over_budget in ("drop", "block"), f"unknown over_budget: {over_budget}"
+        self.every_k_scenes = every_k_scenes
+        self.max_bytes_per_second = max_bytes_per_second
+        self.max_files_per_scene = max_files_per_scene
+        self.quotas = dict(quotas or {})
+        self.over_budget = over_budget
+        self.capacity = max_bytes_per_second * burst if max_bytes_per_second is not None else None
+
+        self.lock = threading.Lock()
+        self.tokens = self.capacity
+        self.last_refill = time.monotonic()
+        # (scene key, number of files, Counter of files by type) of the current scene of each sequence
+        self.scenes = {}
+        self.files = Counter()
+        self.skipped = Counter()
+        self.skipped_by = Counter()
+        self.bytes_written = 0
+        self.blocked_seconds = 0.0
+
+    def __refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.max_bytes_per_second)
+        self.last_refill = now
+
+    def __skip(self, obj_type: str, reason: str) -> bool:
+        self.skipped[obj_type] += 1
+        self.skipped_by[reason] += 1
+        return False
+
+    def admit(self, sequence: str, scene_id: int, obj_type: str) -> bool:
+        """
+        Decide whether to write an object, and count it as written if so.
+
+        :param sequence: folder of the sequence, scenes of different sequences are counted separately
+        :param scene_id: id of the current scene
+        :param obj_type: type of the object, see `quotas`
+        :return: whether the object should be written
+        """
+        with self.lock:
+            if scene_id % self.every_k_scenes != 0:
+                return self.__skip(obj_type, "every_k_scenes")
+            scene = self.scenes.get(sequence)
+            if scene is None or scene[0] != scene_id:
+                scene = (scene_id, 0, Counter())
+            _, files, types = scene
+            if self.max_files_per_scene is not None and files >= self.max_files_per_scene:
+                return self.__skip(obj_type, "max_files_per_scene")
+            if obj_type in self.quotas and types[obj_type] >= self.quotas[obj_type]:
+                return self.__skip(obj_type, "quotas")
+            if self.capacity is not None:
+                self.__refill()
+                while self.tokens < 0:
+                    if self.over_budget == "drop":
+                        return self.__skip(obj_type, "max_bytes_per_second")
+                    wait = -self.tokens / self.max_bytes_per_second
+                    self.lock.release()
+                    try:
+                        time.sleep(wait)
+                    finally:
+                        self.lock.acquire()
+                    self.blocked_seconds += wait
+                    self.__refill()
+            types[obj_type] += 1
+            self.scenes[sequence] = (scene_id, files + 1, types)
+            self.files[obj_type] += 1
+            return True
+
+    def record_bytes(self, size: int) -> None:
+        """
+        Count `size` bytes written against the byte rate.
+        """
+        with self.lock:
+            self.bytes_written += size
+            if self.capacity is not None:
+                self.__refill()
+                self.tokens -= size
+
+    def stats(self) -> dict:
+        """
+        :return: numbers of objects written and skipped by type, of skipped objects by limit, bytes written
+            and seconds spent waiting for the byte rate
+        """
+        with self.lock:
+            return dict(
+                files=dict(self.files),
+                skipped=dict(self.skipped),
+                skipped_by=dict(self.skipped_by),
+                bytes_written=self.bytes_written,
+                blocked_seconds=self.blocked_seconds,
+            )
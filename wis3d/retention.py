@@ -0,0 +1,287 @@
+# coding=utf-8
+"""
+Retention of the scenes of a visualization folder: evicts scenes by age, count and total size.
+
+The server records when scenes are viewed in a hidden file of each sequence, so that the least recently viewed scenes
+can be evicted first::
+
+    <sequence>/.access.json    {"00000": 1700000000.0, ...}
+"""
+import os
+import re
+import json
+import time
+import shutil
+import threading
+
+from wis3d.manifest import manifest_path, append_removed_scene
+from wis3d.archive import has_archive
+from wis3d.store import OBJECTS_FOLDER
+from wis3d.distributed import shard_folders
+from wis3d.utils import atomic_write
+
+ACCESS_FILE = ".access.json"
+# the server rewrites the access times of a sequence at most once per interval
+ACCESS_WRITE_INTERVAL = 60
+SIZE_UNITS = {"": 1, "k": 1 << 10, "m": 1 << 20, "g": 1 << 30, "t": 1 << 40}
+AGE_UNITS = {"": 1, "s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+
+def parse_size(size: str) -> int:
+    """
+    Parse a size such as "500M" or "2G" into bytes.
+    """
+    match = re.fullmatch(r"\s*([\d.]+)\s*([kmgt]?)i?b?\s*", str(size).lower())
+    if match is None:
+        raise ValueError(f"invalid size: {size}")
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2)])
+
+
+def parse_age(age: str) -> float:
+    """
+    Parse a duration such as "12h" or "7d" into seconds.
+    """
+    match = re.fullmatch(r"\s*([\d.]+)\s*([smhdw]?)\s*", str(age).lower())
+    if match is None:
+        raise ValueError(f"invalid age: {age}")
+    return float(match.group(1)) * AGE_UNITS[match.group(2)]
+
+
+def read_access_times(seq_folder: str) -> dict:
+    try:
+        with open(os.path.join(seq_folder, ACCESS_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+class AccessRecorder:
+    """
+    Records the last time each scene was viewed, used by the server.
+    """
+
+    def __init__(self, interval: float = ACCESS_WRITE_INTERVAL):
+        self.interval = interval
+        self.lock = threading.Lock()
+        # sequence folder -> (time of the last write, access times by scene)
+        self.sequences = {}
+
+    def touch(self, seq_folder: str, scene: str) -> None:
+        now = time.time()
+        with self.lock:
+            written, times = self.sequences.get(seq_folder, (0.0, None))
+            if times is None:
+                times = read_access_times(seq_folder)
+            times[scene] = now
+            if now - written < self.interval:
+                self.sequences[seq_folder] = (written, times)
+                return
+            self.sequences[seq_folder] = (now, times)
+            data = json.dumps(times)
+        self.__write(seq_folder, data)
+
+    def flush(self) -> None:
+        """
+        Write the access times recorded since the last write, e.g. when the server stops.
+        """
+        with self.lock:
+            pending = [(seq_folder, json.dumps(times)) for seq_folder, (_, times) in self.sequences.items()]
+        for seq_folder, data in pending:
+            self.__write(seq_folder, data)
+
+    @staticmethod
+    def __write(seq_folder: str, data: str) -> None:
+        try:
+            atomic_write(os.path.join(seq_folder, ACCESS_FILE), data.encode())
+        except OSError:
+            # the sequence was removed
+            pass
+
+
+class Scene:
+    def __init__(self, seq_folder: str, name: str, size: int, mtime: float, atime: float):
+        self.seq_folder = seq_folder
+        self.name = name
+        self.size = size
+        self.mtime = mtime
+        self.atime = atime
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.seq_folder, self.name)
+
+
+def _folder_size(folder: str, shared: bool = True):
+    """
+    :param shared: whether to count files with other hardlinks, e.g. into the deduplicated store, which removing
+        `folder` does not free
+    :return: total size and latest modification time of the files under `folder`
+    """
+    size, mtime = 0, 0.0
+    for root, _, files in os.walk(folder):
+        for f in files:
+            try:
+                st = os.lstat(os.path.join(root, f))
+            except OSError:
+                continue
+            if shared or st.st_nlink == 1:
+                size += st.st_size
+            mtime = max(mtime, st.st_mtime)
+    return size, mtime
+
+
+class RetentionManager:
+    """
+    Keeps a visualization folder within limits by evicting whole scenes.
+
+    The scenes over `max_scenes_per_sequence` or older than `max_age` are evicted, then more scenes until the folder
+    is under `max_bytes`. Scenes are evicted oldest first, or least recently viewed first with `order="lru"`.
+    The latest scene of each sequence is never evicted, since it may still be written. Sequences stored as archives
+    (`storage="archive"`) are left untouched. The shards of a distributed run (`Wis3D(shard=True)`) are handled like
+    sequences.
+    """
+
+    def __init__(self, vis_dir: str, max_bytes: int = None, max_scenes_per_sequence: int = None, max_age: float = None, order: str = "oldest", interval: float = 60.0):
+        """
+        :param vis_dir: the folder holding the sequences, `out_folder` of `Wis3D`
+        :param max_bytes: maximum total size of the scenes, e.g. 10 << 30 or "10G"
+        :param max_scenes_per_sequence: maximum number of scenes of each sequence
+        :param max_age: maximum age of scenes since they were last written, or last viewed with `order="lru"`, in seconds or e.g. "7d"
+        :param order: "oldest" to evict the scenes written first, or "lru" for the least recently viewed in the server
+        :param interval: minimum time in seconds between two collections run by `Wis3D`, see `due`
+        """
+        assert order in ("oldest", "lru"), f"unknown order: {order}"
+        self.vis_dir = os.path.abspath(vis_dir)
+        self.max_bytes = parse_size(max_bytes) if isinstance(max_bytes, str) else max_bytes
+        self.max_scenes_per_sequence = max_scenes_per_sequence
+        self.max_age = parse_age(max_age) if isinstance(max_age, str) else max_age
+        self.order = order
+        self.interval = interval
+        self.last_collect = 0.0
+        self.lock = threading.Lock()
+        self.evicted_scenes = 0
+        self.evicted_bytes = 0
+
+    def scenes(self, seq_folder: str, access: dict = None):
+        """
+        :param access: last access times of the scenes, read from the sequence folder if None
+        :return: the scenes of a sequence or shard folder, sorted by id
+        """
+        access = read_access_times(seq_folder) if access is None else access
+        scenes = []
+        for name in os.listdir(seq_folder):
+            path = os.path.join(seq_folder, name)
+            if not name.isdigit() or not os.path.isdir(path):
+                continue
+            # walk the folder rather than trusting the manifest, which misses the files objects reference;
+            # deduplicated objects are counted once, in the store
+            size, mtime = _folder_size(path, shared=False)
+            mtime = mtime or os.path.getmtime(path)
+            scenes.append(Scene(seq_folder, name, size, mtime, access.get(name, mtime)))
+        return sorted(scenes, key=lambda scene: scene.name)
+
+    def select(self, now: float = None, incoming=()):
+        """
+        :param incoming: paths of scene folders about to be written, counted against `max_scenes_per_sequence`
+        :return: the scenes to evict
+        """
+        now = time.time() if now is None else now
+        incoming = {os.path.abspath(path) for path in incoming}
+        key = (lambda scene: scene.atime) if self.order == "lru" else (lambda scene: scene.mtime)
+        candidates, total, evicted = [], 0, []
+        if not os.path.isdir(self.vis_dir):
+            return evicted
+        for name in sorted(os.listdir(self.vis_dir)):
+            seq_folder = os.path.join(self.vis_dir, name)
+            if name.startswith(".") or not os.path.isdir(seq_folder):
+                continue
+            # the server records the access times of a sharded sequence in the sequence folder
+            access = read_access_times(seq_folder)
+            for folder in [seq_folder] + shard_folders(seq_folder):
+                if has_archive(folder):
+                    continue
+                scenes = self.scenes(folder, access)
+                total += sum(scene.size for scene in scenes) + _folder_size(os.path.join(folder, OBJECTS_FOLDER))[0]
+                names = {scene.name for scene in scenes}
+                new = sum(os.path.dirname(path) == folder and os.path.basename(path) not in names for path in incoming)
+                # the latest scene may still be written
+                scenes = sorted(scenes[:-1], key=key)
+                if self.max_scenes_per_sequence is not None:
+                    over = len(scenes) + 1 + new - self.max_scenes_per_sequence
+                    if over > 0:
+                        evicted += scenes[:over]
+                        scenes = scenes[over:]
+                if self.max_age is not None:
+                    old = [scene for scene in scenes if now - key(scene) > self.max_age]
+                    evicted += old
+                    scenes = [scene for scene in scenes if now - key(scene) <= self.max_age]
+                candidates += scenes
+        if self.max_bytes is not None:
+            total -= sum(scene.size for scene in evicted)
+            for scene in sorted(candidates, key=key):
+                if total <= self.max_bytes:
+                    break
+                evicted.append(scene)
+                total -= scene.size
+        return evicted
+
+    def collect(self, dry_run: bool = False, incoming=()):
+        """
+        Evict the scenes over the limits.
+
+        :param dry_run: only return the scenes that would be evicted
+        :param incoming: paths of scene folders about to be written, see `select`
+        :return: the evicted scenes
+        """
+        with self.lock:
+            evicted = self.select(incoming=incoming)
+            if dry_run:
+                return evicted
+            for scene in evicted:
+                if os.path.isfile(manifest_path(scene.seq_folder)):
+                    append_removed_scene(scene.seq_folder, int(scene.name))
+                shutil.rmtree(scene.path, ignore_errors=True)
+                self.evicted_scenes += 1
+                self.evicted_bytes += scene.size
+            for seq_folder in {scene.seq_folder for scene in evicted}:
+                self.prune_objects(seq_folder)
+            self.last_collect = time.time()
+            return evicted
+
+    def due(self) -> bool:
+        """
+        Whether the last collection is older than `interval`.
+        """
+        return time.time() - self.last_collect >= self.interval
+
+    @staticmethod
+    def prune_objects(seq_folder: str) -> None:
+        """
+        Remove the files of the deduplicated store (`dedup=True`) that no object links to anymore.
+        Only stores on file systems with hardlinks are pruned, objects cannot be traced back from symlinks or copies.
+        """
+        root = os.path.join(seq_folder, OBJECTS_FOLDER)
+        if not os.path.isdir(root) or not _hardlinks_supported(root):
+            return
+        for name in os.listdir(root):
+            path = os.path.join(root, name)
+            try:
+                if os.stat(path).st_nlink == 1 and not name.endswith(".tmp"):
+                    os.remove(path)
+            except OSError:
+                pass
+
+
+def _hardlinks_supported(folder: str) -> bool:
+    src = os.path.join(folder, f".link_test.{os.getpid()}.{threading.get_ident()}.tmp")
+    dst = src + ".link"
+    try:
+        open(src, "wb").close()
+        os.link(src, dst)
+        return True
+    except OSError:
+        return False
+    finally:
+        for path in (src, dst):
+            if os.path.lexists(path):
+                os.remove(path)
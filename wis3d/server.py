@@ -1,55 +1,373 @@
 # coding=utf-8
 import os
+import mmap
+import threading
 import cherrypy
 import glob
 import socket
+import mimetypes
 from .version import __version__
+from .formats import decode_quantized, encode_ply
+from .archive import ArchiveReader, has_archive
+from .manifest import Manifest, manifest_path
+from .retention import AccessRecorder
+from .stats import RequestTimings
+from .distributed import SHARD_NAME, shard_folders
+from .content_encoding import is_compressible, negotiate, encoded_path, write_encoded
+from .lod import NODE_NAME, MESH_LOD_LEVELS, sidecar_dir, mesh_level_path, write_mesh_levels
+
+# binary files that the viewer loads straight into typed arrays, served from memory maps
+MMAP_EXTS = (".w3dp", ".w3db")
+MMAP_CHUNK_SIZE = 1 << 20
+# quantized geometry is listed as `<name>.w3dq.ply` and converted to PLY when requested, so any viewer can load it
+QUANTIZED_EXT = ".w3dq"
+# images shared by the correspondences of a sequence
+ASSETS_FOLDER = ".assets"
+# files larger than this are sent uncompressed unless `Wis3D(precompress=True)` wrote their compressed copies, since
+# compressing them would hold a request thread for long
+ENCODE_ON_REQUEST_MAX_BYTES = 64 << 20
+# meshes smaller than this are loaded at once, larger ones get decimated levels on first request
+MESH_LOD_MIN_BYTES = 8 << 20
+
+
+def serve_mmap(path: str, content_type: str = "application/octet-stream"):
+    """
+    Stream a file from a read-only memory map, so large binary files are sent from the page cache
+    without being read into Python buffers first. The handler must have `response.stream` enabled.
+    Raises `NotFound` if the file does not exist, as `serve_file` does.
+    """
+    try:
+        f = open(path, "rb")
+    except (FileNotFoundError, IsADirectoryError):
+        raise cherrypy.NotFound()
+    size = os.fstat(f.fileno()).st_size
+    response = cherrypy.response
+    response.headers["Content-Type"] = content_type
+    response.headers["Content-Length"] = str(size)
+    if size == 0:
+        f.close()
+        return b""
+    mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def body():
+        try:
+            for offset in range(0, size, MMAP_CHUNK_SIZE):
+                # cheroot only accepts bytes chunks, this is the only copy
+                yield mm[offset:offset + MMAP_CHUNK_SIZE]
+        finally:
+            mm.close()
+            f.close()
+
+    return body()
+
+
+def serve_archived(mm, offset: int, length: int, content_type: str = None):
+    """
+    Stream an object of a sequence archive from the memory map of the archive. The handler must have
+    `response.stream` enabled.
+    """
+    response = cherrypy.response
+    response.headers["Content-Type"] = content_type or "application/octet-stream"
+    response.headers["Content-Length"] = str(length)
+
+    def body():
+        for start in range(offset, offset + length, MMAP_CHUNK_SIZE):
+            yield mm[start:min(start + MMAP_CHUNK_SIZE, offset + length)]
+
+    return body()
+
+
+def serve_quantized_as_ply(data: bytes):
+    """
+    Decode a Wis3D quantized geometry file and send it as binary PLY.
+    """
+    vertices, faces, colors = decode_quantized(data)
+    cherrypy.response.headers["Content-Type"] = "application/octet-stream"
+    return bytes(encode_ply(vertices, faces, colors))
+
+
+def serve_encoded(path: str):
+    """
+    Serve a file, compressed if it is worth it and the client accepts an available encoding.
+    The compressed copy is written next to the file on first request, unless `Wis3D(precompress=True)` did or the file
+    is larger than `ENCODE_ON_REQUEST_MAX_BYTES`.
+    """
+    if not (is_compressible(path) and os.path.isfile(path)):
+        return cherrypy.lib.static.serve_file(path)
+    response = cherrypy.response
+    response.headers["Vary"] = "Accept-Encoding"
+    encoding = negotiate(cherrypy.request.headers.get("Accept-Encoding"))
+    if encoding is None:
+        return cherrypy.lib.static.serve_file(path)
+    encoded = encoded_path(path, encoding)
+    if not os.path.isfile(encoded) or os.path.getmtime(encoded) < os.path.getmtime(path):
+        if os.path.getsize(path) > ENCODE_ON_REQUEST_MAX_BYTES:
+            return cherrypy.lib.static.serve_file(path)
+        write_encoded(path, encodings=(encoding,))
+    response.headers["Content-Encoding"] = encoding
+    content_type = mimetypes.types_map.get(os.path.splitext(path)[1].lower(), "application/octet-stream")
+    return cherrypy.lib.static.serve_file(encoded, content_type=content_type)
 
 
 class Visualizer:
     def __init__(self, vis_dir: str, static_dir: str):
         self.vis_dir = os.path.abspath(vis_dir)
         self.static_dir = static_dir
+        self.lod_lock = threading.Lock()
+        # in-memory indexes of the sequences, so that listings do not scan folders
+        self.archives = {}
+        self.manifests = {}
+        self.index_lock = threading.Lock()
+        self.sequences = (None, [])
+        # last time each scene was viewed, for the retention manager
+        self.access = AccessRecorder()
+        handlers = [name for name in dir(type(self)) if getattr(getattr(type(self), name), "exposed", False)]
+        self.timings = RequestTimings(handlers)
+        self._cp_config = {
+            "hooks.on_start_resource": self.timings.start,
+            "hooks.on_end_request": self.timings.end,
+        }
 
     @cherrypy.expose
     def index(self, *url_parts, **params):
         return open(os.path.join(self.static_dir, "index.html"), encoding="utf-8")
 
+    def is_inside(self, path: str) -> bool:
+        try:
+            return os.path.commonpath([self.vis_dir, os.path.abspath(path)]) == self.vis_dir
+        except ValueError:
+            # on different drives
+            return False
+
+    def is_servable(self, path: str) -> bool:
+        """
+        Whether `/file` may send `path`: objects `<sequence>/<scene>/<type>/<name>`, the files derived from them in
+        their hidden sidecar folders, and the shared images of a sequence in `.assets`. Shards are laid out like
+        sequences. The internal files of a sequence, such as archives, manifests and the deduplicated store, are not
+        sent.
+        """
+        if not self.is_inside(path):
+            return False
+        rel = os.path.relpath(os.path.abspath(path), self.vis_dir).split(os.sep)
+        if len(rel) > 2 and SHARD_NAME.fullmatch(rel[1]):
+            rel = rel[:1] + rel[2:]
+        seq, rel = rel[0], rel[1:]
+        if seq.startswith("."):
+            return False
+        if len(rel) == 2 and rel[0] == ASSETS_FOLDER:
+            return not rel[1].startswith(".")
+        if len(rel) == 4 and rel[2].startswith("."):
+            # a file in the sidecar folder of the object rel[2][1:]
+            rel = rel[:2] + [rel[2][1:], rel[3]]
+        elif len(rel) != 3:
+            return False
+        return not any(part.startswith(".") or not part for part in rel)
+
+    def archive(self, seq_folder: str):
+        """
+        Up-to-date reader of the archive of a sequence folder, or None if the sequence is stored as files.
+        """
+        if not has_archive(seq_folder):
+            return None
+        with self.index_lock:
+            reader = self.archives.get(seq_folder)
+            if reader is None:
+                reader = self.archives[seq_folder] = ArchiveReader(seq_folder)
+        reader.refresh()
+        return reader
+
+    def manifest(self, seq_folder: str):
+        """
+        Up-to-date index of the manifest of a sequence folder, or None for sequences written without manifest.
+        """
+        if not os.path.isfile(manifest_path(seq_folder)):
+            return None
+        with self.index_lock:
+            manifest = self.manifests.get(seq_folder)
+            if manifest is None:
+                manifest = self.manifests[seq_folder] = Manifest(seq_folder)
+        manifest.refresh()
+        return manifest
+
+    def sequence_of(self, path: str):
+        """
+        Folder of the sequence holding the scene or object `path`, or None if `path` is not in a sequence.
+        """
+        rel = os.path.relpath(path, self.vis_dir).split(os.sep)
+        if len(rel) < 2 or rel[0] == os.pardir:
+            return None
+        if len(rel) > 2 and SHARD_NAME.fullmatch(rel[1]):
+            # the shard of a distributed run, laid out like a sequence
+            return os.path.join(self.vis_dir, rel[0], rel[1])
+        return os.path.join(self.vis_dir, rel[0])
+
+    def archive_of(self, path: str):
+        """
+        Reader of the archive that may hold the object `path`.
+        """
+        seq_folder = self.sequence_of(path)
+        return self.archive(seq_folder) if seq_folder is not None else None
+
     @cherrypy.expose
     def file(self, path, _ts=None):
-        res = path.split(os.sep)
-        vis_dir = os.sep.join(res[0:-4])
-        if vis_dir == self.vis_dir:
-            return cherrypy.lib.static.serve_file(path)
+        # objects, and the files they reference such as correspondence images
+        path = os.path.abspath(path)
+        if self.is_servable(path):
+            if not os.path.exists(path):
+                quantized = path.endswith(QUANTIZED_EXT + ".ply")
+                stored = path[:-len(".ply")] if quantized else path
+                archive = self.archive_of(stored)
+                if archive is not None and archive.lookup(stored) is not None:
+                    if quantized:
+                        return serve_quantized_as_ply(archive.read(stored))
+                    content_type = mimetypes.types_map.get(os.path.splitext(path)[1].lower())
+                    return serve_archived(*archive.lookup(stored), content_type)
+                if quantized and os.path.isfile(stored):
+                    with open(stored, "rb") as f:
+                        return serve_quantized_as_ply(f.read())
+            if path.endswith(MMAP_EXTS):
+                return serve_mmap(path)
+            return serve_encoded(path)
+        raise cherrypy.NotFound()
+
+    file._cp_config = {"response.stream": True}
+
+    @cherrypy.expose
+    def octree_node(self, path, node):
+        """
+        Binary chunk of the node `node` of the octree point cloud whose index file is `path`.
+        """
+        path = os.path.abspath(path)
+        if self.is_inside(path) and NODE_NAME.fullmatch(node):
+            chunk = os.path.join(sidecar_dir(path), node + ".w3dp")
+            if os.path.isfile(chunk):
+                return serve_mmap(chunk)
+        raise cherrypy.NotFound()
+
+    octree_node._cp_config = {"response.stream": True}
+
+    @cherrypy.expose
+    @cherrypy.tools.json_out()
+    def mesh_levels(self, path):
+        """
+        Ratios of faces of the decimated levels the viewer loads before the mesh `path`, coarsest first.
+        """
+        path = os.path.abspath(path)
+        if not (self.is_inside(path) and path.endswith(".ply") and os.path.isfile(path)):
+            return []
+        lod_dir = sidecar_dir(path)
+        if os.path.isdir(lod_dir):
+            levels = [float(f[:-4]) for f in os.listdir(lod_dir) if f.endswith(".ply")]
+            if levels:
+                return sorted(levels)
+        if os.path.getsize(path) >= MESH_LOD_MIN_BYTES:
+            return list(MESH_LOD_LEVELS)
+        return []
+
+    @cherrypy.expose
+    def mesh_level(self, path, ratio):
+        """
+        Decimated level of the mesh `path` with the ratio `ratio` of its faces, built and cached on first request.
+        """
+        path = os.path.abspath(path)
+        try:
+            ratio = float(ratio)
+        except ValueError:
+            raise cherrypy.NotFound()
+        if not (self.is_inside(path) and path.endswith(".ply") and os.path.isfile(path) and 0 < ratio < 1):
+            raise cherrypy.NotFound()
+        level = mesh_level_path(path, ratio)
+        with self.lod_lock:
+            if not os.path.isfile(level) or os.path.getmtime(level) < os.path.getmtime(path):
+                if not write_mesh_levels(path, (ratio,)):
+                    # too few faces left, the viewer skips missing levels
+                    raise cherrypy.NotFound()
+        return serve_encoded(level)
+
+    @cherrypy.expose
+    @cherrypy.tools.json_out()
+    def stats(self):
+        """
+        Number, duration and size of the responses of the server per handler, since it started.
+        """
+        return self.timings.snapshot()
 
     @cherrypy.expose
     @cherrypy.tools.json_out()
     def all_sequences(self):
-        sequences = glob.glob(os.path.join(self.vis_dir, "*"))
-        sequences = [os.path.basename(seq) for seq in sequences]
-        sequences = sorted(sequences)
+        # the folder only changes its modification time when sequences are added or removed
+        mtime = os.stat(self.vis_dir).st_mtime_ns
+        if self.sequences[0] != mtime:
+            sequences = glob.glob(os.path.join(self.vis_dir, "*"))
+            sequences = [os.path.basename(seq) for seq in sequences]
+            self.sequences = (mtime, sorted(sequences))
 
-        return sequences
+        return self.sequences[1]
 
     @cherrypy.expose
     @cherrypy.tools.json_out()
     def all_scenes_in_sequence(self, sequence: str):
-        scenes = glob.glob(os.path.abspath(os.path.join(self.vis_dir, sequence, "*")))
+        seq_folder = os.path.abspath(os.path.join(self.vis_dir, sequence))
+        # the scenes of the shards of a distributed run are listed as scenes of the sequence
+        scenes = set()
+        for folder in [seq_folder] + shard_folders(seq_folder):
+            scenes.update(os.path.join(seq_folder, scene) for scene in self.scene_names(folder))
         scenes = sorted(scenes)
 
         return scenes
 
+    def scene_names(self, seq_folder: str):
+        """
+        Names of the scenes of a sequence or shard folder.
+        """
+        manifest = self.manifest(seq_folder)
+        if manifest is not None:
+            scenes = set(manifest.scene_names())
+        else:
+            scenes = {os.path.basename(scene) for scene in glob.glob(os.path.join(seq_folder, "*"))}
+        archive = self.archive(seq_folder)
+        if archive is not None:
+            scenes.update(archive.scene_names())
+        return scenes
+
     @cherrypy.expose
     @cherrypy.tools.json_out()
     def files_in_scene(self, scene_path):
         all_files = dict()
-        folders = glob.glob(os.path.join(scene_path, "*"))
-        for folder in folders:
-            obj_type = os.path.basename(folder)
-            all_files[obj_type] = sorted(glob.glob(os.path.join(folder, "*")))
+        scene_path = os.path.abspath(scene_path)
+        seq_folder = self.sequence_of(scene_path) if self.is_inside(scene_path) else None
+        if seq_folder is None:
+            self.add_scene_files(all_files, None, scene_path)
+        else:
+            scene = os.path.basename(scene_path)
+            for folder in [seq_folder] + shard_folders(seq_folder):
+                self.add_scene_files(all_files, folder, os.path.join(folder, scene))
+            self.access.touch(seq_folder, scene)
+        for obj_type, files in all_files.items():
+            all_files[obj_type] = sorted(set(f + ".ply" if f.endswith(QUANTIZED_EXT) else f for f in files))
 
         return all_files
 
+    def add_scene_files(self, all_files: dict, seq_folder: str, scene_path: str) -> None:
+        """
+        Add the objects of the scene `scene_path` of the sequence or shard folder `seq_folder` to `all_files`, by type.
+        """
+        manifest = self.manifest(seq_folder) if seq_folder is not None else None
+        if manifest is not None:
+            for obj_type, names in manifest.files_in_scene(os.path.basename(scene_path)).items():
+                files = all_files.setdefault(obj_type, [])
+                files.extend(os.path.join(scene_path, obj_type, name) for name in names)
+        else:
+            folders = glob.glob(os.path.join(scene_path, "*"))
+            for folder in folders:
+                files = all_files.setdefault(os.path.basename(folder), [])
+                files.extend(glob.glob(os.path.join(folder, "*")))
+        archive = self.archive(seq_folder) if seq_folder is not None else None
+        if archive is not None:
+            for obj_type, names in archive.files_in_scene(os.path.basename(scene_path)).items():
+                files = all_files.setdefault(obj_type, [])
+                files.extend(os.path.join(scene_path, obj_type, name) for name in names)
+
 
 def find_free_port(start: int, host: str = "0.0.0.0") -> int:
     with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
@@ -96,6 +414,7 @@ def run_server(
     )
 
     cherrypy.tree.mount(visualizer, "", conf)
+    cherrypy.engine.subscribe("stop", visualizer.access.flush)
     cherrypy.engine.signals.subscribe()
     # try:
     cherrypy.engine.start()
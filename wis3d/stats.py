@@ -0,0 +1,178 @@
+# coding=utf-8
+"""
+Instrumentation of the time Wis3D takes, split into phases, and of what it writes.
+
+Phases of `add_*` calls:
+
+- transfer: copying tensors to the host
+- transform: converting the inputs on the caller thread, e.g. applying the coordinate transform and building the objects
+- submit: copying the inputs for the background writer (`async_write=True`)
+- encode: encoding the objects into file contents, e.g. PLY export and PNG compression
+- write: writing the files, including deduplication, precompression and the manifest
+
+With `async_write=True`, encoding and writing run in the background, and only transfer, transform and submit are spent
+on the caller thread.
+"""
+import time
+import threading
+from contextlib import contextmanager
+
+from termcolor import colored
+
+PHASES = ("transfer", "transform", "submit", "encode", "write")
+
+
+def timed_call(fn, *args):
+    """
+    Run `fn(*args)`, also in worker processes.
+
+    :return: the result of `fn` and the time it took in seconds
+    """
+    tic = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - tic
+
+
+class Stats:
+    """
+    Time per phase, and objects and bytes written per type, of a `Wis3D` instance. See `Wis3D.stats`.
+    """
+
+    def __init__(self, name: str = "", log_interval: float = None):
+        """
+        :param name: name shown in the log lines
+        :param log_interval: if set, print a summary at most every `log_interval` seconds, when objects are added
+        """
+        self.name = name
+        self.log_interval = log_interval
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.times = dict.fromkeys(PHASES, 0.0)
+        self.calls = 0
+        # object type -> [objects, bytes]
+        self.types = {}
+        self.last_log = time.time()
+
+    def add_time(self, phase: str, seconds: float) -> None:
+        with self.lock:
+            self.times[phase] += seconds
+        if getattr(self.local, "depth", 0):
+            self.local.inner += seconds
+
+    @contextmanager
+    def phase(self, phase: str):
+        tic = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(phase, time.perf_counter() - tic)
+
+    @contextmanager
+    def call(self, obj_type: str):
+        """
+        Time an `add_*` call adding an object of type `obj_type`. The time of the call that no other phase accounts for
+        is spent transforming the inputs; calls made by the call are part of it.
+        """
+        depth = getattr(self.local, "depth", 0)
+        if depth == 0:
+            self.local.inner = 0.0
+        self.local.depth = depth + 1
+        tic = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.local.depth = depth
+            if depth == 0:
+                elapsed = time.perf_counter() - tic
+                with self.lock:
+                    self.times["transform"] += max(elapsed - self.local.inner, 0.0)
+                    self.calls += 1
+            with self.lock:
+                self.types.setdefault(obj_type, [0, 0])[0] += 1
+            self.maybe_log()
+
+    def add_bytes(self, obj_type: str, size: int) -> None:
+        with self.lock:
+            self.types.setdefault(obj_type, [0, 0])[1] += size
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            types = {obj_type: dict(objects=objects, bytes=size) for obj_type, (objects, size) in self.types.items()}
+            return dict(
+                calls=self.calls,
+                seconds=dict(self.times),
+                objects=sum(t["objects"] for t in types.values()),
+                bytes=sum(t["bytes"] for t in types.values()),
+                types=types,
+            )
+
+    def reset(self) -> None:
+        with self.lock:
+            self.times = dict.fromkeys(PHASES, 0.0)
+            self.calls = 0
+            self.types = {}
+
+    def summary(self) -> str:
+        stats = self.snapshot()
+        seconds = stats["seconds"]
+        phases = ", ".join(f"{phase} {seconds[phase]:.2f}s" for phase in PHASES)
+        return f"Wis3D {self.name}: {stats['calls']} calls, {stats['objects']} objects, {stats['bytes'] / 2 ** 20:.1f} MB ({phases})"
+
+    def maybe_log(self) -> None:
+        if self.log_interval is None:
+            return
+        now = time.time()
+        with self.lock:
+            if now - self.last_log < self.log_interval:
+                return
+            self.last_log = now
+        print(colored(self.summary(), 'magenta'))
+
+
+class RequestTimings:
+    """
+    Number, duration and response size of the requests of the server, per handler. See `Visualizer.stats`.
+    """
+
+    def __init__(self, handlers):
+        """
+        :param handlers: names of the handlers; requests of other paths, e.g. the static files of the page, are counted as "static"
+        """
+        self.handlers = set(handlers)
+        self.lock = threading.Lock()
+        self.started = time.time()
+        # handler -> [requests, seconds, max seconds, bytes]
+        self.requests = {}
+
+    def start(self) -> None:
+        import cherrypy
+
+        cherrypy.request.wis3d_start = time.perf_counter()
+
+    def end(self) -> None:
+        import cherrypy
+
+        request = cherrypy.request
+        tic = getattr(request, "wis3d_start", None)
+        if tic is None:
+            return
+        elapsed = time.perf_counter() - tic
+        handler = request.path_info.strip("/").split("/", 1)[0]
+        if handler not in self.handlers:
+            handler = "static"
+        # streamed responses without a length are not counted
+        size = cherrypy.response.headers.get("Content-Length")
+        with self.lock:
+            entry = self.requests.setdefault(handler, [0, 0.0, 0.0, 0])
+            entry[0] += 1
+            entry[1] += elapsed
+            entry[2] = max(entry[2], elapsed)
+            entry[3] += int(size) if size is not None else 0
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            requests = {
+                handler: dict(requests=n, seconds=seconds, mean_ms=seconds / n * 1000, max_ms=max_seconds * 1000, bytes=size)
+                for handler, (n, seconds, max_seconds, size) in self.requests.items()
+            }
+        return dict(uptime=time.time() - self.started, requests=requests)
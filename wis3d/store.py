@@ -0,0 +1,146 @@
+# coding=utf-8
+import os
+import shutil
+import hashlib
+import threading
+
+import numpy as np
+
+from wis3d.utils import is_instance, atomic_write
+
+# hidden folder of a sequence holding the content-addressed files
+OBJECTS_FOLDER = ".objects"
+
+
+def _update_digest(h, obj) -> bool:
+    """
+    Feed `obj` into the hash `h`. Returns False if `obj` has no stable content to hash.
+    """
+    if isinstance(obj, np.ndarray):
+        h.update(f"ndarray{obj.dtype.str}{obj.shape}".encode())
+        h.update(np.ascontiguousarray(obj).data)
+    elif is_instance(obj, "PIL.Image", "Image"):
+        h.update(f"image{obj.mode}{obj.size}".encode())
+        h.update(obj.tobytes())
+    elif isinstance(obj, str):
+        if os.path.isfile(obj):
+            # a file is assumed unchanged as long as its size and modification time are
+            st = os.stat(obj)
+            h.update(f"file{obj!r}{st.st_size}{st.st_mtime_ns}".encode())
+        else:
+            h.update(f"str{obj!r}".encode())
+    elif obj is None or isinstance(obj, (bool, int, float)):
+        h.update(repr(obj).encode())
+    elif isinstance(obj, (list, tuple)):
+        h.update(f"seq{len(obj)}".encode())
+        return all(_update_digest(h, v) for v in obj)
+    elif isinstance(obj, dict):
+        h.update(f"dict{len(obj)}".encode())
+        return all(_update_digest(h, k) and _update_digest(h, v) for k, v in obj.items())
+    else:
+        return False
+    return True
+
+
+def link_file(src: str, dst: str) -> None:
+    """
+    Make `dst` refer to `src`: a hardlink, or a relative symlink where hardlinks are not supported, or a copy.
+    """
+    if os.path.lexists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        try:
+            os.symlink(os.path.relpath(src, os.path.dirname(dst)), dst)
+        except OSError:
+            shutil.copyfile(src, dst)
+
+
+class ObjectStore:
+    """
+    Content-addressed store of the files of one sequence, used by `Wis3D` when `dedup=True`.
+
+    Every file is written once to `root` under the SHA-1 of its content, and the object paths link to it.
+    Encoded files are also remembered by a hash of the encoder inputs, so that logging the same arrays again
+    skips encoding as well.
+    """
+
+    def __init__(self, root: str):
+        """
+        :param root: folder of the stored files, e.g. `<out_folder>/<sequence_name>/.objects`
+        """
+        self.root = root
+        self.inputs = {}
+        self.lock = threading.Lock()
+        self.files = 0
+        self.unique_files = 0
+        self.bytes_written = 0
+        self.bytes_saved = 0
+        self.skipped_encodes = 0
+
+    @staticmethod
+    def input_key(encoder, args):
+        """
+        Hash the encoder and its inputs, or return `None` if some input cannot be hashed, e.g. a `trimesh` object.
+        """
+        h = hashlib.sha1(f"{encoder.__module__}.{encoder.__qualname__}".encode())
+        if not _update_digest(h, args):
+            return None
+        return h.hexdigest()
+
+    def link_known(self, key: str, filename: str) -> bool:
+        """
+        Link `filename` to the file encoded earlier from the same inputs, if any.
+
+        :return: whether `filename` was linked
+        """
+        with self.lock:
+            path = self.inputs.get(key)
+        if path is None or not os.path.exists(path) or os.path.splitext(path)[1] != os.path.splitext(filename)[1]:
+            return False
+        link_file(path, filename)
+        with self.lock:
+            self.files += 1
+            self.bytes_saved += os.path.getsize(path)
+            self.skipped_encodes += 1
+        return True
+
+    def put(self, filename: str, data: bytes, key: str = None) -> None:
+        """
+        Store `data` by its hash and link `filename` to it.
+
+        :param filename: path of the object
+        :param data: content of the file
+        :param key: input key of `data`, see `input_key`
+        """
+        path = os.path.join(self.root, hashlib.sha1(data).hexdigest() + os.path.splitext(filename)[1])
+        if os.path.exists(path):
+            written = False
+        else:
+            os.makedirs(self.root, exist_ok=True)
+            atomic_write(path, data)
+            written = True
+        link_file(path, filename)
+        with self.lock:
+            self.files += 1
+            if written:
+                self.unique_files += 1
+                self.bytes_written += len(data)
+            else:
+                self.bytes_saved += len(data)
+            if key is not None:
+                self.inputs[key] = path
+
+    def stats(self) -> dict:
+        """
+        :return: numbers of files and bytes written and saved so far
+        """
+        with self.lock:
+            return dict(
+                files=self.files,
+                unique_files=self.unique_files,
+                bytes_written=self.bytes_written,
+                bytes_saved=self.bytes_saved,
+                skipped_encodes=self.skipped_encodes,
+            )
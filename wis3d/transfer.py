@@ -0,0 +1,144 @@
+# coding=utf-8
+"""
+Batched device-to-host copies of the tensors passed to `Wis3D.add_*`.
+
+Calling `.cpu()` on each CUDA tensor waits for the GPU once per tensor. Instead, all the device tensors of a call,
+or of a whole scene, are copied with `non_blocking=True` into pinned host memory and waited for once.
+
+The device operations are provided by a backend, `TorchBackend` by default. `FakeBackend` treats CPU tensors as
+device tensors and counts copies and synchronizations, so that the batching can be checked on machines without GPU.
+"""
+import numpy as np
+
+from wis3d.utils import is_tensor
+
+
+class TorchBackend:
+    """
+    Device operations of `TransferBatch`, using PyTorch.
+    """
+
+    def is_device_tensor(self, obj) -> bool:
+        # torch is only imported by callers passing tensors
+        return is_tensor(obj) and obj.device.type != "cpu"
+
+    def copy_to_host(self, tensor: "torch.Tensor") -> "torch.Tensor":
+        """
+        Start copying `tensor` to host memory and return the host tensor, which is valid after `synchronize`.
+        """
+        import torch
+
+        pinned = tensor.device.type == "cuda"
+        host = torch.empty(tensor.shape, dtype=tensor.dtype, pin_memory=pinned)
+        host.copy_(tensor.detach(), non_blocking=pinned)
+        return host
+
+    def synchronize(self, devices) -> None:
+        """
+        Wait for the copies started on `devices`.
+        """
+        import torch
+
+        for device in devices:
+            if device.type == "cuda":
+                # only wait for the work queued so far on the current stream, not for the whole device
+                event = torch.cuda.Event()
+                event.record(torch.cuda.current_stream(device))
+                event.synchronize()
+
+
+class FakeBackend(TorchBackend):
+    """
+    Backend treating CPU tensors as device tensors, to exercise batched transfers without GPU.
+    """
+
+    def __init__(self):
+        self.copies = 0
+        self.synchronizations = 0
+
+    def is_device_tensor(self, obj) -> bool:
+        return is_tensor(obj)
+
+    def copy_to_host(self, tensor: "torch.Tensor") -> "torch.Tensor":
+        self.copies += 1
+        return tensor.detach().clone()
+
+    def synchronize(self, devices) -> None:
+        self.synchronizations += 1
+
+
+_backend = TorchBackend()
+
+
+def get_backend():
+    return _backend
+
+
+def set_backend(backend) -> None:
+    """
+    Replace the backend used by transfers, e.g. with a `FakeBackend` in tests.
+    """
+    global _backend
+    _backend = backend
+
+
+class TransferBatch:
+    """
+    Device tensors staged for copy to the host, with a single synchronization for all of them.
+    """
+
+    def __init__(self, copy_inputs: bool = False):
+        """
+        :param copy_inputs: whether to also copy host arrays and tensors, so that the staged objects stay unchanged
+            when the caller modifies its inputs before `wait`
+        """
+        self.backend = get_backend()
+        self.copy_inputs = copy_inputs
+        self.devices = set()
+        self.calls = []
+
+    def stage(self, obj):
+        """
+        Start copying the device tensors of `obj`, which may be nested in lists, tuples and dicts.
+
+        :return: `obj` with device tensors replaced by host tensors, valid after `wait`
+        """
+        if self.backend.is_device_tensor(obj):
+            self.devices.add(obj.device)
+            return self.backend.copy_to_host(obj)
+        if isinstance(obj, (list, tuple)):
+            staged = [self.stage(v) for v in obj]
+            if all(a is b for a, b in zip(staged, obj)):
+                return obj
+            return type(obj)(staged) if isinstance(obj, list) else tuple(staged)
+        if isinstance(obj, dict):
+            staged = {k: self.stage(v) for k, v in obj.items()}
+            if all(staged[k] is v for k, v in obj.items()):
+                return obj
+            return staged
+        if self.copy_inputs:
+            if isinstance(obj, np.ndarray):
+                return obj.copy()
+            if is_tensor(obj):
+                return obj.detach().clone()
+        return obj
+
+    def wait(self) -> None:
+        """
+        Wait until all staged copies are done.
+        """
+        if self.devices:
+            self.backend.synchronize(self.devices)
+            self.devices = set()
+
+
+def to_host(obj):
+    """
+    Copy all device tensors of `obj` to the host with a single synchronization.
+
+    :return: `obj` with device tensors replaced by host tensors
+    """
+    batch = TransferBatch()
+    obj = batch.stage(obj)
+    batch.wait()
+    return obj
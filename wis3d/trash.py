@@ -0,0 +1,87 @@
+# coding=utf-8
+"""
+Removal of output folders without blocking the program.
+
+A folder is renamed into the hidden trash folder next to it, which is instant on the same file system, then deleted by a
+detached process, which also removes what earlier runs left in the trash::
+
+    <out_folder>/.trash/<sequence>.<pid>.<time>/
+
+This file only imports the standard library, since the deleter runs it as a script.
+"""
+import os
+import sys
+import time
+import shutil
+import subprocess
+
+TRASH_FOLDER = ".trash"
+
+
+def remove(*paths: str) -> None:
+    """
+    Remove the folders or files `paths` in the background. Falls back to removing them in place if they cannot be moved
+    to the trash.
+    """
+    trash_folders = set()
+    for path in paths:
+        path = os.path.abspath(path)
+        trash_folder = os.path.join(os.path.dirname(path), TRASH_FOLDER)
+        target = os.path.join(trash_folder, f"{os.path.basename(path)}.{os.getpid()}.{time.time_ns()}")
+        try:
+            os.makedirs(trash_folder, exist_ok=True)
+            os.rename(path, target)
+        except OSError:
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+            continue
+        trash_folders.add(trash_folder)
+    for trash_folder in trash_folders:
+        empty_in_background(trash_folder)
+
+
+def empty_in_background(trash_folder: str) -> None:
+    """
+    Start a detached process that deletes the content of `trash_folder`. It keeps running after the program exits.
+    """
+    kwargs = {}
+    if sys.platform == "win32":
+        kwargs["creationflags"] = subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP
+    else:
+        kwargs["start_new_session"] = True
+    try:
+        subprocess.Popen([sys.executable, os.path.abspath(__file__), trash_folder], stdin=subprocess.DEVNULL,
+                         stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, close_fds=True, **kwargs)
+    except OSError:
+        # e.g. no interpreter to run; the next removal retries
+        pass
+
+
+def empty(trash_folder: str) -> None:
+    """
+    Delete the content of `trash_folder`, then the folder itself if nothing was added meanwhile.
+    """
+    try:
+        names = os.listdir(trash_folder)
+    except OSError:
+        return
+    for name in names:
+        # several deleters may empty the same trash
+        path = os.path.join(trash_folder, name)
+        if os.path.isdir(path) and not os.path.islink(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+    try:
+        os.rmdir(trash_folder)
+    except OSError:
+        pass
+
+
+if __name__ == "__main__":
+    empty(sys.argv[1])
@@ -1,7 +1,39 @@
-import torch
+import os
+import sys
+import threading
+
 import numpy as np
 
 
+def is_instance(obj, module: str, name: str) -> bool:
+    """
+    Whether `obj` is an instance of the class `name` of the module `module`, without importing the module:
+    its objects can only exist once it is imported.
+    """
+    module = sys.modules.get(module)
+    return module is not None and isinstance(obj, getattr(module, name))
+
+
+def is_tensor(obj) -> bool:
+    return is_instance(obj, "torch", "Tensor")
+
+
+def atomic_write(path: str, data: bytes) -> None:
+    """
+    Write `data` to `path` through a temporary file that replaces it at once, so that readers never see a partial
+    file and concurrent writers of the same path do not interleave.
+    """
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
 def random_choice(x, size, dim=None, replace=True):
     if dim is None:
         assert len(x.shape) == 1
@@ -13,7 +45,9 @@ def random_choice(x, size, dim=None, replace=True):
         idxs = np.random.choice(n, size, replace)
         if isinstance(x, np.ndarray):
             swap_function = np.swapaxes
-        elif isinstance(x, torch.Tensor):
+        elif is_tensor(x):
+            import torch
+
             swap_function = torch.transpose
         else:
             raise TypeError()
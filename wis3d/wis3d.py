@@ -2,57 +2,128 @@
 """
 Some tips for this file:
 class method definition must be in a single line for correct doc generation.
+torch, trimesh, scipy and PIL are imported when first needed, so that importing Wis3D stays fast.
 """
+from __future__ import annotations
+
 import os
+import atexit
 import os.path as osp
 import json
 import base64
-import shutil
+import hashlib
+import weakref
 import warnings
+from functools import partial, wraps
 
-import trimesh
 import numpy as np
-from PIL import Image
 from io import BytesIO
-from typing import overload, Iterable, Dict, Union, Any
-from scipy.spatial.transform import Rotation
-from shutil import copyfile
-import torch
-from transforms3d import affines, euler
+from typing import overload, Iterable, Dict, Union, Any, TYPE_CHECKING
 from termcolor import colored
 
-from wis3d.utils import random_choice
+from wis3d.utils import random_choice, is_tensor, is_instance, atomic_write
+from wis3d.writer import AsyncWriter
+from wis3d.store import ObjectStore, OBJECTS_FOLDER
+from wis3d import formats
+from wis3d import lod as lod_module
+from wis3d import content_encoding
+from wis3d import trash
+from wis3d.transfer import TransferBatch, to_host
+from wis3d.policy import LoggingPolicy
+from wis3d.archive import ArchiveWriter
+from wis3d.manifest import ManifestWriter
+from wis3d.retention import RetentionManager
+from wis3d.stats import Stats, timed_call
+from wis3d.distributed import get_rank_and_world_size, shard_name, file_prefix, stale_entries
+
+if TYPE_CHECKING:
+    import torch
+    import trimesh
+    from PIL import Image
 
 file_exts = dict(
     point_cloud="ply",
+    binPointCloud="w3dp",
+    octreePointCloud="w3do",
+    quantizedPointCloud="w3dq",
     mesh="ply",
+    quantizedMesh="w3dq",
     boxes="json",
     image="png",
+    jpgImage="jpg",
+    webpImage="webp",
     lines="json",
+    binLines="w3db",
     binVoxel="binvox",
     voxVoxel="vox",
     boxVoxel="json",
+    binBoxVoxel="w3db",
     spheres="json",
+    binSpheres="w3db",
     camera_trajectory="json",
+    binCameraTrajectory="w3db",
     correspondences="json",
     planes="json",
 )
 
+# hidden folder of a sequence holding files referenced by objects, e.g. correspondence images
+assets_folder = ".assets"
+# hidden folder of a sequence holding the content-addressed files when `dedup=True`
+objects_folder = OBJECTS_FOLDER
+# image files that are referenced as they are, other images are converted to PNG
+web_image_exts = (".png", ".jpg", ".jpeg", ".webp", ".gif")
+
 folder_names = dict(
     point_cloud="point_clouds",
+    binPointCloud="point_clouds",
+    octreePointCloud="point_clouds",
+    quantizedPointCloud="point_clouds",
     mesh="meshes",
+    quantizedMesh="meshes",
     boxes="boxes",
     image="images",
+    jpgImage="images",
+    webpImage="images",
     lines="lines",
+    binLines="lines",
     binVoxel="voxels",
     voxVoxel="voxels",
     boxVoxel="voxels",
+    binBoxVoxel="voxels",
     spheres="spheres",
+    binSpheres="spheres",
     camera_trajectory="camera_trajectories",
+    binCameraTrajectory="camera_trajectories",
     correspondences="correspondences",
     planes="planes",
 )
 
+# file types written instead when `format="bin"` is passed to the add_* methods of primitive collections
+bin_file_types = dict(
+    lines="binLines",
+    boxVoxel="binBoxVoxel",
+    spheres="binSpheres",
+    camera_trajectory="binCameraTrajectory",
+)
+
+# file types of `add_image` by image format
+image_file_types = dict(
+    png="image",
+    jpeg="jpgImage",
+    jpg="jpgImage",
+    webp="webpImage",
+)
+
+# instances with `transfer="scene"`, whose calls queued for the last scene are run at exit without keeping them alive
+_scene_transfers = weakref.WeakSet()
+
+
+@atexit.register
+def _run_queued_calls() -> None:
+    # registered after the hook of `wis3d.writer`, so it runs first and the queued calls can still be written
+    for vis3d in list(_scene_transfers):
+        vis3d.close()
+
 
 def img2url(image: Image.Image):
     buffered = BytesIO()
@@ -64,19 +135,391 @@ def img2url(image: Image.Image):
 
 
 def tensor2ndarray(tensor: Union[np.ndarray, torch.Tensor]) -> np.ndarray:
-    if isinstance(tensor, torch.Tensor):
+    if is_tensor(tensor):
         if tensor.device.type != "cpu":
             tensor = tensor.detach().cpu()
         tensor = tensor.numpy()
     return tensor
 
 
+def _add_method(obj_type: str):
+    """
+    Decorate an `add_*` method writing objects of type `obj_type`: the call is checked against the logging policy,
+    then the device tensors passed to it are copied to the host together, or the call is queued until the end of
+    the scene when `transfer="scene"`.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if not self.enable:
+                return
+            if self.policy is not None and not self.policy.admit(self.seq_folder, self.scene_id, obj_type):
+                return
+            if self.transfer_batch is not None:
+                batch = self.transfer_batch
+                with self.stats_recorder.phase("transfer"):
+                    args, kwargs = batch.stage((args, kwargs))
+                batch.calls.append((obj_type, method, args, kwargs))
+                return
+            with self.stats_recorder.call(obj_type):
+                with self.stats_recorder.phase("transfer"):
+                    args, kwargs = to_host((args, kwargs))
+                return method(self, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def _write_file(filename: str, data: bytes) -> None:
+    with open(filename, "wb") as f:
+        f.write(data)
+
+
+def _write_timed(write, stats, obj_type: str, result) -> None:
+    data, seconds = result
+    stats.add_time("encode", seconds)
+    with stats.phase("write"):
+        write(data)
+    stats.add_bytes(obj_type, len(data))
+
+
+def _write_nothing(data: bytes) -> None:
+    pass
+
+
+def _write_counted(write, policy, data: bytes) -> None:
+    write(data)
+    policy.record_bytes(len(data))
+
+
+def _write_recorded(write, manifest, filename: str, data: bytes) -> None:
+    write(data)
+    manifest.append(filename, len(data))
+
+
+def _write_precompressed(write, filename: str, data: bytes) -> None:
+    write(data)
+    content_encoding.write_encoded(filename, data)
+
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _encode_json(obj) -> bytes:
+    return json.dumps(obj).encode()
+
+
+def _encode_geometry(geometry, transform: np.ndarray) -> bytes:
+    import trimesh
+
+    if isinstance(geometry, str):
+        geometry = trimesh.load_mesh(geometry)
+    geometry.apply_transform(transform)
+    return geometry.export(file_type="ply")
+
+
+def _encode_point_cloud(vertices, colors, transform: np.ndarray) -> bytes:
+    if isinstance(vertices, np.ndarray):
+        # written straight from the arrays, trimesh objects validate and cache more than the export needs
+        return formats.encode_ply(vertices, None, colors, transform)
+    return _encode_geometry(vertices, transform)
+
+
+def _encode_geometry_quantized(geometry, transform: np.ndarray, compression: str) -> bytes:
+    import trimesh
+
+    if isinstance(geometry, str):
+        geometry = trimesh.load_mesh(geometry)
+    geometry.apply_transform(transform)
+    if isinstance(geometry, trimesh.PointCloud):
+        faces = None
+        colors = geometry.colors if len(geometry.colors) == len(geometry.vertices) else None
+    else:
+        faces = geometry.faces
+        colors = geometry.visual.vertex_colors if geometry.visual.kind == "vertex" else None
+    return formats.encode_quantized(geometry.vertices, faces, colors, compression)
+
+
+def _encode_point_cloud_quantized(vertices, colors, transform: np.ndarray, compression: str) -> bytes:
+    import trimesh
+
+    if isinstance(vertices, np.ndarray):
+        vertices = trimesh.PointCloud(vertices, colors)
+    return _encode_geometry_quantized(vertices, transform, compression)
+
+
+def _encode_mesh_quantized(vertices: np.ndarray, faces: np.ndarray, vertex_colors: np.ndarray, transform: np.ndarray, compression: str) -> bytes:
+    import trimesh
+
+    return _encode_geometry_quantized(trimesh.Trimesh(vertices, faces, vertex_colors=vertex_colors), transform, compression)
+
+
+def _point_cloud_arrays(vertices, colors):
+    if isinstance(vertices, str):
+        import trimesh
+
+        vertices = trimesh.load_mesh(vertices)
+    if is_instance(vertices, "trimesh", "PointCloud"):
+        colors = vertices.colors if len(vertices.colors) == len(vertices.vertices) else None
+    if not isinstance(vertices, np.ndarray):
+        vertices = vertices.vertices
+    return np.asarray(vertices).reshape(-1, 3), colors
+
+
+def _encode_point_cloud_bin(vertices, colors, transform: np.ndarray) -> bytearray:
+    vertices, colors = _point_cloud_arrays(vertices, colors)
+    return formats.encode_point_cloud(vertices, colors, transform)
+
+
+def _encode_point_cloud_octree(filename: str, vertices, colors, transform: np.ndarray) -> bytes:
+    vertices, colors = _point_cloud_arrays(vertices, colors)
+    positions = formats.remap_axes(np.empty((len(vertices), 3), np.float32), vertices, transform)
+    return lod_module.write_point_octree(filename, positions, colors)
+
+
+def _encode_mesh_levels(filename: str, levels, encoder, *args) -> bytes:
+    data = encoder(*args)
+    lod_module.write_mesh_levels(filename, levels, data)
+    return data
+
+
+def _encode_mesh(vertices: np.ndarray, faces: np.ndarray, vertex_colors: np.ndarray, transform: np.ndarray) -> bytes:
+    return formats.encode_ply(vertices, faces, vertex_colors, transform)
+
+
+def _open_image(image) -> Image.Image:
+    from PIL import Image
+
+    if isinstance(image, str):
+        return Image.open(image)
+    if isinstance(image, np.ndarray):
+        return Image.fromarray(image)
+    return image
+
+
+def _encode_image(image, format: str = "png", quality: int = None, compress_level: int = None, max_size: int = None) -> bytes:
+    from PIL import Image
+
+    image = _open_image(image)
+    if max_size is not None and max(image.size) > max_size:
+        scale = max_size / max(image.size)
+        image = image.resize((max(round(image.width * scale), 1), max(round(image.height * scale), 1)), Image.BILINEAR)
+    options = {}
+    if format == "png":
+        if compress_level is not None:
+            options["compress_level"] = compress_level
+    else:
+        if quality is not None:
+            options["quality"] = quality
+        if format in ("jpeg", "jpg") and image.mode not in ("RGB", "L"):
+            # JPEG has no alpha channel
+            image = image.convert("RGB")
+    buffered = BytesIO()
+    image.save(buffered, format="JPEG" if format == "jpg" else format.upper(), **options)
+    return buffered.getvalue()
+
+
+def _parse_axes(axes: str):
+    """
+    Parse a `transforms3d` axes string such as "sxyz" or "rxyz" into (firstaxis, parity, repetition, frame).
+    """
+    frame = int(axes[0] == "r")
+    seq = axes[1:] if not frame else axes[:0:-1]
+    i, j, k = ("xyz".index(a) for a in seq)
+    return i, int(j != (i + 1) % 3), int(k == i), frame
+
+
+def _euler2mat(eulers: np.ndarray, axes: str) -> np.ndarray:
+    """
+    Batched `transforms3d.euler.euler2mat`.
+
+    :param eulers: angles of shape `(n, 3)`
+    :param axes: `transforms3d` axes string, e.g. "rxyz"
+    :return: rotation matrices of shape `(n, 3, 3)`
+    """
+    from scipy.spatial.transform import Rotation
+
+    # static axes are extrinsic (lower case) and rotating axes are intrinsic (upper case) in scipy
+    seq = axes[1:].upper() if axes[0] == "r" else axes[1:]
+    return Rotation.from_euler(seq, eulers).as_matrix().reshape(-1, 3, 3)
+
+
+def _mat2euler(mats: np.ndarray, axes: str) -> np.ndarray:
+    """
+    Batched `transforms3d.euler.mat2euler`, returning the same angles including at gimbal lock, except for the signs
+    of zero and pi, which depend on rounding: angles of -0 and -pi are returned as 0 and pi, so that the output is stable.
+
+    :param mats: rotation matrices of shape `(n, 3, 3)`, float32 input is kept in float32
+    :param axes: `transforms3d` axes string, e.g. "rxyz"
+    :return: angles of shape `(n, 3)`
+    """
+    firstaxis, parity, repetition, frame = _parse_axes(axes)
+    next_axis = [1, 2, 0, 1]
+    i = firstaxis
+    j = next_axis[i + parity]
+    k = next_axis[i - parity + 1]
+    M = np.asarray(mats)
+    if M.dtype != np.float32:
+        M = M.astype(np.float64)
+    eps = np.finfo(M.dtype).eps * 4.0
+
+    if repetition:
+        sy = np.sqrt(M[:, i, j] * M[:, i, j] + M[:, i, k] * M[:, i, k])
+        regular = sy > eps
+        ax = np.where(regular, np.arctan2(M[:, i, j], M[:, i, k]), np.arctan2(-M[:, j, k], M[:, j, j]))
+        ay = np.arctan2(sy, M[:, i, i])
+        az = np.where(regular, np.arctan2(M[:, j, i], -M[:, k, i]), 0.0)
+    else:
+        cy = np.sqrt(M[:, i, i] * M[:, i, i] + M[:, j, i] * M[:, j, i])
+        regular = cy > eps
+        ax = np.where(regular, np.arctan2(M[:, k, j], M[:, k, k]), np.arctan2(-M[:, j, k], M[:, j, j]))
+        ay = np.arctan2(-M[:, k, i], cy)
+        az = np.where(regular, np.arctan2(M[:, j, i], M[:, i, i]), 0.0)
+
+    if parity:
+        ax, ay, az = -ax, -ay, -az
+    if frame:
+        ax, az = az, ax
+    angles = np.stack((ax, ay, az), axis=1) + 0.0
+    angles[angles == -np.array(np.pi, angles.dtype)] = np.pi
+    return angles
+
+
+def _encode_boxes(positions, eulers, extents, axes, labels, transform) -> bytes:
+    # same result as composing each box with transforms3d, remapping it with `transform` and decomposing it again
+    R = transform[:3, :3]
+    positions = positions @ R.T + transform[:3, 3]
+    rot_mats = R @ _euler2mat(eulers, axes) if len(eulers) else np.zeros((0, 3, 3))
+    rot_mats = rot_mats * np.where(extents < 0, -1.0, 1.0)[:, None, :]
+    extents = np.abs(extents)
+    flipped = np.linalg.det(rot_mats) < 0
+    extents[flipped, 0] *= -1
+    rot_mats[flipped, :, 0] *= -1
+    eulers = _mat2euler(rot_mats, axes)
+
+    boxes = [
+        dict(position=T, euler=E, extent=Z)
+        for T, E, Z in zip(positions.tolist(), eulers.tolist(), extents.tolist())
+    ]
+    if labels is not None:
+        for box, label in zip(boxes, labels):
+            box.update({"label": label})
+    return _encode_json(boxes)
+
+
+# lines, voxels and spheres are stored column-wise, one array per attribute;
+# the viewer also reads the row-wise files written by older versions
+def _encode_lines(start_points, end_points, colors) -> bytes:
+    data = dict(start_points=start_points.tolist(), end_points=end_points.tolist())
+    if colors is not None:
+        data["colors"] = colors.tolist()
+    return _encode_json(data)
+
+
+def _encode_voxels(voxel_centers, voxel_size, colors) -> bytes:
+    data = dict(voxel_size=voxel_size, voxel_centers=voxel_centers.tolist())
+    if colors is not None:
+        data["colors"] = colors.tolist()
+    return _encode_json(data)
+
+
+def _encode_spheres(centers, radius, scales, quaternions, colors) -> bytes:
+    data = dict(centers=centers.tolist())
+    if isinstance(radius, float):
+        data["radius"] = radius
+    else:
+        data["radii"] = radius.reshape(-1).tolist()
+    data["scales"] = scales.tolist()
+    data["quaternions"] = quaternions.tolist()
+    if colors is not None:
+        data["colors"] = colors.tolist()
+    return _encode_json(data)
+
+
+# the binary variants store the same columns as float32/uint8 arrays in a `formats.encode_arrays` container
+def _encode_lines_bin(start_points, end_points, colors) -> bytes:
+    arrays = dict(start_points=(start_points, "float32"), end_points=(end_points, "float32"))
+    if colors is not None:
+        arrays["colors"] = (colors, "uint8")
+    return formats.encode_arrays(arrays)
+
+
+def _encode_voxels_bin(voxel_centers, voxel_size, colors) -> bytes:
+    arrays = dict(voxel_centers=(voxel_centers, "float32"))
+    if colors is not None:
+        arrays["colors"] = (colors, "uint8")
+    return formats.encode_arrays(arrays, dict(voxel_size=voxel_size))
+
+
+def _encode_spheres_bin(centers, radius, scales, quaternions, colors) -> bytes:
+    meta = {}
+    arrays = dict(centers=(centers, "float32"))
+    if isinstance(radius, float):
+        meta["radius"] = radius
+    else:
+        arrays["radii"] = (radius.reshape(-1), "float32")
+    arrays["scales"] = (scales, "float32")
+    arrays["quaternions"] = (quaternions, "float32")
+    if colors is not None:
+        arrays["colors"] = (colors, "uint8")
+    return formats.encode_arrays(arrays, meta)
+
+
+def _encode_camera_trajectory(poses) -> bytes:
+    positions = poses[:, :3, 3].reshape((-1, 3))
+    return _encode_json(dict(eulers=_mat2euler(poses[:, :3, :3], "rxyz").tolist(), positions=positions.tolist()))
+
+
+def _encode_camera_trajectory_bin(poses) -> bytes:
+    positions = poses[:, :3, 3].reshape((-1, 3))
+    return formats.encode_arrays(dict(eulers=(_mat2euler(poses[:, :3, :3], "rxyz"), "float32"), positions=(positions, "float32")))
+
+
+def _write_asset(image, assets_dir: str) -> str:
+    """
+    Write an image once under `assets_dir`, named by the hash of its content, and return its path.
+    """
+    if isinstance(image, str) and osp.splitext(image)[1].lower() in web_image_exts:
+        data = _read_file(image)
+        digest = hashlib.sha1(data).hexdigest()
+        ext = osp.splitext(image)[1].lower()
+    else:
+        image = _open_image(image)
+        h = hashlib.sha1(f"{image.mode}{image.size}".encode())
+        h.update(image.tobytes())
+        digest = h.hexdigest()
+        data = None
+        ext = ".png"
+    path = osp.join(assets_dir, digest + ext)
+    if not osp.exists(path):
+        if data is None:
+            data = _encode_image(image)
+        os.makedirs(assets_dir, exist_ok=True)
+        atomic_write(path, data)
+    return path
+
+
+def _encode_correspondences(image0, image1, arrays, meta, assets_dir, relative_to) -> bytes:
+    # images are referenced by paths relative to the folder of the JSON file
+    data = {}
+    data["img0"] = osp.relpath(_write_asset(image0, assets_dir), relative_to).replace(os.sep, "/")
+    data["img1"] = osp.relpath(_write_asset(image1, assets_dir), relative_to).replace(os.sep, "/")
+    for k, v in arrays.items():
+        data[k] = {k_: v_.tolist() for k_, v_ in v.items()} if isinstance(v, dict) else v.tolist()
+    if meta is not None:
+        data["meta"] = meta
+    return _encode_json(data)
+
+
 class Wis3D:
     has_removed = []
     default_xyz_pattern = ('x', 'y', 'z')
     sequence_ids = {}
 
-    def __init__(self, out_folder: str, sequence_name: str, xyz_pattern=None, auto_increase=True, auto_remove=True, enable: bool = True):
+    def __init__(self, out_folder: str, sequence_name: str, xyz_pattern=None, auto_increase=True, auto_remove=True, enable: bool = True, async_write: bool = False, executor=None, point_cloud_format: str = "ply", primitive_format: str = "json", dedup: bool = False, mesh_lod=False, compression: str = None, precompress: bool = False, image_format: str = "png", image_quality: int = None, image_compress_level: int = None, image_max_size: int = None, transfer: str = "call", policy: LoggingPolicy = None, storage: str = "files", retention: RetentionManager = None, shard: bool = None, ranks: Iterable[int] = None, stats_interval: float = None):
         """
         Initialize Wis3D
 
@@ -101,26 +544,54 @@ class Wis3D:
                   opencv:       x    -y    -z
 
         :param auto_increase: In one program run, whether to increase the scene id automatically for Wis3D instances with the same sequence names.
-        :param auto_remove: On program launch, whether to automatically remove the output folder if it exists.
-        :param enable: Whether to enable Wis3D. Since Wis3D can be time-consuming, this flag is useful for you to keep the Wis3D code unchanged and enable/disable it at debug time/running time.
+        :param auto_remove: On program launch, whether to automatically remove the output folder of the sequence if it exists. The folder is moved to a hidden trash folder of `out_folder` and deleted by a background process, so that this does not wait for large outputs to be deleted.
+        :param enable: Whether to enable Wis3D. Since Wis3D can be time-consuming, this flag is useful for you to keep the Wis3D code unchanged and enable/disable it at debug time/running time. The methods of a disabled instance return after checking this flag, without converting their inputs.
+        :param async_write: Whether to encode and write files on a background thread. Inputs are copied when `add_*` is called, so they can be modified afterwards. Call `flush` to wait for pending writes; they are also drained at program exit.
+        :param executor: Executor used for background writes, implies `async_write=True`. "thread" (default) uses a single background thread; "process" spreads the CPU-heavy encoding (PLY export, PNG compression, base64) over a `ProcessPoolExecutor`, handing large arrays over through shared memory. Any `concurrent.futures.Executor` can be passed as well.
+        :param point_cloud_format: Default file format of `add_point_cloud`. "ply", "bin" for the compact Wis3D binary layout (float32 positions and uint8 colors), which is faster to write and to load in the browser, or "octree" for a level-of-detail octree of binary chunks, which the viewer streams by distance for point clouds too large to load at once.
+        :param primitive_format: Default file format of `add_lines`, `add_rays`, `add_spheres`, `add_voxel` (by boxes) and `add_camera_trajectory`. "json", or "bin" for a container of raw float32/uint8 arrays, which is an order of magnitude smaller and faster to parse for large collections.
+        :param dedup: Whether to store identical files once per sequence. Files are written to a hidden content-addressed folder and linked from their object paths (hardlinks, or symlinks or copies where unsupported). Inputs identical to an earlier call also skip encoding. See `dedup_stats`.
+        :param mesh_lod: Default of `add_mesh(lod=...)`. If True, meshes are also written as a pyramid of decimated levels with 1% and 10% of the faces, or with the given ratios of faces, so that the viewer can show a coarse mesh first and refine it. The server otherwise builds the levels of large meshes on first request. Levels are not written with `storage="archive"`.
+        :param compression: Compression of the PLY output of `add_point_cloud` and `add_mesh`. None writes PLY; "zlib" (fast) or "lzma" (smaller) writes the Wis3D quantized format instead, with positions quantized to 16 bits over the bounding box, delta-coded faces and a compressed payload, typically 3-6 times smaller. The server converts these files back to PLY for the viewer. Mesh levels (`mesh_lod`) are not written for compressed meshes.
+        :param precompress: Whether to also write gzip (and brotli, if installed) copies of JSON, PLY and OBJ files, which the server sends to viewers that accept them, e.g. for remote viewing over slow networks. The server otherwise compresses these files on first request.
+        :param image_format: Default file format of `add_image`, "png", "jpeg" or "webp". JPEG and WebP are lossy, but several times smaller and faster to encode than PNG for photos and renderings.
+        :param image_quality: Default quality of JPEG and WebP images, from 0 to 100. None uses the defaults of Pillow (75 and 80).
+        :param image_compress_level: Default zlib compression level of PNG images, from 0 (no compression, fastest) to 9. None uses the default of Pillow (6).
+        :param image_max_size: Default maximum side length of images in pixels. Larger images are downscaled, keeping their aspect ratio. None keeps the original size.
+        :param transfer: How tensors on a GPU are copied to the host. "call" copies all the tensors of an `add_*` call together with a single synchronization. "scene" queues the `add_*` calls of a scene and copies their tensors with a single synchronization when the scene changes or on `flush`, so that logging does not stall the GPU in between; host inputs are copied when queued. Errors of queued calls are raised by `set_scene_id` or `flush`, once all the calls of the scene have run.
+        :param policy: A `LoggingPolicy` limiting what is written, e.g. every k-th scene, a maximum byte rate, or quotas of files per scene. Calls over budget are skipped before any conversion and counted in `policy.stats()`.
+        :param storage: "files" writes every object to its own file under `<out_folder>/<sequence_name>/<scene>/<type>/`. "archive" appends the objects of the sequence to a single hidden data file with an index instead, which the server reads in place; use it for long runs on file systems that handle many small files poorly. With `dedup=True`, identical objects are stored once in the archive. Objects are not precompressed in archives (`precompress`), and the files some objects reference (octree chunks, correspondence images) are still written next to where the object would be. Meshes in archives are not shown progressively, their levels (`mesh_lod`) are not written.
+        :param retention: A `RetentionManager` evicting old scenes of the output folder when it grows over its limits. It is run when the scene changes, at most once per `interval` of the manager.
+        :param shard: Whether each rank of a distributed run writes to its own shard of the sequence, `<sequence_name>/.rank<rank>/`, which the server merges into one sequence. Object names are prefixed with `rank<rank>-`. The rank and the number of ranks are read from the `RANK` and `WORLD_SIZE` environment variables set by torchrun. None shards when there is more than one rank. With `auto_remove`, each rank removes its own shard, and the lowest rank of `ranks` removes the rest of the previous output of the sequence.
+        :param ranks: The ranks that log; Wis3D is disabled on the other ranks. None logs on all ranks.
+        :param stats_interval: If set, print a summary of `stats` at most every `stats_interval` seconds, when objects are added.
         """
         assert enable in [True, False]
+        rank, world_size = get_rank_and_world_size()
+        ranks = list(ranks) if ranks is not None else None
+        if ranks is not None and rank not in ranks:
+            enable = False
         self.enable = enable
         if enable is True:
             assert out_folder != "", "out_folder cannot be empty"
             assert sequence_name != "", "sequence_name cannot be empty"
             self.scene_id = 0
-            if not os.path.isabs(out_folder):
-                seq_out_folder = os.path.join(
-                    os.getcwd(), out_folder, sequence_name)
-            else:
-                seq_out_folder = out_folder
-            if auto_remove:
-                if not osp.exists(seq_out_folder):
-                    Wis3D.has_removed.append(seq_out_folder)
-                elif os.path.exists(seq_out_folder) and seq_out_folder not in Wis3D.has_removed:
-                    shutil.rmtree(seq_out_folder)
-                    Wis3D.has_removed.append(seq_out_folder)
+            if shard is None:
+                shard = world_size > 1
+            self.rank = rank
+            self.shard = shard
+            # ranks write to their own shards, so that no two processes write to the same files
+            self.seq_folder = os.path.join(out_folder, sequence_name, shard_name(rank)) if shard else os.path.join(out_folder, sequence_name)
+            self.file_prefix = file_prefix(rank) if shard else ""
+            seq_out_folder = os.path.abspath(self.seq_folder)
+            if auto_remove and seq_out_folder not in Wis3D.has_removed:
+                # the lowest rank that logs removes what is not a shard of this run
+                if shard and rank == min(ranks if ranks is not None else [0]):
+                    trash.remove(*stale_entries(osp.dirname(seq_out_folder), world_size))
+                if osp.exists(seq_out_folder):
+                    # moved out of the way at once and deleted by a background process
+                    trash.remove(seq_out_folder)
+                Wis3D.has_removed.append(seq_out_folder)
             self.out_folder = out_folder
             self.sequence_name = sequence_name
             if xyz_pattern is None:
@@ -130,6 +601,33 @@ class Wis3D:
             self.counters = {}
             for key in folder_names:
                 self.counters[key] = 0
+            self.writer = AsyncWriter(executor) if async_write or executor is not None else None
+            assert point_cloud_format in ("ply", "bin", "octree"), f"unknown point cloud format: {point_cloud_format}"
+            self.point_cloud_format = point_cloud_format
+            assert primitive_format in ("json", "bin"), f"unknown primitive format: {primitive_format}"
+            self.primitive_format = primitive_format
+            self.mesh_lod = mesh_lod
+            assert compression in (None, "zlib", "lzma"), f"unknown compression: {compression}"
+            self.compression = compression
+            self.precompress = precompress
+            assert image_format in image_file_types, f"unknown image format: {image_format}"
+            self.image_format = image_format
+            self.image_quality = image_quality
+            self.image_compress_level = image_compress_level
+            self.image_max_size = image_max_size
+            assert transfer in ("call", "scene"), f"unknown transfer: {transfer}"
+            self.transfer = transfer
+            self.transfer_batch = None
+            self.policy = policy
+            self.retention = retention
+            self.stats_recorder = Stats(sequence_name, stats_interval)
+            if transfer == "scene":
+                _scene_transfers.add(self)
+            assert storage in ("files", "archive"), f"unknown storage: {storage}"
+            self.archive = ArchiveWriter.open(self.seq_folder, dedup) if storage == "archive" else None
+            self.store = ObjectStore(os.path.join(self.seq_folder, objects_folder)) if dedup and self.archive is None else None
+            # archives index their objects themselves
+            self.manifest = ManifestWriter.open(self.seq_folder) if self.archive is None else None
 
             if seq_out_folder not in Wis3D.sequence_ids:
                 Wis3D.sequence_ids[seq_out_folder] = 0
@@ -159,20 +657,143 @@ class Wis3D:
 
     def __get_export_file_name(self, file_type: str, name: str = None) -> str:
         export_dir = os.path.join(
-            self.out_folder,
-            self.sequence_name,
+            self.seq_folder,
             "%05d" % self.scene_id,
             folder_names[file_type],
         )
-        os.makedirs(export_dir, exist_ok=True)
+        if self.archive is None:
+            os.makedirs(export_dir, exist_ok=True)
         if name is None:
             name = "%05d" % self.counters[file_type]
+        name = self.file_prefix + name
 
         filename = os.path.join(export_dir, name + "." + file_exts[file_type])
         self.counters[file_type] += 1
 
         return filename
 
+    def __get_primitive_file_type(self, file_type: str, format: str = None) -> str:
+        if format is None:
+            format = self.primitive_format
+        if format == "json":
+            return file_type
+        elif format == "bin":
+            return bin_file_types[file_type]
+        raise NotImplementedError()
+
+    def __export(self, filename: str, encoder, *args) -> None:
+        if self.archive is not None:
+            write = partial(self.archive.append, filename)
+        elif self.store is None:
+            write = partial(_write_file, filename)
+        else:
+            key = ObjectStore.input_key(encoder, args)
+            if key is not None and self.store.link_known(key, filename):
+                # linked to the file of the same inputs: its content only goes through the wrappers below, which
+                # record, count and precompress it like a written object
+                write, encoder, args = _write_nothing, _read_file, (filename,)
+            else:
+                write = partial(self.store.put, filename, key=key)
+        if self.precompress and self.archive is None and content_encoding.is_compressible(filename):
+            write = partial(_write_precompressed, write, filename)
+        if self.manifest is not None:
+            write = partial(_write_recorded, write, self.manifest, filename)
+        if self.policy is not None:
+            write = partial(_write_counted, write, self.policy)
+        # encoders are timed where they run, which may be a worker process
+        write = partial(_write_timed, write, self.stats_recorder, os.path.basename(os.path.dirname(filename)))
+        if self.writer is None:
+            write(timed_call(encoder, *args))
+        else:
+            with self.stats_recorder.phase("submit"):
+                self.writer.submit(timed_call, encoder, *args, callback=write)
+
+    def __run_queued_calls(self) -> None:
+        """
+        Copy the tensors of the `add_*` calls queued when `transfer="scene"` and run the calls, then start a new queue.
+        A failing call does not prevent the others from running; the errors are raised once all calls have run.
+        """
+        batch = self.transfer_batch
+        # the queued calls, and the add_* calls they make, run directly
+        self.transfer_batch = None
+        errors = []
+        try:
+            if batch is not None:
+                with self.stats_recorder.phase("transfer"):
+                    batch.wait()
+                for obj_type, method, args, kwargs in batch.calls:
+                    try:
+                        with self.stats_recorder.call(obj_type):
+                            method(self, *args, **kwargs)
+                    except Exception as e:
+                        errors.append((method.__name__, e))
+        finally:
+            self.transfer_batch = TransferBatch(copy_inputs=True)
+        if len(errors) == 1:
+            raise errors[0][1]
+        if errors:
+            messages = "; ".join(f"{name}: {e!r}" for name, e in errors)
+            raise RuntimeError(f"{len(errors)} queued Wis3D calls failed: {messages}") from errors[0][1]
+
+    def flush(self) -> None:
+        """
+        Wait until all pending writes are finished. Only useful when `async_write=True`.
+        """
+        if not self.enable:
+            return
+        if self.transfer == "scene":
+            self.__run_queued_calls()
+        if self.writer is not None:
+            self.writer.flush()
+
+    def close(self) -> None:
+        """
+        Finish pending writes and release the background writer.
+        """
+        if not self.enable:
+            return
+        if self.transfer == "scene":
+            _scene_transfers.discard(self)
+            self.__run_queued_calls()
+        if self.writer is not None:
+            self.writer.close()
+
+    def __del__(self):
+        # calls queued for the current scene are run when the instance is dropped without `close`
+        if getattr(self, "transfer_batch", None) is not None and self.transfer_batch.calls:
+            self.close()
+
+    def stats(self, reset: bool = False) -> dict:
+        """
+        Time spent by the `add_*` calls and what they wrote, to tell how much of a step Wis3D takes.
+        Pending background writes are waited for first.
+
+        :param reset: whether to start counting again after this call
+        :return: dict of the number of `calls`, the `seconds` spent per phase ("transfer" of tensors to the host,
+            "transform" of the inputs, "submit" to the background writer, "encode" and "write"), and the `objects` and
+            `bytes` written in total and per object type in `types`. With `async_write=True`, encode and write run in
+            the background.
+        """
+        if not self.enable:
+            return {}
+        self.flush()
+        stats = self.stats_recorder.snapshot()
+        if reset:
+            self.stats_recorder.reset()
+        return stats
+
+    def dedup_stats(self) -> dict:
+        """
+        Statistics of the deduplicated store, only available when `dedup=True`.
+
+        :return: dict of `files` written through the store, `unique_files` and `bytes_written` actually stored,
+            `bytes_saved` by linking duplicates and `skipped_encodes` of repeated inputs
+        """
+        if not self.enable or self.store is None:
+            return {}
+        self.flush()
+        return self.store.stats()
+
     def set_scene_id(self, scene_id: int) -> None:
         """
         Set scene ID.
@@ -183,10 +804,20 @@ class Wis3D:
         """
         if not self.enable:
             return
-        self.scene_id = scene_id
+        try:
+            if self.transfer == "scene":
+                self.__run_queued_calls()
+        finally:
+            # the scene changes also if queued calls failed
+            self.scene_id = scene_id
+        if self.retention is not None and self.retention.due():
+            # scenes being written in the background must not be evicted under the writer
+            self.flush()
+            # the new scene counts against the limits before it is written
+            self.retention.collect(incoming=[os.path.join(self.seq_folder, "%05d" % scene_id)])
 
     @overload
-    def add_point_cloud(self, path: str, *, name: str = None) -> None:
+    def add_point_cloud(self, path: str, *, name: str = None, format: str = None) -> None:
         """
         Add a point cloud by file path.
         Support importing point clouds from STL, OBJ, PLY, etc.
@@ -195,12 +826,14 @@ class Wis3D:
 
         :param name: output name of the point cloud
 
+        :param format: output file format, "ply", "bin" or "octree", defaults to `point_cloud_format` of the instance
+
         """
 
         pass
 
     @overload
-    def add_point_cloud(self, vertices: Union[np.ndarray, torch.Tensor], colors: Union[np.ndarray, torch.Tensor] = None, *, name: str = None) -> None:
+    def add_point_cloud(self, vertices: Union[np.ndarray, torch.Tensor], colors: Union[np.ndarray, torch.Tensor] = None, *, name: str = None, format: str = None) -> None:
         """
         Add a point cloud by point cloud definition.
 
@@ -209,21 +842,26 @@ class Wis3D:
         :param colors: colors of the points, shape: `(n, 3)`, range [0, 255] dtype: `np.uint8` or `torch.byte`
 
         :param name: output name of the point cloud
+
+        :param format: output file format, "ply", "bin" or "octree", defaults to `point_cloud_format` of the instance
         """
         pass
 
     @overload
-    def add_point_cloud(self, pcd: trimesh.PointCloud, name: str = None) -> None:
+    def add_point_cloud(self, pcd: trimesh.PointCloud, name: str = None, format: str = None) -> None:
         """
         Add a point cloud loaded by `trimesh`.
 
         :param pcd: point cloud loaded by `trimesh`
 
         :param name: output name of the point cloud
+
+        :param format: output file format, "ply", "bin" or "octree", defaults to `point_cloud_format` of the instance
         """
         pass
 
-    def add_point_cloud(self, vertices, colors=None, *, name=None) -> None:
+    @_add_method("point_clouds")
+    def add_point_cloud(self, vertices, colors=None, *, name=None, format=None) -> None:
         """
         Add a point cloud.
 
@@ -233,27 +871,39 @@ class Wis3D:
 
         :param name:
 
+        :param format:
+
         :return:
 
         """
         if not self.enable:
             return
-        if isinstance(vertices, str):
-            pcd = trimesh.load_mesh(vertices)
-        elif isinstance(vertices, trimesh.PointCloud):
-            pcd = vertices
-        elif isinstance(vertices, (np.ndarray, torch.Tensor)):
+        if format is None:
+            format = self.point_cloud_format
+        if format not in ("ply", "bin", "octree"):
+            raise NotImplementedError()
+        if is_instance(vertices, "trimesh", "PointCloud"):
+            vertices, colors = _point_cloud_arrays(vertices, colors)
+        elif isinstance(vertices, np.ndarray) or is_tensor(vertices):
             vertices = tensor2ndarray(vertices)
             colors = tensor2ndarray(colors)
-            pcd = trimesh.PointCloud(vertices, colors)
-        else:
+        elif not isinstance(vertices, str):
             raise NotImplementedError()
-        pcd.apply_transform(self.three_to_world)
-        filename = self.__get_export_file_name("point_cloud", name)
-        pcd.export(filename)
+        if format == "bin":
+            filename = self.__get_export_file_name("binPointCloud", name)
+            self.__export(filename, _encode_point_cloud_bin, vertices, colors, self.three_to_world)
+        elif format == "octree":
+            filename = self.__get_export_file_name("octreePointCloud", name)
+            self.__export(filename, _encode_point_cloud_octree, filename, vertices, colors, self.three_to_world)
+        elif self.compression is not None:
+            filename = self.__get_export_file_name("quantizedPointCloud", name)
+            self.__export(filename, _encode_point_cloud_quantized, vertices, colors, self.three_to_world, self.compression)
+        else:
+            filename = self.__get_export_file_name("point_cloud", name)
+            self.__export(filename, _encode_point_cloud, vertices, colors, self.three_to_world)
 
     @overload
-    def add_mesh(self, path: str, *, name: str = None) -> None:
+    def add_mesh(self, path: str, *, name: str = None, lod=None) -> None:
         """
         Add a mesh by file path.
 
@@ -262,11 +912,13 @@ class Wis3D:
         :param path: path to the mesh file
 
         :param name: output name of the mesh
+
+        :param lod: whether to write a decimated pyramid of the mesh for progressive loading, or the ratios of faces of its levels, defaults to `mesh_lod` of the instance
         """
         pass
 
     @overload
-    def add_mesh(self, vertices: Union[np.ndarray, torch.Tensor], faces: Union[np.ndarray, torch.Tensor], vertex_colors: Union[np.ndarray, torch.Tensor], *, name: str = None) -> None:
+    def add_mesh(self, vertices: Union[np.ndarray, torch.Tensor], faces: Union[np.ndarray, torch.Tensor], vertex_colors: Union[np.ndarray, torch.Tensor], *, name: str = None, lod=None) -> None:
         """
         Add a mesh loaded by mesh definition
 
@@ -277,21 +929,26 @@ class Wis3D:
         :param vertex_colors: vertex colors of the mesh, shape: `(n, 3)`, range [0, 255] dtype: `np.uint8` or `torch.byte`
 
         :param name: output name of the mesh
+
+        :param lod: whether to write a decimated pyramid of the mesh for progressive loading, or the ratios of faces of its levels, defaults to `mesh_lod` of the instance
         """
         pass
 
     @overload
-    def add_mesh(self, mesh: trimesh.Trimesh, *, name: str = None) -> None:
+    def add_mesh(self, mesh: trimesh.Trimesh, *, name: str = None, lod=None) -> None:
         """
         Add a mesh loaded by `trimesh`
 
         :param mesh: mesh loaded by `trimesh`
 
         :param name: output name of the mesh
+
+        :param lod: whether to write a decimated pyramid of the mesh for progressive loading, or the ratios of faces of its levels, defaults to `mesh_lod` of the instance
         """
         pass
 
-    def add_mesh(self, vertices, faces=None, vertex_colors=None, *, name=None):
+    @_add_method("meshes")
+    def add_mesh(self, vertices, faces=None, vertex_colors=None, *, name=None, lod=None):
         """
         Add a mesh.
 
@@ -299,6 +956,7 @@ class Wis3D:
         :param faces:
         :param vertex_colors:
         :param name:
+        :param lod:
         :return:
         """
         if not self.enable: return
@@ -308,57 +966,97 @@ class Wis3D:
                 warnings.warn("xyz_pattern is not ('x', 'y', 'z'), but a glb file is provided. xyz_pattern will be ignored.")
             filename = self.__get_export_file_name("mesh", name)
             filename = filename.replace(".ply", ".glb")
-            os.system(f"cp {vertices} {filename}")
+            self.__export(filename, _read_file, vertices)
         else:
             if isinstance(vertices, str):
-                mesh = trimesh.load_mesh(vertices)
-            elif isinstance(vertices, trimesh.Trimesh):
-                mesh = vertices.copy()
-            elif isinstance(vertices, (np.ndarray, torch.Tensor)):
+                encoder, args = _encode_geometry, (vertices,)
+            elif is_instance(vertices, "trimesh", "Trimesh") and vertices.visual.kind in (None, "vertex"):
+                # only the arrays are exported, without copying the mesh
+                colors = vertices.visual.vertex_colors if vertices.visual.kind == "vertex" else None
+                encoder, args = _encode_mesh, (np.asarray(vertices.vertices), np.asarray(vertices.faces), colors)
+            elif is_instance(vertices, "trimesh", "Trimesh"):
+                encoder, args = _encode_geometry, (vertices.copy(),)
+            elif isinstance(vertices, np.ndarray) or is_tensor(vertices):
                 vertices = tensor2ndarray(vertices)
                 faces = tensor2ndarray(faces)
                 vertex_colors = tensor2ndarray(vertex_colors)
-                mesh = trimesh.Trimesh(vertices, faces, vertex_colors=vertex_colors)
+                encoder, args = _encode_mesh, (vertices, faces, vertex_colors)
             else:
                 raise NotImplementedError()
-            mesh.apply_transform(self.three_to_world)
+            if self.compression is not None:
+                encoder = _encode_mesh_quantized if encoder is _encode_mesh else _encode_geometry_quantized
+                filename = self.__get_export_file_name("quantizedMesh", name)
+                self.__export(filename, encoder, *args, self.three_to_world, self.compression)
+                return
+            if lod is None:
+                lod = self.mesh_lod
             filename = self.__get_export_file_name("mesh", name)
-            mesh.export(filename)
+            # the server only serves the levels of meshes stored as files
+            if lod and self.archive is None:
+                levels = tuple(lod) if isinstance(lod, (list, tuple)) else lod_module.MESH_LOD_LEVELS
+                self.__export(filename, _encode_mesh_levels, filename, levels, encoder, *args, self.three_to_world)
+            else:
+                self.__export(filename, encoder, *args, self.three_to_world)
 
     @overload
-    def add_image(self, path: str, *, name: str = None) -> None:
+    def add_image(self, path: str, *, name: str = None, format: str = None, quality: int = None, compress_level: int = None, max_size: int = None) -> None:
         """
         Add an image by file path
 
         :param path: path to the image file
 
         :param name: output name of the image
+
+        :param format: file format, "png", "jpeg" or "webp". Defaults to `image_format` of the instance
+
+        :param quality: quality of JPEG and WebP images, from 0 to 100. Defaults to `image_quality` of the instance
+
+        :param compress_level: zlib compression level of PNG images, from 0 to 9. Defaults to `image_compress_level` of the instance
+
+        :param max_size: maximum side length in pixels, larger images are downscaled. Defaults to `image_max_size` of the instance
         """
         pass
 
     @overload
-    def add_image(self, data: Union[np.ndarray, torch.Tensor], *, name: str = None) -> None:
+    def add_image(self, data: Union[np.ndarray, torch.Tensor], *, name: str = None, format: str = None, quality: int = None, compress_level: int = None, max_size: int = None) -> None:
         """
         Add an image by image definition
 
         :param data: data of the image
 
         :param name: output name of the image
+
+        :param format: file format, "png", "jpeg" or "webp". Defaults to `image_format` of the instance
+
+        :param quality: quality of JPEG and WebP images, from 0 to 100. Defaults to `image_quality` of the instance
+
+        :param compress_level: zlib compression level of PNG images, from 0 to 9. Defaults to `image_compress_level` of the instance
+
+        :param max_size: maximum side length in pixels, larger images are downscaled. Defaults to `image_max_size` of the instance
         """
         pass
 
     @overload
-    def add_image(self, image: Image.Image, *, name: str = None) -> None:
+    def add_image(self, image: Image.Image, *, name: str = None, format: str = None, quality: int = None, compress_level: int = None, max_size: int = None) -> None:
         """
         Add an image by `PIL.Image.Image`
 
         :param image: image loaded by `PIL.Image.open`
 
         :param name: output name of the image
+
+        :param format: file format, "png", "jpeg" or "webp". Defaults to `image_format` of the instance
+
+        :param quality: quality of JPEG and WebP images, from 0 to 100. Defaults to `image_quality` of the instance
+
+        :param compress_level: zlib compression level of PNG images, from 0 to 9. Defaults to `image_compress_level` of the instance
+
+        :param max_size: maximum side length in pixels, larger images are downscaled. Defaults to `image_max_size` of the instance
         """
         pass
 
-    def add_image(self, image, *, name: str = None):
+    @_add_method("images")
+    def add_image(self, image, *, name: str = None, format: str = None, quality: int = None, compress_level: int = None, max_size: int = None):
         """
         Add an image.
 
@@ -367,18 +1065,20 @@ class Wis3D:
         :return:
         """
         if not self.enable: return
-        if isinstance(image, str):
-            img = Image.open(image)
-        elif isinstance(image, (np.ndarray, torch.Tensor)):
+        if isinstance(image, np.ndarray) or is_tensor(image):
             image = tensor2ndarray(image)
-            img = Image.fromarray(image)
-        elif isinstance(image, Image.Image):
-            img = image
-        else:
+        elif not (isinstance(image, str) or is_instance(image, "PIL.Image", "Image")):
             raise NotImplementedError()
 
-        filename = self.__get_export_file_name("image", name)
-        img.save(filename)
+        format = (format or self.image_format).lower()
+        if format not in image_file_types:
+            raise NotImplementedError()
+        quality = self.image_quality if quality is None else quality
+        compress_level = self.image_compress_level if compress_level is None else compress_level
+        max_size = self.image_max_size if max_size is None else max_size
+
+        filename = self.__get_export_file_name(image_file_types[format], name)
+        self.__export(filename, _encode_image, image, format, quality, compress_level, max_size)
 
     @overload
     def add_boxes(self, corners: Union[np.ndarray, torch.Tensor], *, order: Iterable[int] = (0, 1, 2, 3, 4, 5, 6, 7), labels: Iterable[str] = None, name: str = None) -> None:
@@ -421,6 +1121,7 @@ class Wis3D:
         """
         pass
 
+    @_add_method("boxes")
     def add_boxes(self, positions, eulers=None, extents=None, *, axes=None, order=(0, 1, 2, 3, 4, 5, 6, 7), labels=None, name=None):
         """
         Add boxes.
@@ -458,6 +1159,8 @@ class Wis3D:
                 (vector_xs / extent_xs, vector_ys / extent_ys, vector_zs / extent_zs),
                 axis=2,
             )
+            from scipy.spatial.transform import Rotation
+
             Rs = Rotation.from_matrix(rot_mats)
             eulers = Rs.as_euler("XYZ")
         else:
@@ -468,28 +1171,17 @@ class Wis3D:
             extents = np.asarray(extents).reshape(-1, 3)
             eulers = np.asarray(eulers).reshape(-1, 3)
 
-        boxes = []
         if axes is None:
             warnings.warn("Axes is not specified, use default axes rxyz. To preserve old behavior, use axes='sxyz'")
             axes = "rxyz"
-        for i in range(len(positions)):
-            box_def = self.three_to_world @ affines.compose(
-                positions[i], euler.euler2mat(*eulers[i], axes), extents[i]
-            )
-            T, R, Z, _ = affines.decompose(box_def)
-            box = dict(position=T.tolist(), euler=euler.mat2euler(R, axes), extent=Z.tolist())
-            if labels is not None:
-                if isinstance(labels, str):
-                    labels = [labels]
-                box.update({"label": labels[i]})
-
-            boxes.append(box)
+        if labels is not None:
+            labels = [labels] if isinstance(labels, str) else list(labels)
 
         filename = self.__get_export_file_name("boxes", name)
-        with open(filename, "w") as f:
-            f.write(json.dumps(boxes))
+        self.__export(filename, _encode_boxes, positions, eulers, extents, axes, labels, self.three_to_world)
 
-    def add_lines(self, start_points: Union[np.ndarray, torch.Tensor], end_points: Union[np.ndarray, torch.Tensor], colors: Union[np.ndarray, torch.Tensor] = None, *, name: str = None) -> None:
+    @_add_method("lines")
+    def add_lines(self, start_points: Union[np.ndarray, torch.Tensor], end_points: Union[np.ndarray, torch.Tensor], colors: Union[np.ndarray, torch.Tensor] = None, *, name: str = None, format: str = None) -> None:
         """
         Add lines by points
 
@@ -500,8 +1192,11 @@ class Wis3D:
         :param colors: colors of the lines, shape: `(n, 3)`, range [0, 255] dtype: `np.uint8` or `torch.byte`
 
         :param name: output name for these lines
+
+        :param format: output file format, "json" or "bin", defaults to `primitive_format` of the instance
         """
         if not self.enable: return
+        file_type = self.__get_primitive_file_type("lines", format)
         start_points = tensor2ndarray(start_points)
         end_points = tensor2ndarray(end_points)
         colors = tensor2ndarray(colors)
@@ -526,19 +1221,9 @@ class Wis3D:
                 raise NotImplementedError()
             colors = np.asarray(colors).reshape(-1, 3)
 
-        lines = []
-        for i in range(len(start_points)):
-            line = dict(
-                start_point=start_points[i].tolist(), end_point=end_points[i].tolist()
-            )
-            if colors is not None:
-                line.update({"color": colors[i].tolist()})
-
-            lines.append(line)
-
-        filename = self.__get_export_file_name("lines", name)
-        with open(filename, "w") as f:
-            f.write(json.dumps(lines))
+        filename = self.__get_export_file_name(file_type, name)
+        encoder = _encode_lines_bin if file_type == "binLines" else _encode_lines
+        self.__export(filename, encoder, start_points, end_points, colors)
 
     @overload
     def add_voxel(self, path: str, *, name: str = None) -> None:
@@ -552,7 +1237,7 @@ class Wis3D:
         pass
 
     @overload
-    def add_voxel(self, voxel_centers: Union[np.ndarray, torch.Tensor], voxel_size: float, colors: Union[np.ndarray, torch.Tensor] = None, *, name: str = None) -> None:
+    def add_voxel(self, voxel_centers: Union[np.ndarray, torch.Tensor], voxel_size: float, colors: Union[np.ndarray, torch.Tensor] = None, *, name: str = None, format: str = None) -> None:
         """
         Add voxels by boxes
 
@@ -563,10 +1248,13 @@ class Wis3D:
         :param colors: colors of each box, shape: `(n, 3)`, range [0, 255] dtype: `np.uint8` or `torch.byte`
 
         :param name: output name for the voxel
+
+        :param format: output file format, "json" or "bin", defaults to `primitive_format` of the instance
         """
         pass
 
-    def add_voxel(self, voxel_centers, voxel_size=None, colors=None, *, name=None):
+    @_add_method("voxels")
+    def add_voxel(self, voxel_centers, voxel_size=None, colors=None, *, name=None, format=None):
         if not self.enable: return
         if isinstance(voxel_centers, str):
             file_type = voxel_centers.split(".")[-1]
@@ -577,7 +1265,7 @@ class Wis3D:
             else:
                 raise NotImplementedError()
 
-            copyfile(voxel_centers, filename)
+            self.__export(filename, _read_file, voxel_centers)
         else:
             if voxel_size is None:
                 raise NotImplementedError()
@@ -597,21 +1285,13 @@ class Wis3D:
                 if len(colors) != len(voxel_centers):
                     raise NotImplementedError()
 
-            data = []
-            data.append(dict(voxel_size=voxel_size))
-            boxes = []
-            for i in range(len(voxel_centers)):
-                box = dict(voxel_center=voxel_centers[i].tolist())
-                if colors is not None:
-                    box.update({"color": colors[i].tolist()})
-                boxes.append(box)
-            data.append(dict(voxels=boxes))
+            file_type = self.__get_primitive_file_type("boxVoxel", format)
+            filename = self.__get_export_file_name(file_type, name)
+            encoder = _encode_voxels_bin if file_type == "binBoxVoxel" else _encode_voxels
+            self.__export(filename, encoder, voxel_centers, voxel_size, colors)
 
-            filename = self.__get_export_file_name("boxVoxel", name)
-            with open(filename, "w") as f:
-                f.write(json.dumps(data))
-
-    def add_spheres(self, centers: Union[np.ndarray, torch.Tensor], radius: Union[float, np.ndarray, torch.Tensor], colors=None, scales=None, quaternions=None, *, name=None) -> None:
+    @_add_method("spheres")
+    def add_spheres(self, centers: Union[np.ndarray, torch.Tensor], radius: Union[float, np.ndarray, torch.Tensor], colors=None, scales=None, quaternions=None, *, name=None, format=None) -> None:
         """
         Add spheres
 
@@ -622,8 +1302,11 @@ class Wis3D:
         :param colors: colors of each box, shape: `(n, 3)`, range [0, 255] dtype: `np.uint8` or `torch.byte`
 
         :param name: output name for the spheres
+
+        :param format: output file format, "json" or "bin", defaults to `primitive_format` of the instance
         """
         if not self.enable: return
+        file_type = self.__get_primitive_file_type("spheres", format)
         centers = tensor2ndarray(centers)
         centers = np.asarray(centers).reshape(-1, 3)
         n = centers.shape[0]
@@ -651,41 +1334,34 @@ class Wis3D:
             if len(colors) != len(centers):
                 raise NotImplementedError()
 
-        spheres = []
-        if isinstance(radius, float):
-            for i in range(len(centers)):
-                sphere = dict(center=centers[i].tolist(), radius=radius, scales=scales[i].tolist(), quaternion=quaternions[i].tolist())
-                if colors is not None:
-                    sphere.update({"color": colors[i].tolist()})
-                spheres.append(sphere)
-        else:
+        if not isinstance(radius, float):
             radius = tensor2ndarray(radius)
             radius = np.asarray(radius).reshape(-1, 1)
             if len(radius) != len(centers):
                 raise NotImplementedError()
-            for i in range(len(centers)):
-                sphere = dict(center=centers[i].tolist(), radius=radius[i].tolist(), scales=scales[i].tolist(), quaternion=quaternions[i].tolist())
-                if colors is not None:
-                    sphere.update({"color": colors[i].tolist()})
-                spheres.append(sphere)
 
-        filename = self.__get_export_file_name("spheres", name)
-        with open(filename, "w") as f:
-            f.write(json.dumps(spheres))
+        filename = self.__get_export_file_name(file_type, name)
+        encoder = _encode_spheres_bin if file_type == "binSpheres" else _encode_spheres
+        self.__export(filename, encoder, centers, radius, scales, quaternions, colors)
 
-    def add_camera_trajectory(self, poses: Union[np.ndarray, torch.Tensor], *, name: str = None) -> None:
+    @_add_method("camera_trajectories")
+    def add_camera_trajectory(self, poses: Union[np.ndarray, torch.Tensor], *, name: str = None, format: str = None) -> None:
         """
         Add a camera trajectory
 
-        :param poses: transformation matrices of shape `(n, 4, 4)`
+        :param poses: transformation matrices of shape `(n, 4, 4)`, float32 poses are converted in float32
         :param name: output name of the camera trajectory
+        :param format: output file format, "json" or "bin", defaults to `primitive_format` of the instance
         """
         if not self.enable: return
+        file_type = self.__get_primitive_file_type("camera_trajectory", format)
         poses = tensor2ndarray(poses)
         if poses.ndim == 2:
             raise ValueError("poses should be of shape (n, 4, 4). To add a single pose, use add_camera_pose.")
 
-        poses = (self.three_to_world @ poses.T).T
+        # float32 poses stay in float32
+        transform = self.three_to_world.astype(np.result_type(poses.dtype, np.float32))
+        poses = transform @ poses
 
         # if is_opencv is None:
         #     warnings.warn(
@@ -693,23 +1369,21 @@ class Wis3D:
         #     is_opencv = True
         # if is_opencv:
         poses[:, :, [1, 2]] *= -1
-        axes = "rxyz"
         # else:
         #     axes = 'sxyz'
-        quats = []
-        positions = poses[:, :3, 3].reshape((-1, 3))
-        for pose in poses:
-            trans_quat = euler.mat2euler(pose[:3, :3], axes=axes)
-            quats.append(trans_quat)
 
-        filename = self.__get_export_file_name("camera_trajectory", name)
-        with open(filename, "w") as f:
-            f.write(json.dumps(dict(eulers=quats, positions=positions.tolist())))
+        filename = self.__get_export_file_name(file_type, name)
+        encoder = _encode_camera_trajectory_bin if file_type == "binCameraTrajectory" else _encode_camera_trajectory
+        self.__export(filename, encoder, poses)
 
+    @_add_method("correspondences")
     def add_keypoint_correspondences(self, img0, img1, kpts0: Union[np.ndarray, torch.Tensor], kpts1, *, unmatched_kpts0=None, unmatched_kpts1=None, metrics: Dict[str, Iterable[int]] = None, booleans: Dict[str, Iterable[bool]] = None, meta: Dict[str, Any] = None, name: str = None) -> None:
         """
         Add keypoint correspondences
 
+        The images are written once per sequence, named by their content, and referenced by the correspondence file,
+        so an image pair logged with several match sets is stored only once.
+
         :param img0: path to the image or a `PIL.Image.Image` instance or a `numpy.ndarray`
 
         :param img1: path to the image or a `PIL.Image.Image` instance or a `numpy.ndarray`
@@ -731,58 +1405,38 @@ class Wis3D:
         :param name: outputname of the file
         """
         if not self.enable: return
-        if isinstance(img0, str):
-            image0 = Image.open(img0)
-        elif isinstance(img0, np.ndarray):
-            image0 = Image.fromarray(img0)
-        elif isinstance(img0, torch.Tensor):
-            image0 = Image.fromarray(tensor2ndarray(img0))
-        elif isinstance(img0, Image.Image):
-            image0 = img0
-
-        if isinstance(img1, str):
-            image1 = Image.open(img1)
-        elif isinstance(img1, np.ndarray):
-            image1 = Image.fromarray(img1)
-        elif isinstance(img1, torch.Tensor):
-            image1 = Image.fromarray(tensor2ndarray(img1))
-        elif isinstance(img1, Image.Image):
-            image1 = img1
+        image0 = tensor2ndarray(img0)
+        image1 = tensor2ndarray(img1)
 
         data = {}
-        data["img0"] = img2url(image0)
-        data["img1"] = img2url(image1)
         kpts0 = tensor2ndarray(kpts0)
-        data["kpts0"] = np.asarray(kpts0).tolist()
+        data["kpts0"] = np.asarray(kpts0)
         kpts1 = tensor2ndarray(kpts1)
-        data["kpts1"] = np.asarray(kpts1).tolist()
+        data["kpts1"] = np.asarray(kpts1)
 
         if unmatched_kpts0 is not None:
             unmatched_kpts0 = tensor2ndarray(unmatched_kpts0)
-            data["unmatched_kpts0"] = np.asarray(unmatched_kpts0).tolist()
+            data["unmatched_kpts0"] = np.asarray(unmatched_kpts0)
 
         if unmatched_kpts1 is not None:
             unmatched_kpts1 = tensor2ndarray(unmatched_kpts1)
-            data["unmatched_kpts1"] = np.asarray(unmatched_kpts1).tolist()
+            data["unmatched_kpts1"] = np.asarray(unmatched_kpts1)
 
         if metrics is not None and len(dict.keys(metrics)) > 0:
             m = {}
             for k, v in metrics.items():
-                m[k] = np.asarray(v).reshape(-1).tolist()
+                m[k] = np.asarray(v).reshape(-1)
             data["metrics"] = m
 
         if booleans is not None and len(dict.keys(booleans)) > 0:
             b = {}
             for k, v in booleans.items():
-                b[k] = np.asarray(v).reshape(-1).tolist()
+                b[k] = np.asarray(v).reshape(-1)
             data["booleans"] = b
 
-        if meta is not None:
-            data["meta"] = meta
-
         filename = self.__get_export_file_name("correspondences", name)
-        with open(filename, "w") as f:
-            f.write(json.dumps(data))
+        assets_dir = os.path.join(self.seq_folder, assets_folder)
+        self.__export(filename, _encode_correspondences, image0, image1, data, meta, assets_dir, os.path.dirname(filename))
 
     def __repr__(self):
         if not self.enable:
@@ -839,7 +1493,7 @@ class Wis3D:
             return
         self.add_camera_trajectory(pose[None], name=name)
 
-    def add_rays(self, rays_o, rays_d, max=10.0, min=0.0, sample=1.0, name=None):
+    def add_rays(self, rays_o, rays_d, max=10.0, min=0.0, sample=1.0, name=None, format=None):
         """
         add rays to the scene, useful for debugging NeRF
 
@@ -852,6 +1506,7 @@ class Wis3D:
             If sample < 1.0, ratio of the rays will be sampled.
             If sample > 1.0, number of the rays will be sampled.
         :param name: (str, optional): Name of the rays. Defaults to None.
+        :param format: (str, optional): Output file format, "json" or "bin". Defaults to `primitive_format` of the instance.
         """
         if not self.enable:
             return
@@ -868,4 +1523,4 @@ class Wis3D:
             rays_o = rays_o[idx]
             rays_d = rays_d[idx]
 
-        self.add_lines(rays_o + rays_d * min, rays_o + rays_d * max, name=name)
+        self.add_lines(rays_o + rays_d * min, rays_o + rays_d * max, name=name, format=format)
@@ -0,0 +1,254 @@
+# coding=utf-8
+import atexit
+import threading
+import warnings
+import weakref
+from functools import partial
+from concurrent.futures import Executor, Future, ThreadPoolExecutor, ProcessPoolExecutor
+
+import numpy as np
+
+from wis3d.utils import is_instance
+
+# arrays at least this large are handed to process workers through shared memory instead of being pickled
+SHARED_MEMORY_THRESHOLD = 1 << 20
+
+# executors created by name are shared by all writers, so that creating one `Wis3D` per sample does not start new
+# workers each time; they live until interpreter exit
+_executors = {}
+_executors_lock = threading.Lock()
+# open writers, closed at interpreter exit without being kept alive until then
+_writers = weakref.WeakSet()
+
+
+def shared_executor(name: str) -> Executor:
+    """
+    Executor shared by the writers created with `executor=name`, see `AsyncWriter`.
+    """
+    with _executors_lock:
+        if name not in _executors:
+            if name == "thread":
+                _executors[name] = ThreadPoolExecutor(max_workers=1, thread_name_prefix="wis3d-writer")
+            elif name == "process":
+                _executors[name] = ProcessPoolExecutor()
+            else:
+                raise ValueError(f"unknown executor: {name}")
+        return _executors[name]
+
+
+@atexit.register
+def _close_writers() -> None:
+    for writer in list(_writers):
+        writer.close()
+
+
+def _snapshot(obj):
+    """
+    Copy the mutable inputs of an export task before handing it to the background writer.
+    """
+    if isinstance(obj, np.ndarray):
+        return obj.copy()
+    if is_instance(obj, "PIL.Image", "Image"):
+        return obj.copy()
+    if isinstance(obj, dict):
+        return {k: _snapshot(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [_snapshot(v) for v in obj]
+    return obj
+
+
+class SharedArray:
+    """
+    Picklable handle of a numpy array copied into a `multiprocessing.shared_memory` block.
+    """
+
+    def __init__(self, array: np.ndarray):
+        from multiprocessing import shared_memory
+
+        array = np.ascontiguousarray(array)
+        self.shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        self.name = self.shm.name
+        self.shape = array.shape
+        self.dtype = array.dtype.str
+        np.ndarray(self.shape, self.dtype, buffer=self.shm.buf)[...] = array
+
+    def __getstate__(self):
+        return dict(name=self.name, shape=self.shape, dtype=self.dtype)
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.shm = None
+
+    def release(self) -> None:
+        """
+        Free the shared memory block. Called by the owner once the task is done.
+        """
+        self.shm.close()
+        self.shm.unlink()
+
+
+def _run_shared(fn, *args):
+    """
+    Run `fn` in a worker process, attaching `SharedArray` arguments without copying them.
+    """
+    from multiprocessing import shared_memory
+
+    blocks = []
+    resolved = []
+    for arg in args:
+        if isinstance(arg, SharedArray):
+            shm = shared_memory.SharedMemory(name=arg.name)
+            blocks.append(shm)
+            arg = np.ndarray(arg.shape, arg.dtype, buffer=shm.buf)
+        resolved.append(arg)
+    try:
+        return fn(*resolved)
+    finally:
+        resolved.clear()
+        arg = None
+        for shm in blocks:
+            try:
+                shm.close()
+            except BufferError:
+                # the encoder still holds a view, the mapping is released with it
+                pass
+
+
+class AsyncWriter:
+    """
+    Background writer used by `Wis3D` when `async_write=True` or an `executor` is given.
+
+    Inputs are snapshotted on `submit`, so the caller only pays for copying them. By default, tasks run on a single
+    worker thread. With a `ProcessPoolExecutor`, encoding is spread over processes and large arrays are handed over
+    through shared memory; results are passed back to the callback in this process. Callbacks are always called in
+    submission order, so that later writes of the same file win, whatever order the tasks finish in. Pending tasks
+    are drained by `flush`, `close` and at interpreter exit; writers are not kept alive until then.
+    """
+
+    def __init__(self, executor=None):
+        """
+        :param executor: `None` or "thread" for a single background thread, "process" for a `ProcessPoolExecutor` with one worker per CPU, or any `concurrent.futures.Executor`. Executors created by name are shared with the other writers, and no executor is shut down by `close`.
+        """
+        if executor is None or isinstance(executor, str):
+            executor = shared_executor(executor or "thread")
+        elif not isinstance(executor, Executor):
+            raise ValueError(f"unknown executor: {executor}")
+        self.executor = executor
+        self.use_shared_memory = isinstance(executor, ProcessPoolExecutor)
+        self.pending = 0
+        self.cond = threading.Condition()
+        # finished tasks wait here until the tasks submitted before them are written
+        self.submitted = 0
+        self.written = 0
+        self.finished = {}
+        self.write_lock = threading.Lock()
+        self.closed = False
+        _writers.add(self)
+
+    def submit(self, fn, *args, callback=None) -> None:
+        """
+        Run `fn(*args)` in the background and pass its result to `callback`.
+
+        :param fn: the task to run, which must be picklable for process executors
+        :param args: arguments of the task, copied before this method returns
+        :param callback: called with the result of the task
+        """
+        if self.closed:
+            raise RuntimeError("cannot submit to a closed AsyncWriter")
+        shared = []
+        with self.cond:
+            self.pending += 1
+            index = self.submitted
+            self.submitted += 1
+        try:
+            if self.use_shared_memory:
+                future = self.executor.submit(_run_shared, fn, *[self.__share(arg, shared) for arg in args])
+            else:
+                future = self.executor.submit(fn, *[_snapshot(arg) for arg in args])
+        except RuntimeError:
+            # executors stop taking tasks at interpreter exit, before `atexit` runs the calls queued for the last
+            # scene of `transfer="scene"`, so the task runs in the calling thread
+            for arg in shared:
+                arg.release()
+            shared = []
+            future = Future()
+            try:
+                future.set_result(fn(*args))
+            except Exception as e:
+                future.set_exception(e)
+        except Exception:
+            for arg in shared:
+                arg.release()
+            # the tasks submitted after this one must not wait for it
+            self.__finish(index, None, None)
+            raise
+        future.add_done_callback(partial(self.__done, index, callback, shared))
+
+    @staticmethod
+    def __share(arg, shared):
+        if isinstance(arg, np.ndarray) and arg.nbytes >= SHARED_MEMORY_THRESHOLD:
+            arg = SharedArray(arg)
+            shared.append(arg)
+            return arg
+        return _snapshot(arg)
+
+    def __done(self, index, callback, shared, future):
+        for arg in shared:
+            arg.release()
+        self.__finish(index, callback, future)
+
+    def __finish(self, index, callback, future):
+        """
+        Call the callbacks of the finished tasks that are next in submission order. Whichever thread finishes the next
+        task writes it; the others leave their results to that thread.
+        """
+        with self.cond:
+            self.finished[index] = (callback, future)
+        while True:
+            if not self.write_lock.acquire(blocking=False):
+                return
+            try:
+                while True:
+                    with self.cond:
+                        if self.written not in self.finished:
+                            break
+                        callback, future = self.finished.pop(self.written)
+                    self.__write(callback, future)
+                    with self.cond:
+                        self.written += 1
+                        self.pending -= 1
+                        self.cond.notify_all()
+            finally:
+                self.write_lock.release()
+            # a task may have finished between the last check and the release
+            with self.cond:
+                if self.written not in self.finished:
+                    return
+
+    @staticmethod
+    def __write(callback, future):
+        if future is None:
+            return
+        try:
+            result = future.result()
+            if callback is not None:
+                callback(result)
+        except Exception as e:
+            warnings.warn(f"Wis3D background write failed: {e!r}")
+
+    def flush(self) -> None:
+        """
+        Block until all submitted tasks are written.
+        """
+        with self.cond:
+            self.cond.wait_for(lambda: self.pending == 0)
+
+    def close(self) -> None:
+        """
+        Flush pending tasks. Further submits raise.
+        """
+        if self.closed:
+            return
+        self.flush()
+        self.closed = True
+        _writers.discard(self)